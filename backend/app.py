@@ -5,12 +5,18 @@ from config import Config
 
 from routes.file_routes import file_bp
 from routes.ai_routes import ai_bp
-from database import init_db
+from database import init_db, init_db_sessions
+from services.prompt_builder import start_loading_encoding
+from services.upload_ingest import IngestRequest
 
 def create_app():
     app = Flask(__name__)
     
+    # Stream uploaded files to the upload folder once, hashing them on the fly
+    app.request_class = IngestRequest
+    
     app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20MB for AI mode
+    app.config['UPLOAD_FOLDER'] = Config.UPLOAD_FOLDER
     
     CORS(app, origins=Config.CORS_ORIGINS)
     
@@ -18,6 +24,10 @@ def create_app():
     
     # Initialize database
     init_db()
+    init_db_sessions(app)
+    
+    # The tokenizer may be downloaded on first use, keep that out of requests
+    start_loading_encoding()
     
     # Health check endpoint
     @app.route('/health', methods=['GET'])
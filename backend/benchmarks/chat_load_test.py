@@ -0,0 +1,116 @@
+"""
+Load test of the AI chat endpoint.
+
+Uploads a generated workbook once per simulated user, then has every user
+send chat messages back to back, all users at the same time. Run the backend
+against benchmarks/fake_llm_server.py so the model latency is fixed:
+
+    python benchmarks/fake_llm_server.py --latency 2.0 &
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 gunicorn wsgi:app &
+    python benchmarks/chat_load_test.py --url http://127.0.0.1:5000 --users 32
+
+Each user has a daily allowance of tokens, so keep --messages below it.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+
+def make_workbook(path: str, rows: int) -> None:
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        'Name': [f'  name {i}  ' for i in range(rows)],
+        'City': rng.choice([' Berlin', 'Paris ', ' Rome '], rows),
+        'Amount': rng.random(rows) * 100,
+    }).to_excel(path, index=False)
+
+
+async def upload(client: aiohttp.ClientSession, url: str, workbook: str, user_id: str) -> str:
+    form = aiohttp.FormData()
+    form.add_field('user_id', user_id)
+    form.add_field('email', f'{user_id}@example.com')
+    with open(workbook, 'rb') as f:
+        form.add_field('file', f.read(), filename='load_test.xlsx')
+    async with client.post(f'{url}/api/ai/upload', data=form) as response:
+        body = await response.json()
+        if response.status != 201:
+            raise RuntimeError(f'Upload failed ({response.status}): {body}')
+        return body['session_id']
+
+
+async def chat(client: aiohttp.ClientSession, url: str, session_id: str, user_id: str, messages: int, results: list):
+    for i in range(messages):
+        started = time.perf_counter()
+        async with client.post(f'{url}/api/ai/chat', json={
+            'session_id': session_id,
+            'user_id': user_id,
+            'message': f'Trim the whitespace ({i})'
+        }) as response:
+            body = await response.json()
+        # Slow operations are answered with a job to poll
+        if response.status == 202:
+            while body.get('type') == 'pending':
+                await asyncio.sleep(0.25)
+                async with client.get(f"{url}/api/ai/jobs/{body['job_id']}", params={'user_id': user_id}) as poll:
+                    job = await poll.json()
+                if poll.status != 200:
+                    break
+                if job.get('status') in ('succeeded', 'failed'):
+                    body = job['result']
+        ok = response.status in (200, 202) and body.get('type') == 'success'
+        results.append((time.perf_counter() - started, ok))
+
+
+async def run(args) -> None:
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.users)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as client:
+        with tempfile.TemporaryDirectory() as tmp:
+            workbook = os.path.join(tmp, 'load_test.xlsx')
+            make_workbook(workbook, args.rows)
+            users = [f'load-test-{uuid.uuid4().hex[:12]}' for _ in range(args.users)]
+            sessions = [await upload(client, args.url, workbook, user_id) for user_id in users]
+
+        results: list = []
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            chat(client, args.url, session_id, user_id, args.messages, results)
+            for session_id, user_id in zip(sessions, users)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    failures = sum(1 for _, ok in results if not ok)
+    print(f'{args.users} users x {args.messages} messages, {args.rows} rows per sheet')
+    print(f'  requests     {len(results):8d} ({failures} failed)')
+    print(f'  elapsed      {elapsed:8.2f} s')
+    print(f'  throughput   {len(results) / elapsed:8.2f} req/s')
+    print(f'  latency p50  {statistics.median(latencies):8.2f} s')
+    print(f'  latency p95  {latencies[int(len(latencies) * 0.95) - 1]:8.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=32, help='concurrent users')
+    parser.add_argument('--messages', type=int, default=5, help='messages per user')
+    parser.add_argument('--rows', type=int, default=2000, help='rows of the uploaded sheet')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    if args.messages < 1 or args.users < 1:
+        sys.exit('--users and --messages must be at least 1')
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
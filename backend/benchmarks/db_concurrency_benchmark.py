@@ -0,0 +1,171 @@
+"""
+Database overhead of a chat turn under concurrent clients.
+
+Replays the queries and writes of one /api/ai/chat turn, without the model
+or the sheet: load the session and user, append the user's message, read
+the conversation window, spend a token and queue a job, then record its
+result (assistant message with stats, job outcome) in a second session as
+the job callback does. Every client runs its turns back to back on its own thread,
+all at once, against a fresh SQLite file per profile:
+
+- nullpool: a new connection per session with SQLite's default rollback
+  journal (the previous setup)
+- pooled: database.create_db_engine, pooled connections with WAL and the
+  tuned pragmas
+
+Run from the backend directory:
+
+    python benchmarks/db_concurrency_benchmark.py [--clients N] [--turns N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import create_db_engine  # noqa: E402
+from models.ai_job import AIJob  # noqa: E402
+from models.base import Base  # noqa: E402
+from models.user import User  # noqa: E402
+from repositories.ai_job_repository import AIJobRepository  # noqa: E402
+from repositories.ai_session_repository import AISessionRepository  # noqa: E402
+from repositories.user_repository import UserRepository  # noqa: E402
+
+# Size of the stats stored with every assistant message
+COLUMNS = 20
+
+
+def seed(Session, clients: int):
+    sessions = []
+    db = Session()
+    try:
+        for i in range(clients):
+            user_id = f'bench-{i}'
+            user = UserRepository(db).create(user_id, f'{user_id}@example.com')
+            user.daily_tokens = 10 ** 6
+            db.commit()
+            session = AISessionRepository(db).create(user_id, 'bench.xlsx', '/tmp/bench.xlsx', 'Sheet1')
+            sessions.append((user_id, session.id))
+    finally:
+        db.close()
+    return sessions
+
+
+def chat_turn(Session, user_id: str, session_id: str, turn: int):
+    steps = [{'operation': 'trim_whitespace', 'params': {}}]
+    stats = {
+        'rows': 10000,
+        'columns': COLUMNS,
+        'column_names': [f'Column {i}' for i in range(COLUMNS)],
+        'null_counts': {f'Column {i}': i for i in range(COLUMNS)}
+    }
+
+    # The request
+    db = Session()
+    try:
+        session_repo = AISessionRepository(db)
+        session_repo.get_by_id(session_id)
+        user_repo = UserRepository(db)
+        user = user_repo.get_by_id(user_id)
+        user.can_use_token()
+        session_repo.add_message(session_id, 'user', f'Trim the whitespace ({turn})')
+        session_repo.get_conversation_context(session_id, 6)
+        db.commit()
+        user_repo.consume_token(user_id)
+        job = AIJobRepository(db).create(session_id, user_id, steps, 'Trim whitespace.')
+        job_id = job.id
+    finally:
+        db.close()
+
+    # The job worker, then the callback recording its outcome
+    db = Session()
+    try:
+        AIJobRepository(db).mark_running(job_id)
+    finally:
+        db.close()
+
+    db = Session()
+    try:
+        AISessionRepository(db).add_message(
+            session_id, 'assistant', 'Trim whitespace.\n\nTrimmed whitespace',
+            metadata={'operation': 'trim_whitespace', 'operations': steps, 'stats': stats}
+        )
+        AIJobRepository(db).finish(job_id, AIJob.SUCCEEDED, {
+            'type': 'success',
+            'stats': stats,
+            'tokens_remaining': UserRepository(db).get_remaining_tokens(user_id)
+        })
+    finally:
+        db.close()
+
+
+def run_profile(name: str, pooled: bool, clients: int, turns: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pooled=pooled)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        sessions = seed(Session, clients)
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(clients + 1)
+
+        def client(user_id: str, session_id: str):
+            start.wait()
+            for turn in range(turns):
+                began = time.perf_counter()
+                try:
+                    chat_turn(Session, user_id, session_id, turn)
+                except Exception as e:
+                    with lock:
+                        errors.append(type(e).__name__)
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - began)
+
+        threads = [threading.Thread(target=client, args=session) for session in sessions]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        engine.dispose()
+
+    latencies.sort()
+    return {
+        'name': name,
+        'turns': len(latencies),
+        'errors': len(errors),
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) if latencies else float('nan'),
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else float('nan'),
+        'p99': latencies[int(len(latencies) * 0.99)] if latencies else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{args.clients} clients x {args.turns} chat turns')
+    print(f"  {'profile':10} {'turns':>6} {'errors':>6} {'turns/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, pooled in (('nullpool', False), ('pooled', True)):
+        result = run_profile(name, pooled, args.clients, args.turns)
+        print(f"  {result['name']:10} {result['turns']:6d} {result['errors']:6d} {result['throughput']:8.1f} "
+              f"{result['p50'] * 1000:8.1f} {result['p95'] * 1000:8.1f} {result['p99'] * 1000:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load tests.
+
+Every request is answered with the same operation after a fixed delay, so
+the chat endpoint can be load-tested without an API key or network latency
+noise. Point the backend at it with OPENAI_BASE_URL:
+
+    python benchmarks/fake_llm_server.py --port 8100 --latency 2.0
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 gunicorn wsgi:app
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from aiohttp import web
+
+DEFAULT_REPLY = {
+    'operation': 'trim_whitespace',
+    'params': {},
+    'explanation': 'Trim leading and trailing spaces in every text column'
+}
+
+
+def make_app(latency: float, reply: str) -> web.Application:
+    async def chat_completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return web.json_response({
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': reply},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        })
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=2.0, help='seconds before each reply')
+    parser.add_argument('--reply', default=json.dumps(DEFAULT_REPLY), help='message content to answer with')
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.latency, args.reply), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
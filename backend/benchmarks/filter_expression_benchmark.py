@@ -0,0 +1,129 @@
+"""
+Filtering on three criteria: three chat turns against one compound expression.
+
+Before, filter_rows took a single condition on a single column, so three
+criteria took three messages, each running a plan with run_plan (load the
+sheet, filter it, save it). Now one filter_rows step takes an expression
+with and/or/not, compiled once into a single boolean mask. Both are timed on
+a working copy of --rows rows for each size, along with the filtering alone
+(three masks applied in turn against one compound mask) and, when numexpr is
+installed, the compound mask with and without it.
+
+Run from the backend directory:
+
+    python benchmarks/filter_expression_benchmark.py [--rows N [N ...]] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.filter_expression as filter_expression  # noqa: E402
+from services.dataframe_cache import dataframe_cache  # noqa: E402
+from services.excel_operations import run_plan  # noqa: E402
+from services.filter_expression import FilterExpression  # noqa: E402
+from services.working_copy import WorkingCopy  # noqa: E402
+
+# The same three criteria as one condition per turn and as one expression
+TURNS = [
+    {'column': 'Amount', 'condition': '> 100'},
+    {'column': 'Score', 'condition': '<= 80'},
+    {'column': 'Quantity', 'condition': '>= 5'},
+]
+EXPRESSION = 'Amount > 100 and Score <= 80 and Quantity >= 5'
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    score = rng.random(rows) * 100
+    score[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        'Amount': rng.random(rows) * 1000,
+        'Score': score,
+        'Quantity': rng.integers(0, 20, rows),
+        'City': rng.choice(['Paris', 'Berlin', 'Rome', 'Madrid'], rows).astype(object),
+    })
+
+
+def make_session(directory: str, df: pd.DataFrame) -> str:
+    """A fresh upload whose working copy holds ``df``"""
+    path = os.path.join(directory, f'bench_{time.monotonic_ns()}.xlsx')
+    pd.DataFrame({'Amount': [0]}).to_excel(path, sheet_name='Data', index=False)
+    WorkingCopy.create_from_excel(path).save_sheet('Data', df)
+    dataframe_cache.clear()
+    return path
+
+
+def best_of(repeat: int, setup, function) -> float:
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        started = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def per_turn(path: str) -> None:
+    for params in TURNS:
+        result = run_plan(path, 'Data', [{'operation': 'filter_rows', 'params': params}])
+        if not result['success']:
+            raise RuntimeError(result['error'])
+
+
+def one_turn(path: str) -> None:
+    result = run_plan(path, 'Data', [{'operation': 'filter_rows', 'params': {'expression': EXPRESSION}}])
+    if not result['success']:
+        raise RuntimeError(result['error'])
+
+
+def masks_in_turn(df: pd.DataFrame) -> pd.DataFrame:
+    for params in TURNS:
+        df = df[FilterExpression.from_params(params).mask(df)]
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    numexpr = filter_expression.numexpr
+    if numexpr is None:
+        print('numexpr is not installed')
+    else:
+        print(f'numexpr {numexpr.__version__}, {numexpr.nthreads} thread(s)')
+    # numpy unless a column says otherwise
+    filter_expression.USE_NUMEXPR = False
+    print(f"  {'rows':>9} {'3 turns ms':>11} {'1 turn ms':>10} {'3 masks ms':>11} {'1 mask ms':>10} {'numexpr ms':>11}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            df = make_frame(rows)
+            turns = best_of(args.repeat, lambda: make_session(tmp, df), per_turn)
+            turn = best_of(args.repeat, lambda: make_session(tmp, df), one_turn)
+
+            compound = FilterExpression(EXPRESSION)
+            masks = best_of(args.repeat, lambda: df, masks_in_turn)
+            mask = best_of(args.repeat, lambda: df, lambda frame: frame[compound.mask(frame)])
+            with_numexpr = f"{'-':>11}"
+            if numexpr is not None:
+                # On whatever the thread count, to compare
+                filter_expression.USE_NUMEXPR = True
+                try:
+                    seconds = best_of(args.repeat, lambda: df, lambda frame: frame[compound.mask(frame)])
+                finally:
+                    filter_expression.USE_NUMEXPR = False
+                with_numexpr = f'{seconds * 1000:11.1f}'
+            print(f"  {rows:9d} {turns * 1000:11.1f} {turn * 1000:10.1f} {masks * 1000:11.1f} {mask * 1000:10.1f} {with_numexpr}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Time until a chat message's preview is ready, by sheet size.
+
+For a row-local plan (every step changes each row on its own, e.g. upper
+case or rounding), /chat answers with the first rows transformed by
+excel_operations.preview_plan and leaves the rest of the sheet to the job.
+Before, the preview came from run_plan: load the whole sheet, apply the plan,
+save it. Both are timed here on a working copy of --rows rows for each size.
+A global plan (sorting) is shown for reference; it still needs run_plan.
+
+Run from the backend directory:
+
+    python benchmarks/preview_latency_benchmark.py [--rows N [N ...]] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dataframe_cache import dataframe_cache  # noqa: E402
+from services.excel_operations import PandasExecutor, preview_plan, run_plan  # noqa: E402
+from services.working_copy import WorkingCopy  # noqa: E402
+
+PLANS = {
+    'upper + trim': [
+        {'operation': 'upper_case', 'params': {'column': 'Name'}},
+        {'operation': 'trim_whitespace', 'params': {'columns': ['Name']}},
+    ],
+    'round': [{'operation': 'round_numbers', 'params': {'column': 'Amount', 'decimals': 1}}],
+    'format date': [{'operation': 'format_date', 'params': {'column': 'Date', 'format': '%d/%m/%Y'}}],
+    'sort (global)': [{'operation': 'sort_values', 'params': {'columns': ['Amount'], 'ascending': False}}],
+}
+
+
+def make_session(directory: str, rows: int) -> str:
+    """An upload whose working copy holds a sheet of ``rows`` rows"""
+    path = os.path.join(directory, f'bench_{rows}.xlsx')
+    pd.DataFrame({'Name': ['x']}).to_excel(path, sheet_name='Data', index=False)
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'Name': rng.choice([' alpha ', 'beta ', ' gamma', 'delta'], rows).astype(object),
+        'City': rng.choice(['Paris', 'Berlin', 'Rome', 'Madrid'], rows).astype(object),
+        'Amount': rng.random(rows) * 1000,
+        'Date': pd.date_range('2024-01-01', periods=rows, freq='min'),
+    })
+    WorkingCopy.create_from_excel(path).save_sheet('Data', df)
+    return path
+
+
+def best_of(repeat: int, function) -> float:
+    times = []
+    for _ in range(repeat):
+        # A new message's sheet is usually not parsed in this process yet
+        dataframe_cache.clear()
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"  {'rows':>9} {'plan':15} {'run_plan ms':>12} {'preview_plan ms':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = make_session(tmp, rows)
+            for name, steps in PLANS.items():
+                full = best_of(args.repeat, lambda: run_plan(path, 'Data', steps))
+                if PandasExecutor.is_row_local(steps):
+                    head = f"{best_of(args.repeat, lambda: preview_plan(path, 'Data', steps)) * 1000:16.1f}"
+                else:
+                    head = f"{'-':>16}"
+                print(f"  {rows:9d} {name:15} {full * 1000:12.1f} {head}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Prompt size of parse_user_request before and after the token budget.
+
+Builds the prompt for a wide sheet and a long session, the way it was built
+before (every column name, the last 5 messages verbatim, the current message
+twice) and with services.prompt_builder. Token counts use tiktoken when its
+encoding is available and len / 4 otherwise. Run from the backend directory:
+
+    python benchmarks/prompt_size_benchmark.py [--columns N] [--turns N] [--budget N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_builder import MESSAGE_OVERHEAD_TOKENS, PromptBuilder, count_tokens, load_encoding  # noqa: E402
+
+# Same size as AIExcelService.SYSTEM_PROMPT, which needs an API key to import
+SYSTEM_PROMPT_CHARS = 2900
+
+
+def make_session(columns: int, turns: int):
+    names = [f'Column {i} ({["Amount", "Date", "Region", "Name", "Status"][i % 5]})' for i in range(columns)]
+    sheet_info = {
+        'rows': 25000,
+        'columns': columns,
+        'column_names': names,
+        'column_profiles': {name: {'type': ['float', 'datetime', 'text', 'text', 'text'][i % 5], 'confidence': 1.0}
+                            for i, name in enumerate(names)}
+    }
+    history = []
+    for turn in range(turns):
+        history.append({'role': 'user', 'content': f'Please trim the spaces in {names[turn % columns]} and then sort everything by {names[(turn * 7) % columns]} descending'})
+        history.append({
+            'role': 'assistant',
+            'content': "I'll trim leading and trailing whitespace in the column and then sort all rows by the "
+                       "requested column in descending order so the largest values come first.\n\n"
+                       "Trimmed whitespace from text columns\nSorted by columns in descending order",
+            'metadata': {
+                'operation': 'trim_whitespace, sort_values',
+                'operations': [
+                    {'operation': 'trim_whitespace', 'params': {'columns': [names[turn % columns]]}},
+                    {'operation': 'sort_values', 'params': {'columns': [names[(turn * 7) % columns]], 'ascending': False}}
+                ]
+            }
+        })
+    message = f'Remove rows where {names[12 % columns]} is less than 10'
+    history.append({'role': 'user', 'content': message})
+    return message, history, sheet_info
+
+
+def previous_prompt_tokens(system_prompt: str, message: str, history, sheet_info) -> int:
+    """The prompt as parse_user_request built it before the budget"""
+    contents = [system_prompt]
+    context = "\n\nCurrent sheet information:\n"
+    context += f"Columns: {', '.join(sheet_info['column_names'])}\n"
+    context += f"Number of rows: {sheet_info['rows']}\n"
+    contents.append(context)
+    contents += [msg['content'] for msg in history[-5:]]
+    contents.append(message)
+    return sum(count_tokens(content) + MESSAGE_OVERHEAD_TOKENS for content in contents) + 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--columns', type=int, default=300)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--budget', type=int, default=1500)
+    args = parser.parse_args()
+    encoding = load_encoding()
+
+    system_prompt = ('You are an Excel data cleaning assistant. ' * 100)[:SYSTEM_PROMPT_CHARS]
+    message, history, sheet_info = make_session(args.columns, args.turns)
+
+    before = previous_prompt_tokens(system_prompt, message, history, sheet_info)
+    builder = PromptBuilder(system_prompt, budget=args.budget)
+    _, size = builder.build(message, history, sheet_info)
+    seconds = min(timeit.repeat(lambda: builder.build(message, history, sheet_info), number=10, repeat=3)) / 10
+
+    print(f'{args.columns} columns, {args.turns} turns, budget {args.budget} '
+          f"(token counts {'tiktoken' if encoding is not None else 'estimated as len/4'})")
+    print(f'  previous prompt  {before:7d} tokens')
+    print(f'  budgeted prompt  {size.total:7d} tokens ({size.describe()})')
+    print(f'  reduction        {1 - size.total / before:7.1%}')
+    print(f'  build time       {seconds * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
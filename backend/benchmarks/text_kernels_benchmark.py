@@ -0,0 +1,107 @@
+"""
+Text operations on a text-heavy sheet: astype(str) + .str against Arrow kernels.
+
+Builds a frame of --rows rows and --columns text columns (object dtype, as
+uploads are read, with some nulls) and runs each text operation over every
+column:
+
+- astype(str): the previous implementation, one Python string per cell,
+  nulls turned into "nan"/"None"
+- arrow: text_kernels.apply_text_functions, converting each column to an
+  Arrow string column once and running pyarrow.compute kernels that keep
+  nulls
+- arrow again: the same on columns already held as Arrow strings, i.e. a
+  later operation on the same columns
+
+"MB" is the size of the resulting columns (pandas deep memory usage).
+
+Run from the backend directory:
+
+    python benchmarks/text_kernels_benchmark.py [--rows N] [--columns N] [--repeat N]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_kernels import apply_text_functions  # noqa: E402
+
+# Text operations as the string functions they run, as the executor does
+OPERATIONS = {
+    'trim_whitespace': ['strip'],
+    'upper_case': ['upper'],
+    'capitalize': ['capitalize'],
+    'trim + upper (fused)': ['strip', 'upper'],
+}
+
+
+def make_frame(rows: int, columns: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    words = np.array(['alpha', 'Beta', 'GAMMA', 'delta', 'epsilon', 'Zeta', 'eta', 'THETA'])
+    data = {}
+    for index in range(columns):
+        # Distinct strings per cell, like real data, not a few shared objects
+        values = np.char.add(np.char.add(' ', rng.choice(words, rows)), rng.integers(0, 100000, rows).astype(str))
+        values = np.char.add(values, ' ').astype(object)
+        values[rng.random(rows) < 0.05] = None
+        data[f'Text {index}'] = values
+    return pd.DataFrame(data)
+
+
+def previous(series: pd.Series, functions: list) -> pd.Series:
+    """The previous implementation of the text operations"""
+    if len(functions) == 1:
+        return getattr(series.astype(str).str, functions[0])()
+    callables = [getattr(str, name) for name in functions]
+
+    def transform(value: str) -> str:
+        for function in callables:
+            value = function(value)
+        return value
+    return series.astype(str).map(transform)
+
+
+def run(df: pd.DataFrame, function, functions: list, repeat: int) -> tuple:
+    """Best time over ``repeat`` runs and the size of the result"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        started = time.perf_counter()
+        result = {col: function(df[col], functions) for col in df.columns}
+        best = min(best, time.perf_counter() - started)
+    size = sum(series.memory_usage(index=False, deep=True) for series in result.values())
+    return best, size, pd.DataFrame(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.columns)
+    source_mb = df.memory_usage(index=False, deep=True).sum() / 1e6
+    print(f'{args.rows} rows x {args.columns} text columns, {source_mb:.0f} MB as objects')
+    print(f"  {'operation':22} {'astype(str) s':>13} {'MB':>6} {'arrow s':>8} {'MB':>6} {'arrow again s':>13} {'nulls kept':>10}")
+
+    for name, functions in OPERATIONS.items():
+        old_seconds, old_size, old = run(df, previous, functions, args.repeat)
+        del old
+        new_seconds, new_size, new = run(df, apply_text_functions, functions, args.repeat)
+        again_seconds, _, _ = run(new, apply_text_functions, functions, args.repeat)
+        nulls_kept = int(new.isna().sum().sum()) == int(df.isna().sum().sum())
+        del new
+        print(f"  {name:22} {old_seconds:13.2f} {old_size / 1e6:6.0f} {new_seconds:8.2f} {new_size / 1e6:6.0f} "
+              f"{again_seconds:13.2f} {str(nulls_kept):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Token accounting when one user sends many chat messages at once.
+
+Every client thread sends messages for the same user, whose daily allowance
+is smaller than the number of messages, against a fresh SQLite file (pooled,
+WAL) per profile. A message that gets a token "runs its plan" (sleeps for
+--plan-ms); the rest are refused:
+
+- read-check-write: the previous accounting. The token is checked with a
+  locking SELECT when the message arrives, and spent after the plan by
+  reading the row again and writing the incremented count back
+- conditional-update: UserRepository.consume_token, a single
+  UPDATE ... RETURNING before the plan
+
+Plans run beyond the allowance are double-spent tokens. "accounting ms" is
+the time spent in the token statements per message, i.e. mostly waiting on
+the other writers.
+
+Run from the backend directory:
+
+    python benchmarks/token_contention_benchmark.py [--clients N] [--messages N] [--tokens N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import create_db_engine  # noqa: E402
+from models.base import Base  # noqa: E402
+from models.user import User  # noqa: E402
+from repositories.user_repository import UserRepository  # noqa: E402
+
+USER_ID = 'bench-user'
+
+
+def read_check_write(Session, plan_seconds: float) -> tuple:
+    """The previous accounting: returns (plan ran, seconds spent on tokens)"""
+    accounting = 0.0
+
+    began = time.perf_counter()
+    db = Session()
+    try:
+        user = db.query(User).filter_by(id=USER_ID).first()
+        locked = db.query(User).filter_by(id=USER_ID).with_for_update().one()
+        if locked.last_token_reset.date() < datetime.now(timezone.utc).date():
+            locked.tokens_used_today = 0
+            locked.last_token_reset = datetime.now(timezone.utc)
+        allowed = user.daily_tokens - locked.tokens_used_today > 0
+        db.commit()
+    finally:
+        db.close()
+    accounting += time.perf_counter() - began
+    if not allowed:
+        return False, accounting
+
+    time.sleep(plan_seconds)
+
+    began = time.perf_counter()
+    db = Session()
+    try:
+        db.query(User).filter_by(id=USER_ID).first()
+        locked = db.query(User).filter_by(id=USER_ID).with_for_update().one()
+        if locked.daily_tokens - locked.tokens_used_today > 0:
+            locked.tokens_used_today += 1
+        db.commit()
+    finally:
+        db.close()
+    accounting += time.perf_counter() - began
+    return True, accounting
+
+
+def conditional_update(Session, plan_seconds: float) -> tuple:
+    """UserRepository.consume_token: returns (plan ran, seconds spent on tokens)"""
+    began = time.perf_counter()
+    db = Session()
+    try:
+        remaining = UserRepository(db).consume_token(USER_ID)
+    finally:
+        db.close()
+    accounting = time.perf_counter() - began
+    if remaining is None:
+        return False, accounting
+
+    time.sleep(plan_seconds)
+    return True, accounting
+
+
+def run_profile(name: str, send, clients: int, messages: int, tokens: int, plan_seconds: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = Session()
+        try:
+            user = UserRepository(db).create(USER_ID, f'{USER_ID}@example.com')
+            user.daily_tokens = tokens
+            db.commit()
+        finally:
+            db.close()
+
+        plans = 0
+        accounting = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(clients + 1)
+
+        def client():
+            nonlocal plans
+            start.wait()
+            for _ in range(messages):
+                try:
+                    ran, seconds = send(Session, plan_seconds)
+                except Exception as e:
+                    with lock:
+                        errors.append(type(e).__name__)
+                    continue
+                with lock:
+                    plans += ran
+                    accounting.append(seconds)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        db = Session()
+        try:
+            used = db.query(User).filter_by(id=USER_ID).one().tokens_used_today
+        finally:
+            db.close()
+        engine.dispose()
+
+    accounting.sort()
+    return {
+        'name': name,
+        'plans': plans,
+        'recorded': used,
+        'double_spent': max(plans - tokens, 0),
+        'errors': len(errors),
+        'elapsed': elapsed,
+        'p50': statistics.median(accounting) if accounting else float('nan'),
+        'p95': accounting[int(len(accounting) * 0.95)] if accounting else float('nan'),
+        'total': sum(accounting),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--messages', type=int, default=10)
+    parser.add_argument('--tokens', type=int, default=100, help='daily allowance of the user')
+    parser.add_argument('--plan-ms', type=float, default=20, help='time a plan takes to run')
+    args = parser.parse_args()
+
+    print(f'{args.clients} clients x {args.messages} messages, one user with {args.tokens} tokens')
+    print(f"  {'profile':20} {'plans':>6} {'recorded':>8} {'double':>6} {'errors':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'total s':>8}")
+    for name, send in (('read-check-write', read_check_write), ('conditional-update', conditional_update)):
+        result = run_profile(name, send, args.clients, args.messages, args.tokens, args.plan_ms / 1000)
+        print(f"  {result['name']:20} {result['plans']:6d} {result['recorded']:8d} {result['double_spent']:6d} "
+              f"{result['errors']:6d} {result['p50'] * 1000:8.1f} {result['p95'] * 1000:8.1f} {result['total']:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Undo, redo and restoring a version of a session's file.
+
+Uploads a generated workbook, applies --plans plans with run_plan (as the
+job workers do), then times moving between versions with VersionStore:
+undo and redo of one plan, and restoring several older versions. The
+baseline is what getting an older version took before: uploading the
+workbook again (parsing the XLSX) and redoing every plan up to it.
+
+Run from the backend directory:
+
+    python benchmarks/version_store_benchmark.py [--rows N] [--plans N] [--checkpoint-every N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Plans applied in turn; none of them changes the number of rows much
+PLANS = [
+    [{'operation': 'trim_whitespace', 'params': {}}],
+    [{'operation': 'upper_case', 'params': {'column': 'Name'}}],
+    [{'operation': 'sort_values', 'params': {'columns': ['Amount'], 'ascending': False}}],
+    [{'operation': 'fill_na', 'params': {'columns': ['Score'], 'value': 0}}],
+    [{'operation': 'lower_case', 'params': {'column': 'City'}}],
+    [{'operation': 'round_numbers', 'params': {'column': 'Amount', 'decimals': 1}}],
+    [{'operation': 'sort_values', 'params': {'columns': ['Id'], 'ascending': True}}],
+    [{'operation': 'replace_value', 'params': {'column': 'City', 'old_value': 'paris', 'new_value': 'Paris'}}],
+]
+
+
+def make_workbook(path: str, rows: int) -> None:
+    rng = np.random.default_rng(0)
+    score = rng.random(rows) * 100
+    score[rng.random(rows) < 0.1] = np.nan
+    pd.DataFrame({
+        'Id': np.arange(rows),
+        'Name': [f' name {i % 997} ' for i in range(rows)],
+        'City': rng.choice(['Paris', 'Berlin', 'Rome', 'Madrid'], rows),
+        'Amount': rng.random(rows) * 1000,
+        'Score': score,
+        'Date': pd.date_range('2024-01-01', periods=rows, freq='min'),
+    }).to_excel(path, sheet_name='Data', index=False)
+
+
+def timed(function) -> float:
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def reupload(path: str, plans: int) -> float:
+    """The previous way back to a version: parse the upload again and redo the plans"""
+    from services.excel_operations import PandasExecutor
+
+    def run():
+        df = pd.read_excel(path, sheet_name='Data')
+        executor = PandasExecutor(path, 'Data', df=df)
+        for index in range(plans):
+            executor.execute_plan(PLANS[index % len(PLANS)])
+    return timed(run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--plans', type=int, default=20)
+    parser.add_argument('--checkpoint-every', type=int, default=5)
+    parser.add_argument('--max-checkpoints', type=int, default=10)
+    args = parser.parse_args()
+
+    # The checkpoint policy is read when the store is imported; only the
+    # number of plans triggers checkpoints here
+    os.environ['VERSION_CHECKPOINT_EVERY'] = str(args.checkpoint_every)
+    os.environ['VERSION_CHECKPOINT_SECONDS'] = 'inf'
+    os.environ['VERSION_MAX_CHECKPOINTS'] = str(args.max_checkpoints)
+    from services.excel_operations import run_plan
+    from services.version_store import VersionStore
+    from services.working_copy import WorkingCopy
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.xlsx')
+        make_workbook(path, args.rows)
+        working_copy = WorkingCopy.create_from_excel(path)
+
+        apply_seconds = []
+        for index in range(args.plans):
+            started = time.perf_counter()
+            result = run_plan(path, 'Data', PLANS[index % len(PLANS)])
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            apply_seconds.append(time.perf_counter() - started)
+
+        sheet_bytes = os.path.getsize(working_copy.sheet_path('Data'))
+        versions = VersionStore.for_file(path)
+        print(f"{args.rows} rows, {args.plans} plans ({sum(apply_seconds) / len(apply_seconds) * 1000:.1f} ms each), "
+              f"checkpoint every {args.checkpoint_every}")
+        print(f"  checkpoints: {versions.log['checkpoints']['Data']}, "
+              f"{versions.disk_usage() / 1e6:.1f} MB ({versions.disk_usage() / sheet_bytes:.1f}x the sheet)")
+        print(f"  {'move':22} {'version store ms':>16} {'re-upload ms':>13}")
+
+        latest = versions.latest
+        moves = [('undo', latest - 1), ('redo', latest)]
+        moves += [(f'restore {version}', version) for version in (latest // 2, 1, 0, latest)]
+        for name, version in moves:
+            seconds = timed(lambda: VersionStore.for_file(path).checkout(version))
+            print(f"  {name:22} {seconds * 1000:16.1f} {reupload(path, version) * 1000:13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,46 @@
 from flask import request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from repositories.user_repository import UserRepository
 from repositories.ai_session_repository import AISessionRepository
+from repositories.ai_job_repository import AIJobRepository
+from models.ai_job import AIJob
 from services.ai_service import AIExcelService
+from services.excel_operations import PandasExecutor
 from services.file_service import FileService
+from services.dataframe_cache import dataframe_cache
+from services.llm_response_cache import llm_response_cache
+from services.token_allowance_cache import token_allowance_cache
+from services.intent_parser import intent_parser
+from services.working_copy import WorkingCopy
+from services.upload_ingest import MAX_UPLOAD_BYTES, UploadSpool
+from services.blob_store import BlobStore
+from services.job_queue import JOB_TIMEOUT_SECONDS, job_queue, run_plan_job, session_jobs_finished, wait_for_session_jobs
+from services.version_store import VersionStore
+from services.file_lock import file_lock
 from database import get_db_session
 import os
 import uuid
+import asyncio
+import functools
 import logging
+from typing import Any, Callable, Dict, Optional
 from datetime import datetime, timezone, timedelta
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Rows per preview page, by default and at most
+DEFAULT_PREVIEW_ROWS = 5
+MAX_PREVIEW_ROWS = 1000
+
+# Messages per page of a session's conversation, by default and at most
+DEFAULT_HISTORY_MESSAGES = 50
+MAX_HISTORY_MESSAGES = 200
+
+# Seconds /chat waits for the plan before answering with a job to poll
+CHAT_JOB_WAIT_SECONDS = float(os.environ.get('CHAT_JOB_WAIT_SECONDS', '10'))
+
 class AIController:
     """Controller for AI-powered Excel operations"""
     
@@ -23,6 +51,8 @@ class AIController:
         
         # Ensure upload folder exists
         os.makedirs(self.upload_folder, exist_ok=True)
+        
+        self.blob_store = BlobStore(os.path.join(self.upload_folder, 'blobs'))
     
     @property
     def ai_service(self):
@@ -64,11 +94,15 @@ class AIController:
                 return jsonify({'error': 'Invalid file type. Only XLSX and XLS files are supported'}), 400
             
             # Check file size (20MB limit)
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
+            if isinstance(file.stream, UploadSpool):
+                # Measured while the request body was spooled to disk
+                file_size = file.stream.size
+            else:
+                file.seek(0, os.SEEK_END)
+                file_size = file.tell()
+                file.seek(0)
             
-            if file_size > 20 * 1024 * 1024:  # 20MB
+            if file_size > MAX_UPLOAD_BYTES:
                 return jsonify({'error': 'File size exceeds 20MB limit'}), 400
             
             # Get or create user
@@ -78,8 +112,8 @@ class AIController:
                 user = user_repo.get_or_create(user_id, email)
                 
                 # Check if user has tokens
-                if not user.can_use_token(db):
-                    remaining_tokens = user.get_remaining_tokens(db)
+                if not user.can_use_token():
+                    remaining_tokens = user.get_remaining_tokens()
                     next_reset = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
                     return jsonify({
                         'error': "You've reached your daily limit of AI operations! 🤖",
@@ -89,15 +123,29 @@ class AIController:
                         'next_reset': next_reset.isoformat()
                     }), 403
                 
-                # Save file
+                # Store the content once, keyed by its hash, and give the session
+                # its own hard link to it
                 filename = secure_filename(file.filename)
                 unique_filename = f"{uuid.uuid4()}_{filename}"
                 file_path = os.path.join(self.upload_folder, unique_filename)
-                file.save(file_path)
-                
-                # Analyze spreadsheet to get sheets
-                file.seek(0)
-                spreadsheet_data = self.file_service.analyze_xlsx_file(file)
+                if isinstance(file.stream, UploadSpool):
+                    digest, blob_path = self.blob_store.add(file.stream.name, file.stream.sha256)
+                else:
+                    file.save(file_path)
+                    digest, blob_path = self.blob_store.add(file_path)
+                self.blob_store.checkout(digest, file_path)
+                logger.info(f'Stored upload {unique_filename} ({file_size} bytes, sha256 {digest})')
+                
+                # Known content skips analysis entirely. Sheet names otherwise come
+                # from a streaming read of the workbook.
+                spreadsheet_data = self.blob_store.load_analysis(digest)
+                if spreadsheet_data is None:
+                    spreadsheet_data = self.file_service.analyze_xlsx_file(blob_path)
+                    self.blob_store.save_analysis(digest, spreadsheet_data)
+                
+                # The columnar working copy is converted once per content and
+                # shared copy-on-write, in the background
+                WorkingCopy.create_in_background(file_path, base_path=blob_path)
                 
                 sheet_names = [sheet.spreadsheet_name for sheet in spreadsheet_data]
                 
@@ -115,20 +163,27 @@ class AIController:
                     'file_name': filename,
                     'sheets': sheet_names,
                     'selected_sheet': session.selected_sheet,
-                    'tokens_remaining': user.get_remaining_tokens(db)
+                    'tokens_remaining': user.get_remaining_tokens()
                 }), 201
                 
             finally:
                 db.close()
                 
+        except RequestEntityTooLarge:
+            return jsonify({'error': 'File size exceeds 20MB limit'}), 400
         except Exception as e:
             logger.error(f'Error uploading file: {str(e)}', exc_info=True)
             return jsonify({'error': 'Failed to upload file. Please try again.'}), 500
     
-    def send_message(self):
+    async def send_message(self):
         """
         Send a message to the AI assistant
         
+        The model is awaited rather than blocking the thread. The plan runs as
+        a job on a worker process; if it takes longer than
+        CHAT_JOB_WAIT_SECONDS the response is 202 with a job_id to poll at
+        /api/ai/jobs/<job_id>.
+        
         Required (JSON body):
         - session_id: AI session ID
         - message: User's message
@@ -167,17 +222,8 @@ class AIController:
                 user_repo = UserRepository(db)
                 user = user_repo.get_by_id(user_id)
                 
-                if not user or not user.can_use_token(db):
-                    remaining_tokens = user.get_remaining_tokens(db) if user else 0
-                    daily_limit = user.daily_tokens if user else 10
-                    next_reset = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-                    return jsonify({
-                        'error': "Oops! You've used up all your AI tokens for today! 🎯",
-                        'message': f"Your daily limit is {daily_limit} tokens. They'll refresh at midnight UTC, so check back tomorrow to continue your Excel wizardry!",
-                        'tokens_remaining': remaining_tokens,
-                        'daily_limit': daily_limit,
-                        'next_reset': next_reset.isoformat()
-                    }), 403
+                if not user or not user.can_use_token():
+                    return self._out_of_tokens(user)
                 
                 # Add user message to conversation
                 session_repo.add_message(session_id, 'user', user_message)
@@ -188,20 +234,30 @@ class AIController:
                     try:
                         sheet_info = self.ai_service.get_sheet_info(
                             session.file_path, 
-                            session.selected_sheet
+                            session.selected_sheet,
+                            include_profiles=True
                         )
                     except Exception:
                         pass
                 
+                # The current message and the window sent along with it
+                conversation_history = session_repo.get_conversation_context(
+                    session_id,
+                    self.ai_service.HISTORY_WINDOW + 1
+                )
+                
+                # Release the connection (and its read transaction) while
+                # waiting on the model
+                db.commit()
+                
                 # Parse user request with AI
-                conversation_history = session.get_conversation_context()
-                ai_response = self.ai_service.parse_user_request(
+                ai_response = await self.ai_service.aparse_user_request(
                     user_message, 
                     conversation_history,
                     sheet_info
                 )
                 
-                # If it's an error response, don't execute or deduct tokens
+                # If it's an error response, don't execute or spend tokens
                 if ai_response['type'] == 'error':
                     # Add AI response to conversation
                     response_text = ai_response['message']
@@ -214,63 +270,100 @@ class AIController:
                         'type': 'error',
                         'message': ai_response['message'],
                         'suggestion': ai_response.get('suggestion'),
-                        'tokens_remaining': user.get_remaining_tokens(db)
+                        'tokens_remaining': user.get_remaining_tokens()
                     }), 200
                 
-                # Execute the operation
-                operation = ai_response['operation']
-                params = ai_response['params']
+                # Execute all requested operations in one load/save cycle, on
+                # a job worker process
+                steps = ai_response['operations']
                 explanation = ai_response.get('explanation', '')
                 
-                result = self.ai_service.execute_operation(
-                    session.file_path,
-                    session.selected_sheet,
-                    operation,
-                    params
-                )
+                # Spend the token before running the plan, in one conditional
+                # statement, so parallel messages can't run more plans than the
+                # allowance; the job refunds it if the plan fails
+                tokens_remaining = user_repo.consume_token(user_id)
+                token_allowance_cache.invalidate(user_id)
+                if tokens_remaining is None:
+                    return self._out_of_tokens(user_repo.get_by_id(user_id))
                 
-                if not result['success']:
-                    # Operation failed, don't deduct tokens
-                    error_message = f"Operation failed: {result.get('error', 'Unknown error')}"
-                    session_repo.add_message(session_id, 'assistant', error_message)
-                    
-                    return jsonify({
-                        'type': 'error',
-                        'message': error_message,
-                        'tokens_remaining': user.get_remaining_tokens(db)
-                    }), 200
+                job_repo = AIJobRepository(db)
                 
-                # Operation succeeded - deduct token
-                user_repo.update_tokens(user_id)
-                
-                # Prepare response
-                operation_result = result['result']
-                preview = result['preview']
-                stats = result['stats']
-                
-                response_text = f"{explanation}\n\n{operation_result['summary']}"
-                
-                # Add AI response to conversation with metadata
-                session_repo.add_message(
-                    session_id, 
-                    'assistant', 
-                    response_text,
-                    metadata={
-                        'operation': operation,
-                        'params': params,
-                        'stats': stats
-                    }
+                # The first rows of a row-local plan's result only need the
+                # first rows of the sheet, if no earlier job is still changing it
+                preview_early = (
+                    session.selected_sheet
+                    and PandasExecutor.is_row_local(steps)
+                    and WorkingCopy.for_file(session.file_path).exists()
+                    and not job_repo.has_unfinished(session_id, max_age_seconds=JOB_TIMEOUT_SECONDS)
+                )
+                
+                job = job_repo.create(session_id, user_id, steps, explanation)
+                # Handed to a worker once the session's earlier jobs finished,
+                # so plans apply in the order they were sent
+                finished = job_queue.submit(
+                    run_plan_job,
+                    job.id,
+                    session.file_path,
+                    session.selected_sheet,
+                    steps,
+                    on_done=functools.partial(self._finish_job, job.id),
+                    ready=functools.partial(session_jobs_finished, session_id, job.created_at)
                 )
+                # Nor while waiting on the job
+                db.commit()
+                
+                if preview_early:
+                    # Answer with the preview now, the job applies the plan to
+                    # the rest of the sheet (the next job, preview, download
+                    # or undo of the session waits for it). The answer is only
+                    # provisional: the job's result, with the stats and the
+                    # outcome on the whole sheet, is the one that counts
+                    try:
+                        preview = self.ai_service.preview_plan(
+                            session.file_path,
+                            session.selected_sheet,
+                            steps,
+                            DEFAULT_PREVIEW_ROWS
+                        )
+                    except Exception:
+                        # E.g. a step failing on these rows; the job reports it
+                        logger.warning(f'Could not preview job {job.id} early', exc_info=True)
+                    else:
+                        note = 'Updated the preview, the rest of the sheet is being updated.'
+                        return jsonify({
+                            'type': 'pending',
+                            'provisional': True,
+                            'message': f"{explanation}\n\n{note}",
+                            'operation': ', '.join(step['operation'] for step in steps),
+                            'operations': steps,
+                            'summary': note,
+                            'preview': preview,
+                            'job_id': job.id,
+                            'status': job.status,
+                            'tokens_remaining': tokens_remaining
+                        }), 200
+                
+                # Most plans finish quickly and are answered right away; slow
+                # ones keep running and the client polls the job instead
+                try:
+                    await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(finished)), CHAT_JOB_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                
+                # The outcome is recorded by another database session
+                db.expire_all()
+                job = job_repo.get_by_id(job.id)
+                
+                if job.is_finished():
+                    return jsonify(job.result), 200
                 
                 return jsonify({
-                    'type': 'success',
-                    'message': response_text,
-                    'operation': operation,
-                    'summary': operation_result['summary'],
-                    'preview': preview,
-                    'stats': stats,
-                    'tokens_remaining': user.get_remaining_tokens(db)
-                }), 200
+                    'type': 'pending',
+                    'message': 'Still working on it, this is a large sheet.',
+                    'job_id': job.id,
+                    'status': job.status,
+                    'tokens_remaining': tokens_remaining
+                }), 202
                 
             finally:
                 db.close()
@@ -279,12 +372,154 @@ class AIController:
             logger.error(f'Error processing message: {str(e)}', exc_info=True)
             return jsonify({'error': 'Failed to process message. Please try again.'}), 500
     
+    def _out_of_tokens(self, user):
+        """Response to a chat message from a user with no tokens left"""
+        remaining_tokens = user.get_remaining_tokens() if user else 0
+        daily_limit = user.daily_tokens if user else 10
+        next_reset = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return jsonify({
+            'error': "Oops! You've used up all your AI tokens for today! 🎯",
+            'message': f"Your daily limit is {daily_limit} tokens. They'll refresh at midnight UTC, so check back tomorrow to continue your Excel wizardry!",
+            'tokens_remaining': max(remaining_tokens, 0),
+            'daily_limit': daily_limit,
+            'next_reset': next_reset.isoformat()
+        }), 403
+    
+    def _finish_job(self, job_id: str, result, error) -> None:
+        """
+        Record the outcome of a chat message's job
+        
+        Runs in this process once the worker returned: adds the assistant's
+        message on success, refunds the token spent on the message on failure,
+        and stores the response the chat request would have returned so the
+        client can fetch it later.
+        """
+        db = get_db_session()
+        try:
+            job_repo = AIJobRepository(db)
+            session_repo = AISessionRepository(db)
+            user_repo = UserRepository(db)
+            job = job_repo.get_by_id(job_id)
+            
+            if job.is_finished():
+                # Already reported as interrupted (and refunded) by get_job
+                logger.warning(f'Job {job_id} finished after it timed out')
+                return
+            
+            if error is not None or not result['success']:
+                # Operation failed, give the token back
+                reason = str(error) if error is not None else result.get('error', 'Unknown error')
+                error_message = f"Operation failed: {reason}"
+                session_repo.add_message(job.session_id, 'assistant', error_message)
+                
+                tokens_remaining = user_repo.refund_token(job.user_id, job.created_at)
+                token_allowance_cache.invalidate(job.user_id)
+                if tokens_remaining is None:
+                    tokens_remaining = user_repo.get_remaining_tokens(job.user_id)
+                job_repo.finish(job_id, AIJob.FAILED, {
+                    'type': 'error',
+                    'message': error_message,
+                    'job_id': job_id,
+                    'tokens_remaining': tokens_remaining
+                })
+                return
+            
+            if result['result']['plan']['rewrites']:
+                logger.info(f"Optimized plan for session {job.session_id}: {result['result']['plan']['rewrites']}")
+            
+            # Prepare response
+            steps = job.operations
+            operation_result = result['result']
+            preview = result['preview']
+            stats = result['stats']
+            
+            response_text = f"{job.explanation or ''}\n\n{operation_result['summary']}"
+            operation = ', '.join(operation_result['operations'])
+            
+            # Add AI response to conversation with metadata
+            session_repo.add_message(
+                job.session_id, 
+                'assistant', 
+                response_text,
+                metadata={
+                    'operation': operation,
+                    'operations': steps,
+                    'stats': stats
+                }
+            )
+            
+            job_repo.finish(job_id, AIJob.SUCCEEDED, {
+                'type': 'success',
+                'message': response_text,
+                'operation': operation,
+                'operations': steps,
+                'summary': operation_result['summary'],
+                'step_summaries': [step['summary'] for step in operation_result['steps']],
+                'preview': preview,
+                'stats': stats,
+                'version': result['version'],
+                'job_id': job_id,
+                'tokens_remaining': user_repo.get_remaining_tokens(job.user_id)
+            })
+            
+        finally:
+            db.close()
+    
+    def get_job(self):
+        """
+        Get the status of a chat message's job, and its response once finished
+        
+        URL param: job_id
+        Query param: user_id
+        """
+        try:
+            job_id = request.view_args.get('job_id')
+            user_id = request.args.get('user_id')
+            
+            if not job_id or not user_id:
+                return jsonify({'error': 'job_id and user_id are required'}), 400
+            
+            db = get_db_session()
+            try:
+                job_repo = AIJobRepository(db)
+                job = job_repo.get_by_id(job_id)
+                
+                if not job:
+                    return jsonify({'error': 'Job not found'}), 404
+                
+                if job.user_id != user_id:
+                    return jsonify({'error': 'Unauthorized'}), 403
+                
+                if not job.is_finished() and job.age_seconds() > JOB_TIMEOUT_SECONDS:
+                    # Its worker is gone, give the token back
+                    user_repo = UserRepository(db)
+                    tokens_remaining = user_repo.refund_token(user_id, job.created_at)
+                    token_allowance_cache.invalidate(user_id)
+                    if tokens_remaining is None:
+                        tokens_remaining = user_repo.get_remaining_tokens(user_id)
+                    job = job_repo.finish(job_id, AIJob.FAILED, {
+                        'type': 'error',
+                        'message': 'Operation failed: the job was interrupted. Please try again.',
+                        'job_id': job_id,
+                        'tokens_remaining': tokens_remaining
+                    })
+                
+                return jsonify(job.to_dict()), 200
+                
+            finally:
+                db.close()
+                
+        except Exception as e:
+            logger.error(f'Error getting job: {str(e)}', exc_info=True)
+            return jsonify({'error': 'Failed to retrieve job.'}), 500
+    
     def get_session(self):
         """
-        Get session details
+        Get session details with a page of its conversation
         
         URL param: session_id
-        Query param: user_id
+        Query params: user_id, limit (default 50, max 200), cursor (optional,
+        the next_cursor of the previous page, to get older messages)
         """
         try:
             session_id = request.view_args.get('session_id')
@@ -293,6 +528,16 @@ class AIController:
             if not session_id or not user_id:
                 return jsonify({'error': 'session_id and user_id are required'}), 400
             
+            try:
+                limit = int(request.args.get('limit', DEFAULT_HISTORY_MESSAGES))
+                cursor = request.args.get('cursor')
+                cursor = int(cursor) if cursor is not None else None
+            except ValueError:
+                return jsonify({'error': 'limit and cursor must be integers'}), 400
+            
+            if limit < 1 or limit > MAX_HISTORY_MESSAGES:
+                return jsonify({'error': f'limit must be between 1 and {MAX_HISTORY_MESSAGES}'}), 400
+            
             db = get_db_session()
             try:
                 session_repo = AISessionRepository(db)
@@ -304,7 +549,11 @@ class AIController:
                 if session.user_id != user_id:
                     return jsonify({'error': 'Unauthorized'}), 403
                 
-                return jsonify(session.to_dict()), 200
+                messages, next_cursor = session_repo.get_messages(session_id, before=cursor, limit=limit)
+                
+                response = session.to_dict(messages)
+                response['next_cursor'] = next_cursor
+                return jsonify(response), 200
                 
             finally:
                 db.close()
@@ -315,10 +564,11 @@ class AIController:
     
     def get_preview(self):
         """
-        Get sheet preview
+        Get a page of the sheet
         
         URL param: session_id
-        Query param: user_id
+        Query params: user_id, offset (default 0), limit (default 5, max 1000),
+        columns (optional, repeatable) to only return some columns
         """
         try:
             session_id = request.view_args.get('session_id')
@@ -327,6 +577,17 @@ class AIController:
             if not session_id or not user_id:
                 return jsonify({'error': 'session_id and user_id are required'}), 400
             
+            try:
+                offset = int(request.args.get('offset', 0))
+                limit = int(request.args.get('limit', DEFAULT_PREVIEW_ROWS))
+            except ValueError:
+                return jsonify({'error': 'offset and limit must be integers'}), 400
+            
+            if offset < 0 or limit < 1 or limit > MAX_PREVIEW_ROWS:
+                return jsonify({'error': f'offset must be at least 0 and limit between 1 and {MAX_PREVIEW_ROWS}'}), 400
+            
+            columns = request.args.getlist('columns') or None
+            
             db = get_db_session()
             try:
                 session_repo = AISessionRepository(db)
@@ -341,21 +602,35 @@ class AIController:
                 if not session.selected_sheet:
                     return jsonify({'error': 'No sheet selected'}), 400
                 
-                preview = self.ai_service.get_sheet_preview(
-                    session.file_path,
-                    session.selected_sheet,
-                    n_rows=5
-                )
+                # Rows past the first ones may still be changing
+                wait_for_session_jobs(db, session_id)
                 
                 stats = self.ai_service.get_sheet_info(
                     session.file_path,
                     session.selected_sheet
                 )
                 
+                if columns is not None:
+                    unknown = [col for col in columns if col not in stats['column_names']]
+                    if unknown:
+                        return jsonify({'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+                
+                preview = self.ai_service.get_sheet_page(
+                    session.file_path,
+                    session.selected_sheet,
+                    offset=offset,
+                    limit=limit,
+                    columns=columns
+                )
+                
                 return jsonify({
                     'preview': preview,
                     'stats': stats,
-                    'sheet_name': session.selected_sheet
+                    'sheet_name': session.selected_sheet,
+                    'offset': offset,
+                    'limit': limit,
+                    'total_rows': stats['rows'],
+                    'columns': columns or stats['column_names']
                 }), 200
                 
             finally:
@@ -365,6 +640,144 @@ class AIController:
             logger.error(f'Error getting preview: {str(e)}', exc_info=True)
             return jsonify({'error': 'Failed to retrieve preview.'}), 500
     
+    def get_versions(self):
+        """
+        Get the versions of a session's file, to undo, redo or restore one
+        
+        URL param: session_id
+        Query param: user_id
+        """
+        try:
+            session_id = request.view_args.get('session_id')
+            user_id = request.args.get('user_id')
+            
+            if not session_id or not user_id:
+                return jsonify({'error': 'session_id and user_id are required'}), 400
+            
+            db = get_db_session()
+            try:
+                session_repo = AISessionRepository(db)
+                session = session_repo.get_by_id(session_id)
+                
+                if not session:
+                    return jsonify({'error': 'Session not found'}), 404
+                
+                if session.user_id != user_id:
+                    return jsonify({'error': 'Unauthorized'}), 403
+                
+                wait_for_session_jobs(db, session_id)
+                versions = VersionStore.for_file(session.file_path)
+                
+                return jsonify({
+                    'current_version': versions.current,
+                    'latest_version': versions.latest,
+                    'can_undo': versions.current > 0,
+                    'can_redo': versions.current < versions.latest,
+                    'versions': versions.history()
+                }), 200
+                
+            finally:
+                db.close()
+                
+        except Exception as e:
+            logger.error(f'Error getting versions: {str(e)}', exc_info=True)
+            return jsonify({'error': 'Failed to retrieve versions.'}), 500
+    
+    def undo(self):
+        """
+        Undo the last operations applied to a session's file
+        
+        Required (JSON body): session_id, user_id
+        """
+        return self._checkout_version(lambda versions, data: versions.current - 1, 'Nothing to undo')
+    
+    def redo(self):
+        """
+        Redo the last undone operations of a session's file
+        
+        Required (JSON body): session_id, user_id
+        """
+        return self._checkout_version(lambda versions, data: versions.current + 1, 'Nothing to redo')
+    
+    def restore_version(self):
+        """
+        Bring a session's file to any of its versions
+        
+        Required (JSON body): session_id, user_id, version (0 is the upload)
+        """
+        return self._checkout_version(
+            lambda versions, data: data.get('version'),
+            'version must be the number of an existing version'
+        )
+    
+    def _checkout_version(
+        self,
+        choose_version: Callable[[VersionStore, Dict[str, Any]], Optional[int]],
+        invalid_message: str
+    ):
+        """
+        Move a session's file to the version picked by ``choose_version``
+        
+        Sheets are rebuilt from their nearest checkpoint (see VersionStore),
+        under the session's job lock so no plan runs meanwhile.
+        """
+        try:
+            data = request.get_json()
+            
+            if not data:
+                return jsonify({'error': 'No JSON body provided'}), 400
+            
+            session_id = data.get('session_id')
+            user_id = data.get('user_id')
+            
+            if not session_id or not user_id:
+                return jsonify({'error': 'session_id and user_id are required'}), 400
+            
+            db = get_db_session()
+            try:
+                session_repo = AISessionRepository(db)
+                session = session_repo.get_by_id(session_id)
+                
+                if not session:
+                    return jsonify({'error': 'Session not found'}), 404
+                
+                if session.user_id != user_id:
+                    return jsonify({'error': 'Unauthorized'}), 403
+                
+                # Undo the last message's operations, not the one before
+                wait_for_session_jobs(db, session_id)
+                
+                with file_lock(session.file_path + '.job.lock'):
+                    versions = VersionStore.for_file(session.file_path)
+                    version = choose_version(versions, data)
+                    if isinstance(version, bool) or not isinstance(version, int) or not 0 <= version <= versions.latest:
+                        return jsonify({'error': invalid_message}), 400
+                    changed_sheets = versions.checkout(version)
+                
+                response = {
+                    'success': True,
+                    'version': version,
+                    'latest_version': versions.latest,
+                    'changed_sheets': changed_sheets
+                }
+                if session.selected_sheet:
+                    response['sheet_name'] = session.selected_sheet
+                    response['preview'] = self.ai_service.get_sheet_page(
+                        session.file_path,
+                        session.selected_sheet,
+                        limit=DEFAULT_PREVIEW_ROWS
+                    )
+                    response['stats'] = self.ai_service.get_sheet_info(session.file_path, session.selected_sheet)
+                
+                return jsonify(response), 200
+                
+            finally:
+                db.close()
+                
+        except Exception as e:
+            logger.error(f'Error changing version: {str(e)}', exc_info=True)
+            return jsonify({'error': 'Failed to change version.'}), 500
+    
     def download_file(self):
         """
         Download the cleaned Excel file
@@ -393,11 +806,19 @@ class AIController:
                 if not os.path.exists(session.file_path):
                     return jsonify({'error': 'File not found'}), 404
                 
+                # Include every operation sent so far
+                wait_for_session_jobs(db, session_id)
+                
+                # XLSX is only produced here, and reused while the state is unchanged
+                working_copy = WorkingCopy.open_or_create(session.file_path)
+                export_path = working_copy.export_xlsx()
+                download_name = f"cleaned_{os.path.splitext(session.file_name)[0]}.xlsx"
+                
                 from flask import send_file
                 return send_file(
-                    session.file_path,
+                    export_path,
                     as_attachment=True,
-                    download_name=f"cleaned_{session.file_name}"
+                    download_name=download_name
                 )
                 
             finally:
@@ -412,6 +833,10 @@ class AIController:
         Get user's remaining tokens
         
         Query param: user_id
+        
+        Answered from a per-process cache for a few seconds
+        (TOKEN_CACHE_TTL_SECONDS); it is cleared when this process spends or
+        refunds one of the user's tokens.
         """
         try:
             user_id = request.args.get('user_id')
@@ -419,6 +844,10 @@ class AIController:
             if not user_id:
                 return jsonify({'error': 'user_id is required'}), 400
             
+            allowance = token_allowance_cache.get(user_id)
+            if allowance is not None:
+                return jsonify(allowance), 200
+            
             db = get_db_session()
             try:
                 user_repo = UserRepository(db)
@@ -427,11 +856,13 @@ class AIController:
                 if not user:
                     return jsonify({'error': 'User not found'}), 404
                 
-                return jsonify({
-                    'tokens_remaining': user.get_remaining_tokens(db),
+                allowance = {
+                    'tokens_remaining': user.get_remaining_tokens(),
                     'daily_limit': user.daily_tokens,
-                    'tokens_used_today': user.tokens_used_today
-                }), 200
+                    'tokens_used_today': user.get_tokens_used_today()
+                }
+                token_allowance_cache.put(user_id, allowance)
+                return jsonify(allowance), 200
                 
             finally:
                 db.close()
@@ -487,3 +918,19 @@ class AIController:
         except Exception as e:
             logger.error(f'Error updating sheet: {str(e)}', exc_info=True)
             return jsonify({'error': 'Failed to update selected sheet.'}), 500
+    
+    def get_metrics(self):
+        """
+        Get in-process cache counters used to size the caches
+        """
+        try:
+            return jsonify({
+                'dataframe_cache': dataframe_cache.stats(),
+                'llm_response_cache': llm_response_cache.stats(),
+                'intent_parser': intent_parser.stats(),
+                'job_queue': job_queue.stats(),
+                'token_allowance_cache': token_allowance_cache.stats()
+            }), 200
+        except Exception as e:
+            logger.error(f'Error getting metrics: {str(e)}', exc_info=True)
+            return jsonify({'error': 'Failed to retrieve metrics.'}), 500
@@ -1,13 +1,18 @@
 from flask import request, jsonify
 from werkzeug.datastructures import FileStorage
 from services.file_service import FileService
+from services.blob_store import BlobStore
+from services.upload_ingest import UploadSpool
 from models.spreadsheet_info import SpreadsheetData
 from typing import List
+from config import Config
+import os
 
 class FileController:
     
     def __init__(self):
         self.file_service = FileService()
+        self.blob_store = BlobStore(os.path.join(Config.UPLOAD_FOLDER, 'blobs'))
     
     def analyze_spreadsheet(self):
         """
@@ -31,7 +36,13 @@ class FileController:
                 if not uploaded_file.filename.lower().endswith(('.xlsx', '.xls')):
                     return jsonify({'error': 'Invalid file type. Only XLSX and XLS files are supported'}), 400
                 
-                spreadsheet_data = self.file_service.analyze_xlsx_file(uploaded_file)
+                # Files seen before are answered from the content-addressed cache
+                digest = uploaded_file.stream.sha256 if isinstance(uploaded_file.stream, UploadSpool) else None
+                spreadsheet_data = self.blob_store.load_analysis(digest) if digest else None
+                if spreadsheet_data is None:
+                    spreadsheet_data = self.file_service.analyze_xlsx_file(uploaded_file)
+                    if digest:
+                        self.blob_store.save_analysis(digest, spreadsheet_data)
                 
             else:
                 return jsonify({'error': 'No file provided. Send file via form data or provide file_path in JSON body'}), 400
@@ -1,11 +1,14 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 import os
+import threading
 
 # Import the shared Base and models
 from models.base import Base
 from models.user import User
 import models.ai_session
+import models.ai_job
+import models.ai_message
 
 # Database URL from environment or default to SQLite
 DATABASE_URL = os.environ.get(
@@ -13,37 +16,114 @@ DATABASE_URL = os.environ.get(
     'sqlite:///xls_cleaner.db'
 )
 
-# Create engine
-if DATABASE_URL.startswith("sqlite"):
-    from sqlalchemy.pool import NullPool
-    engine = create_engine(
-        DATABASE_URL,
+# Connections kept open per process, and extra ones allowed under load
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '30'))
+
+# SQLite tuning, applied to every new connection
+SQLITE_PRAGMAS = {
+    # Readers don't wait for writers, and a commit doesn't rewrite the database
+    'journal_mode': 'WAL',
+    # Safe with WAL: a power loss can lose the last commits but never corrupts
+    'synchronous': 'NORMAL',
+    # Page cache per connection, in KiB when negative
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', '16384')),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE_MB', '256')) * 1024 * 1024,
+    # Wait for a concurrent writer instead of failing with "database is locked"
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'temp_store': 'MEMORY',
+}
+
+def create_db_engine(url: str, pooled: bool = True):
+    """
+    Create the engine for a database URL.
+
+    SQLite connections are pooled and tuned with SQLITE_PRAGMAS. With
+    ``pooled=False`` every session opens a new connection with SQLite's
+    defaults instead (the previous setup, kept for benchmarks).
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            echo=False,  # Set to True for SQL query logging
+            pool_pre_ping=True,  # Verify connections before using
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            future=True
+        )
+
+    if not pooled:
+        from sqlalchemy.pool import NullPool
+        return create_engine(
+            url,
+            echo=False,
+            connect_args={"check_same_thread": False},
+            poolclass=NullPool,
+            future=True
+        )
+
+    if url in ('sqlite://', 'sqlite:///:memory:'):
+        # A single connection, or every session would see its own empty database
+        from sqlalchemy.pool import StaticPool
+        return create_engine(
+            url,
+            echo=False,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+            future=True
+        )
+
+    from sqlalchemy.pool import QueuePool
+    sqlite_engine = create_engine(
+        url,
         echo=False,  # Set to True for SQL query logging
         connect_args={"check_same_thread": False},
-        poolclass=NullPool,
-        future=True
-    )
-else:
-    engine = create_engine(
-        DATABASE_URL,
-        echo=False,  # Set to True for SQL query logging
-        pool_pre_ping=True,  # Verify connections before using
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
         future=True
     )
 
+    @event.listens_for(sqlite_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return sqlite_engine
+
+# Create engine
+engine = create_db_engine(DATABASE_URL)
+
+def _session_scope():
+    # One session per request, even when an async view resumes on another
+    # thread; one per thread outside of requests (e.g. recording job results)
+    from flask import g, has_app_context
+    if has_app_context():
+        return id(g._get_current_object())
+    return threading.get_ident()
+
 # Create session factory
 SessionLocal = scoped_session(
     sessionmaker(
         autocommit=False,
         autoflush=False,
         bind=engine
-    )
+    ),
+    scopefunc=_session_scope
 )
 
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
 
+def init_db_sessions(app):
+    """Remove the request's database session when the request ends"""
+    @app.teardown_appcontext
+    def remove_db_session(exception=None):
+        SessionLocal.remove()
+
 def get_db():
     """Get database session"""
     db = SessionLocal()
@@ -53,5 +133,5 @@ def get_db():
         db.close()
 
 def get_db_session():
-    """Get database session (non-generator version)"""
+    """Get the database session of the current request (non-generator version)"""
     return SessionLocal()
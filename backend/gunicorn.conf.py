@@ -0,0 +1,19 @@
+import os
+
+# Chat requests spend most of their time waiting on the model, so each worker
+# serves many of them on threads instead of one request at a time. CPU-bound
+# sheet work runs on JOB_WORKERS processes per worker.
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+
+# Longer than the slowest model round-trip plus CHAT_JOB_WAIT_SECONDS; slower
+# plans finish as background jobs
+timeout = 120
+
+
+def post_worker_init(worker):
+    # Fork the job workers before the first chat message needs them
+    from services.job_queue import job_queue
+    job_queue.start()
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Text
+from datetime import datetime, timezone
+from .base import Base
+
+class AIJob(Base):
+    __tablename__ = 'ai_jobs'
+
+    # Statuses a job goes through, in order
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    id = Column(String(36), primary_key=True)  # UUID
+    session_id = Column(String(36), ForeignKey('ai_sessions.id'), nullable=False, index=True)
+    user_id = Column(String(255), ForeignKey('users.id'), nullable=False)
+    status = Column(String(20), nullable=False, default=QUEUED)
+    operations = Column(JSON, nullable=False)  # Validated steps to execute
+    explanation = Column(Text, nullable=True)  # The model's explanation of the steps
+    result = Column(JSON, nullable=True)  # Chat response, once finished
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def is_finished(self):
+        """Whether the job succeeded or failed"""
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def age_seconds(self):
+        """Seconds since the job was queued"""
+        created_at = self.created_at
+        if created_at.tzinfo is None:
+            # SQLite returns naive datetimes, stored in UTC
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - created_at).total_seconds()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'session_id': self.session_id,
+            'status': self.status,
+            'operations': self.operations or [],
+            'explanation': self.explanation,
+            'result': self.result,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
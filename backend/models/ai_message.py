@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text, UniqueConstraint
+from datetime import datetime, timezone
+from .base import Base
+
+class AIMessage(Base):
+    __tablename__ = 'ai_messages'
+    __table_args__ = (
+        # Appends and "last N messages" of a session only touch this index
+        UniqueConstraint('session_id', 'seq', name='uq_ai_messages_session_seq'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(36), ForeignKey('ai_sessions.id'), nullable=False)
+    seq = Column(Integer, nullable=False)  # Position in the session, from 1
+    role = Column(String(20), nullable=False)  # 'user' or 'assistant'
+    content = Column(Text, nullable=False)
+    message_metadata = Column('metadata', JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        message = {
+            'seq': self.seq,
+            'role': self.role,
+            'content': self.content,
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
+
+        if self.message_metadata:
+            message['metadata'] = self.message_metadata
+
+        return message
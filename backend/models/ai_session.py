@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey
 from datetime import datetime, timezone
 from .base import Base
 
@@ -10,42 +10,17 @@ class AISession(Base):
     file_name = Column(String(500), nullable=False)
     file_path = Column(String(1000), nullable=False)  # Path to stored file
     selected_sheet = Column(String(255), nullable=True)  # Currently selected sheet
-    conversation_history = Column(JSON, default=list)  # List of messages
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
-    def add_message(self, role, content, metadata=None):
-        """Add a message to the conversation history"""
-        if self.conversation_history is None:
-            self.conversation_history = []
-        
-        message = {
-            'role': role,  # 'user' or 'assistant'
-            'content': content,
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        }
-        
-        if metadata:
-            message['metadata'] = metadata
-        
-        self.conversation_history.append(message)
-        self.updated_at = datetime.now(timezone.utc)
-    
-    def get_conversation_context(self, max_messages=10):
-        """Get recent conversation history for AI context"""
-        if not self.conversation_history:
-            return []
-        
-        # Return last N messages
-        return self.conversation_history[-max_messages:]
-    
-    def to_dict(self):
+    def to_dict(self, messages=None):
+        """Session details, with a page of its messages (see AISessionRepository.get_messages)"""
         return {
             'id': self.id,
             'user_id': self.user_id,
             'file_name': self.file_name,
             'selected_sheet': self.selected_sheet,
-            'conversation_history': self.conversation_history or [],
+            'conversation_history': [message.to_dict() for message in messages or []],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
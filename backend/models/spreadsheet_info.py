@@ -1,20 +1,52 @@
 from dataclasses import dataclass
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 
 @dataclass
 class ColumnInfo:
     name: str
     type: str
+    confidence: Optional[float] = None  # Share of sampled values that fit the type
+    parse_failures: Optional[int] = None
 
 @dataclass
 class SpreadsheetData:
     spreadsheet_name: str
     columns: List[ColumnInfo]
     spreadsheet_snippet: List[Dict[str, Any]]
+    row_count: Optional[int] = None  # Declared data rows, excluding the header
+    column_count: Optional[int] = None
     
     def to_dict(self):
         return {
             'spreadsheet_name': self.spreadsheet_name,
-            'columns': [{'name': col.name, 'type': col.type} for col in self.columns],
-            'spreadsheet_snippet': self.spreadsheet_snippet
+            'columns': [
+                {
+                    'name': col.name,
+                    'type': col.type,
+                    'confidence': col.confidence,
+                    'parse_failures': col.parse_failures
+                }
+                for col in self.columns
+            ],
+            'spreadsheet_snippet': self.spreadsheet_snippet,
+            'row_count': self.row_count,
+            'column_count': self.column_count
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SpreadsheetData':
+        return cls(
+            spreadsheet_name=data['spreadsheet_name'],
+            columns=[
+                ColumnInfo(
+                    name=col['name'],
+                    type=col['type'],
+                    confidence=col.get('confidence'),
+                    parse_failures=col.get('parse_failures')
+                )
+                for col in data['columns']
+            ],
+            spreadsheet_snippet=data['spreadsheet_snippet'],
+            row_count=data.get('row_count'),
+            column_count=data.get('column_count')
+        )
@@ -13,47 +13,23 @@ class User(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
-    def get_remaining_tokens(self, session=None):
+    def get_remaining_tokens(self):
         """Get the number of tokens remaining for today"""
-        if session:
-            self._reset_tokens_if_needed(session)
-        return self.daily_tokens - self.tokens_used_today
+        return self.daily_tokens - self.get_tokens_used_today()
     
-    def _reset_tokens_if_needed(self, session):
+    def get_tokens_used_today(self):
         """
-        Reset token counter if it's a new day.
-        This method must be called within a transaction and passed a SQLAlchemy session.
-        Uses row-level locking to prevent race conditions.
+        Get the number of tokens used today.
+        The stored counter is only reset by the first use after midnight UTC
+        (see UserRepository.consume_token), so an older count means none.
         """
-        # Lock the user row for update
-        user_locked = session.query(User).filter_by(id=self.id).with_for_update().one()
-        now = datetime.now(timezone.utc)
-        if user_locked.last_token_reset.date() < now.date():
-            user_locked.tokens_used_today = 0
-            user_locked.last_token_reset = now
-        # Update self to reflect changes
-        self.tokens_used_today = user_locked.tokens_used_today
-        self.last_token_reset = user_locked.last_token_reset
+        if self.last_token_reset is None or self.last_token_reset.date() < datetime.now(timezone.utc).date():
+            return 0
+        return self.tokens_used_today
     
-    def can_use_token(self, session=None):
+    def can_use_token(self):
         """Check if user has tokens available"""
-        return self.get_remaining_tokens(session) > 0
-    
-    def use_token(self, session):
-        """
-        Deduct one token from user's daily allowance.
-        This method must be called within a transaction and passed a SQLAlchemy session.
-        Uses row-level locking to prevent race conditions.
-        """
-        self._reset_tokens_if_needed(session)
-        # Lock the user row for update
-        user_locked = session.query(User).filter_by(id=self.id).with_for_update().one()
-        if user_locked.daily_tokens - user_locked.tokens_used_today > 0:
-            user_locked.tokens_used_today += 1
-            # Update self to reflect changes
-            self.tokens_used_today = user_locked.tokens_used_today
-            return True
-        return False
+        return self.get_remaining_tokens() > 0
     
     def to_dict(self):
         return {
@@ -0,0 +1,80 @@
+from models.ai_job import AIJob
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import uuid
+
+class AIJobRepository:
+    """Repository for background job operations"""
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def create(
+        self,
+        session_id: str,
+        user_id: str,
+        operations: list,
+        explanation: str = None
+    ) -> AIJob:
+        """Create a queued job"""
+        job = AIJob(
+            id=str(uuid.uuid4()),
+            session_id=session_id,
+            user_id=user_id,
+            status=AIJob.QUEUED,
+            operations=operations,
+            explanation=explanation
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_by_id(self, job_id: str) -> AIJob:
+        """Get job by ID"""
+        return self.db.query(AIJob).filter(AIJob.id == job_id).first()
+
+    def has_unfinished(
+        self,
+        session_id: str,
+        created_before: Optional[datetime] = None,
+        max_age_seconds: Optional[int] = None
+    ) -> bool:
+        """
+        Whether a session has a queued or running job
+        
+        Args:
+            session_id: Session ID
+            created_before: Only count jobs queued before this time
+            max_age_seconds: Ignore jobs queued longer ago than this
+        """
+        query = self.db.query(AIJob.id).filter(
+            AIJob.session_id == session_id,
+            AIJob.status.in_((AIJob.QUEUED, AIJob.RUNNING))
+        )
+        if created_before is not None:
+            query = query.filter(AIJob.created_at < created_before)
+        if max_age_seconds is not None:
+            query = query.filter(AIJob.created_at > datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds))
+        return query.first() is not None
+
+    def mark_running(self, job_id: str) -> AIJob:
+        """Record that a worker picked up the job"""
+        job = self.get_by_id(job_id)
+        if job and job.status == AIJob.QUEUED:
+            job.status = AIJob.RUNNING
+            job.started_at = datetime.now(timezone.utc)
+            self.db.commit()
+        return job
+
+    def finish(self, job_id: str, status: str, result: dict) -> AIJob:
+        """Store the outcome of a job"""
+        job = self.get_by_id(job_id)
+        if job:
+            job.status = status
+            job.result = result
+            job.finished_at = datetime.now(timezone.utc)
+            self.db.commit()
+            self.db.refresh(job)
+        return job
@@ -1,6 +1,11 @@
 from models.ai_session import AISession
+from models.ai_message import AIMessage
+from models.ai_job import AIJob
+from sqlalchemy import JSON, bindparam, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 import uuid
 
 class AISessionRepository:
@@ -22,8 +27,7 @@ class AISessionRepository:
             user_id=user_id,
             file_name=file_name,
             file_path=file_path,
-            selected_sheet=selected_sheet,
-            conversation_history=[]
+            selected_sheet=selected_sheet
         )
         self.db.add(session)
         self.db.commit()
@@ -48,14 +52,77 @@ class AISessionRepository:
         role: str, 
         content: str, 
         metadata: dict = None
-    ) -> AISession:
-        """Add a message to session conversation"""
-        session = self.get_by_id(session_id)
-        if session:
-            session.add_message(role, content, metadata)
-            self.db.commit()
-            self.db.refresh(session)
-        return session
+    ) -> None:
+        """
+        Append a message to the session's conversation
+        
+        A single INSERT that numbers the message after the session's last
+        one; earlier messages are never read or rewritten. The session's
+        updated_at is bumped in the same transaction, so recently used
+        sessions list first.
+        """
+        now = datetime.now(timezone.utc)
+        next_seq = select(
+            literal(session_id),
+            func.coalesce(func.max(AIMessage.seq), 0) + 1,
+            literal(role),
+            literal(content),
+            bindparam('metadata', metadata, type_=JSON(none_as_null=True)),
+            literal(now)
+        ).where(AIMessage.session_id == session_id)
+        statement = insert(AIMessage).from_select(
+            [
+                AIMessage.session_id, AIMessage.seq, AIMessage.role,
+                AIMessage.content, AIMessage.message_metadata, AIMessage.created_at
+            ],
+            next_seq
+        )
+        touch = update(AISession).where(AISession.id == session_id).values(updated_at=now)
+        
+        # Two writers can pick the same number, the unique index lets one retry
+        for attempt in range(3):
+            try:
+                self.db.execute(statement)
+                self.db.execute(touch)
+                self.db.commit()
+                return
+            except IntegrityError:
+                self.db.rollback()
+                if attempt == 2:
+                    raise
+    
+    def get_conversation_context(self, session_id: str, max_messages: int = 10) -> List[dict]:
+        """Get the last N messages of a session, oldest first, for AI context"""
+        messages = self.db.query(AIMessage)\
+            .filter(AIMessage.session_id == session_id)\
+            .order_by(AIMessage.seq.desc())\
+            .limit(max_messages)\
+            .all()
+        return [message.to_dict() for message in reversed(messages)]
+    
+    def get_messages(
+        self, 
+        session_id: str, 
+        before: Optional[int] = None, 
+        limit: int = 50
+    ) -> Tuple[List[AIMessage], Optional[int]]:
+        """
+        Get a page of a session's messages, oldest first
+        
+        Pages go back in time: without ``before`` the latest messages are
+        returned, and the returned cursor is the ``before`` of the page of
+        older messages (None once the first message was returned).
+        """
+        query = self.db.query(AIMessage).filter(AIMessage.session_id == session_id)
+        if before is not None:
+            query = query.filter(AIMessage.seq < before)
+        # One extra row tells whether there are older messages
+        messages = query.order_by(AIMessage.seq.desc()).limit(limit + 1).all()
+        
+        has_more = len(messages) > limit
+        messages = list(reversed(messages[:limit]))
+        next_cursor = messages[0].seq if has_more else None
+        return messages, next_cursor
     
     def update_sheet(self, session_id: str, sheet_name: str) -> AISession:
         """Update selected sheet for session"""
@@ -71,6 +138,8 @@ class AISessionRepository:
         """Delete a session"""
         session = self.get_by_id(session_id)
         if session:
+            self.db.query(AIMessage).filter(AIMessage.session_id == session_id).delete()
+            self.db.query(AIJob).filter(AIJob.session_id == session_id).delete()
             self.db.delete(session)
             self.db.commit()
             return True
@@ -1,6 +1,8 @@
 from models.user import User
+from sqlalchemy import case, or_, update
 from sqlalchemy.orm import Session
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 class UserRepository:
     """Repository for user operations"""
@@ -37,17 +39,70 @@ class UserRepository:
             user = self.create(user_id, email)
         return user
     
-    def update_tokens(self, user_id: str) -> bool:
-        """Update user's token count after usage"""
-        user = self.get_by_id(user_id)
-        if user and user.use_token(self.db):
-            self.db.commit()
-            return True
-        return False
+    def consume_token(self, user_id: str) -> Optional[int]:
+        """
+        Spend one of the user's tokens for today.
+        
+        A single conditional UPDATE ... RETURNING: the first use after
+        midnight UTC starts a new day's count, and the row is only updated
+        while tokens remain, so concurrent requests can never spend more
+        than the daily allowance and nothing is locked across a round trip.
+        
+        Returns:
+            Tokens remaining afterwards, or None if the user has none left
+        """
+        now = datetime.now(timezone.utc)
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        new_day = User.last_token_reset < day_start
+        statement = (
+            update(User)
+            .where(
+                User.id == user_id,
+                User.daily_tokens > 0,
+                or_(new_day, User.tokens_used_today < User.daily_tokens)
+            )
+            .values(
+                tokens_used_today=case((new_day, 1), else_=User.tokens_used_today + 1),
+                last_token_reset=case((new_day, now), else_=User.last_token_reset),
+                updated_at=now
+            )
+            .returning(User.daily_tokens - User.tokens_used_today)
+            .execution_options(synchronize_session=False)
+        )
+        remaining = self.db.execute(statement).scalar_one_or_none()
+        self.db.commit()
+        return remaining
+    
+    def refund_token(self, user_id: str, spent_at: datetime) -> Optional[int]:
+        """
+        Give back a token spent at ``spent_at`` (e.g. for a job that failed).
+        
+        Nothing is refunded once the count was reset for a later day.
+        
+        Returns:
+            Tokens remaining afterwards, or None if nothing was refunded
+        """
+        if spent_at.tzinfo is None:
+            spent_at = spent_at.replace(tzinfo=timezone.utc)
+        day_end = spent_at.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        statement = (
+            update(User)
+            .where(
+                User.id == user_id,
+                User.tokens_used_today > 0,
+                User.last_token_reset < day_end
+            )
+            .values(tokens_used_today=User.tokens_used_today - 1)
+            .returning(User.daily_tokens - User.tokens_used_today)
+            .execution_options(synchronize_session=False)
+        )
+        remaining = self.db.execute(statement).scalar_one_or_none()
+        self.db.commit()
+        return remaining
     
     def get_remaining_tokens(self, user_id: str) -> int:
         """Get remaining tokens for user"""
         user = self.get_by_id(user_id)
         if user:
-            return user.get_remaining_tokens(self.db)
+            return user.get_remaining_tokens()
         return 0
@@ -25,7 +25,7 @@ def upload_file():
     return ai_controller.upload_file()
 
 @ai_bp.route('/chat', methods=['POST'])
-def send_message():
+async def send_message():
     """
     Send a message to the AI assistant.
     
@@ -41,9 +41,33 @@ def send_message():
     - summary: Summary of changes (if success)
     - preview: First 5 rows of updated sheet (if success)
     - stats: Sheet statistics (if success)
+    - job_id: Job that executed the operations (if any)
     - tokens_remaining: User's remaining tokens
+    
+    Operations still running after CHAT_JOB_WAIT_SECONDS are answered with
+    202, type 'pending' and the job_id to poll at /jobs/<job_id>.
+    """
+    return await ai_controller.send_message()
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Get the status of a chat message's operations.
+    
+    URL param:
+    - job_id: Job ID returned by /chat
+    
+    Query param:
+    - user_id: User ID for authentication
+    
+    Returns:
+    - job_id, session_id: The job and its session
+    - status: 'queued', 'running', 'succeeded' or 'failed'
+    - operations, explanation: What the job executes
+    - result: The response /chat would have returned, once finished
+    - created_at, started_at, finished_at: Timestamps
     """
-    return ai_controller.send_message()
+    return ai_controller.get_job()
 
 @ai_bp.route('/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
@@ -53,32 +77,106 @@ def get_session(session_id):
     URL param:
     - session_id: Session ID
     
-    Query param:
+    Query params:
     - user_id: User ID for authentication
+    - limit: Number of messages to return (default 50, max 200)
+    - cursor: next_cursor of the previous page, to get older messages
     
     Returns:
-    Session details including conversation history
+    Session details including a page of the conversation history, oldest
+    message first, and next_cursor (null once there are no older messages)
     """
     return ai_controller.get_session()
 
 @ai_bp.route('/preview/<session_id>', methods=['GET'])
 def get_preview(session_id):
     """
-    Get sheet preview.
+    Get a page of the sheet.
     
     URL param:
     - session_id: Session ID
     
-    Query param:
+    Query params:
     - user_id: User ID for authentication
+    - offset: First row to return (default 0)
+    - limit: Number of rows to return (default 5, max 1000)
+    - columns: Column to return, repeat for several (default all columns)
     
     Returns:
-    - preview: First 5 rows of sheet
+    - preview: Rows of the page
     - stats: Sheet statistics
     - sheet_name: Name of current sheet
+    - offset, limit: The page returned
+    - total_rows: Number of rows in the sheet
+    - columns: Columns included in the rows
     """
     return ai_controller.get_preview()
 
+@ai_bp.route('/versions/<session_id>', methods=['GET'])
+def get_versions(session_id):
+    """
+    Get the versions of the session's file.
+    
+    URL param:
+    - session_id: Session ID
+    
+    Query param:
+    - user_id: User ID for authentication
+    
+    Returns:
+    - current_version: Version the file is at (0 is the upload)
+    - latest_version: Newest version, later than current_version after an undo
+    - can_undo, can_redo: Booleans
+    - versions: Every version, oldest first, with its operations and summary
+    """
+    return ai_controller.get_versions()
+
+@ai_bp.route('/undo', methods=['POST'])
+def undo():
+    """
+    Undo the last operations applied to the session's file.
+    
+    JSON body:
+    - session_id: Session ID
+    - user_id: User ID
+    
+    Returns:
+    - version: Version the file is now at
+    - latest_version: Newest version, to redo up to
+    - changed_sheets: Sheets that changed
+    - preview, stats, sheet_name: The selected sheet, as for /preview
+    """
+    return ai_controller.undo()
+
+@ai_bp.route('/redo', methods=['POST'])
+def redo():
+    """
+    Redo the last undone operations of the session's file.
+    
+    JSON body:
+    - session_id: Session ID
+    - user_id: User ID
+    
+    Returns:
+    Same as /undo
+    """
+    return ai_controller.redo()
+
+@ai_bp.route('/restore-version', methods=['POST'])
+def restore_version():
+    """
+    Bring the session's file to any of its versions.
+    
+    JSON body:
+    - session_id: Session ID
+    - user_id: User ID
+    - version: Version to restore, from /versions (0 is the upload)
+    
+    Returns:
+    Same as /undo
+    """
+    return ai_controller.restore_version()
+
 @ai_bp.route('/download/<session_id>', methods=['GET'])
 def download_file(session_id):
     """
@@ -125,3 +223,22 @@ def update_selected_sheet():
     - selected_sheet: Name of selected sheet
     """
     return ai_controller.update_selected_sheet()
+
+@ai_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Get cache metrics for this worker process.
+    
+    Returns:
+    - dataframe_cache: Parsed sheet cache counters (entries, current_bytes,
+      max_bytes, hits, misses, evictions, hit_rate)
+    - llm_response_cache: Model response cache counters (entries, max_entries,
+      ttl_seconds, hits, misses, stores, hit_rate)
+    - intent_parser: Messages answered without the model (parsed, fallbacks,
+      parse_rate)
+    - job_queue: Operation jobs (workers, started, submitted, pending,
+      waiting, succeeded, failed)
+    - token_allowance_cache: Cached /tokens answers (entries, ttl_seconds,
+      hits, misses, hit_rate)
+    """
+    return ai_controller.get_metrics()
@@ -1,13 +1,42 @@
 import os
 import json
+import asyncio
+import hashlib
+import logging
+import threading
 from typing import Dict, Any, List, Optional
 from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from services.excel_operations import ExcelOperationValidator, PandasExecutor
+from services.excel_operations import ExcelOperationValidator, PandasExecutor, preview_plan, run_plan
+from services.dataframe_cache import DataFrameCache, dataframe_cache
+from services.serialization import frame_to_records
+from services.working_copy import WorkingCopy
+from services.llm_response_cache import llm_response_cache
+from services.intent_parser import intent_parser
+from services.prompt_builder import PromptBuilder
+
+logger = logging.getLogger(__name__)
+
+# Model calls of every request share one event loop per process, which owns
+# the client's pooled connections. Loops of async views only live as long as
+# their request, connections made on them couldn't be reused.
+_model_loop: Optional[asyncio.AbstractEventLoop] = None
+_model_loop_lock = threading.Lock()
+
+def _get_model_loop() -> asyncio.AbstractEventLoop:
+    global _model_loop
+    with _model_loop_lock:
+        if _model_loop is None:
+            # Started lazily, so each forked worker gets its own
+            _model_loop = asyncio.new_event_loop()
+            threading.Thread(target=_model_loop.run_forever, name='model-loop', daemon=True).start()
+        return _model_loop
 
 class AIExcelService:
     """Service for AI-powered Excel operations"""
     
+    # Previous messages sent to the model along with the user's message
+    HISTORY_WINDOW = 5
+    
     SYSTEM_PROMPT = """You are an Excel data cleaning assistant. Your job is to help users clean and transform their Excel spreadsheets.
 
 You can ONLY perform these operations:
@@ -16,12 +45,12 @@ You can ONLY perform these operations:
 - fill_na: Fill missing values with a specified value (params: "value", optional "columns")
 - remove_column: Remove a specific column (params: "column")
 - rename_column: Rename a column (params: "old_name", "new_name")
-- filter_rows: Filter rows based on conditions (params: "column", "condition")
+- filter_rows: Keep only the rows matching an expression (params: "expression")
 - sort_values: Sort data by columns (params: "columns", optional "ascending")
 - replace_value: Replace specific values (params: "old_value", "new_value", optional "column")
 - change_type: Change column data type (params: "column", "type")
 - trim_whitespace: Remove leading/trailing spaces (optional params: "columns")
-- upper_case, lower_case, capitalize: Change text case (params: "column")
+- upper_case, lower_case, capitalize: Change text case (params: "column", or "columns" for several)
 - round_numbers: Round numeric values (params: "column", optional "decimals")
 - drop_empty_rows, drop_empty_columns: Remove empty rows/columns
 - format_date: Change date format in a column (params: "column", "format")
@@ -36,6 +65,15 @@ When a user asks you to perform an operation, respond with a JSON object in this
     "explanation": "A brief explanation of what this operation will do"
 }
 
+When a user asks for several operations in one message, respond with all of them in the order they should be performed (at most 10):
+{
+    "operations": [
+        {"operation": "trim_whitespace", "params": {}},
+        {"operation": "sort_values", "params": {"columns": ["Date"]}}
+    ],
+    "explanation": "A brief explanation of what these operations will do"
+}
+
 For date formatting operations, use these common format codes:
 - %Y = 4-digit year (2024)
 - %y = 2-digit year (24)
@@ -53,6 +91,13 @@ Examples:
 - "YYYY-MM-DD" format: "%Y-%m-%d"
 - "Month DD, YYYY" format: "%B %d, %Y"
 
+For filter_rows expressions, compare columns (wrap names with spaces in backticks) with values or other columns, and combine conditions in one expression rather than several filter_rows:
+- Comparisons: ==, !=, >, >=, <, <= (e.g. Amount > 100, `Due Date` < '2024-06-01', Price > Cost)
+- Amount between 10 and 20, City in ('Paris', 'Rome'), City not in ('Paris')
+- Name contains 'text', Code matches '^[A-Z]{3}-[0-9]+$' (regular expression)
+- Email is null, Email is not null, Notes is empty (missing or blank)
+- and, or, not, parentheses: Amount > 100 and (City == 'Paris' or City == 'Rome')
+
 If the user's request is unclear or cannot be performed with these operations, respond with:
 {
     "error": "Explanation of why the operation cannot be performed",
@@ -69,8 +114,17 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
         self.llm = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.1,
-            api_key=api_key
+            api_key=api_key,
+            # Point at a compatible server, e.g. the fake one in benchmarks/
+            base_url=os.environ.get("OPENAI_BASE_URL")
         )
+        
+        # Cached responses are only reused with the model and prompt they came from
+        self.prompt_version = hashlib.sha256(
+            f"{self.llm.model_name}\n{self.SYSTEM_PROMPT}".encode('utf-8')
+        ).hexdigest()
+        
+        self.prompt_builder = PromptBuilder(self.SYSTEM_PROMPT, history_window=self.HISTORY_WINDOW)
     
     def parse_user_request(
         self, 
@@ -81,6 +135,9 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
         """
         Parse user's request and determine the Excel operation to perform.
         
+        Common commands are parsed locally, then the response cache is
+        checked; only the rest is sent to the model.
+        
         Args:
             user_message: The user's message
             conversation_history: Previous conversation messages
@@ -89,34 +146,141 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
         Returns:
             Dict containing operation details or error
         """
-        messages = [SystemMessage(content=self.SYSTEM_PROMPT)]
-        
-        # Add sheet context if available
-        if sheet_info:
-            context = f"\n\nCurrent sheet information:\n"
-            column_names = sheet_info.get('column_names', [])
-            if isinstance(column_names, list):
-                context += f"Columns: {', '.join(column_names)}\n"
-            else:
-                context += f"Number of columns: {sheet_info.get('columns', 0)}\n"
-            context += f"Number of rows: {sheet_info.get('rows', 0)}\n"
-            messages.append(SystemMessage(content=context))
+        parsed = self._parse_locally(user_message, sheet_info)
+        if parsed is not None:
+            return parsed
         
-        # Add conversation history (last 5 messages)
-        for msg in conversation_history[-5:]:
-            if msg['role'] == 'user':
-                messages.append(HumanMessage(content=msg['content']))
-            elif msg['role'] == 'assistant':
-                messages.append(AIMessage(content=msg['content']))
+        cache_key = self._cache_key(user_message, conversation_history, sheet_info)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
         
-        # Add current user message
-        messages.append(HumanMessage(content=user_message))
+        messages = self._build_messages(user_message, conversation_history, sheet_info)
         
         try:
             response = self.llm.invoke(messages)
-            
+            result = self._parse_response(response.content)
+        except Exception as e:
+            return {
+                'type': 'error',
+                'message': f'Error processing request: {str(e)}'
+            }
+        
+        self._cache_response(cache_key, result)
+        return result
+    
+    async def aparse_user_request(
+        self, 
+        user_message: str, 
+        conversation_history: List[Dict[str, str]],
+        sheet_info: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of parse_user_request.
+        
+        The model call runs on the shared model loop and is awaited instead
+        of blocking the calling thread, so other work of the request (e.g.
+        loading the sheet) can run meanwhile.
+        """
+        parsed = self._parse_locally(user_message, sheet_info)
+        if parsed is not None:
+            return parsed
+        
+        cache_key = self._cache_key(user_message, conversation_history, sheet_info)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        messages = self._build_messages(user_message, conversation_history, sheet_info)
+        
+        try:
+            call = asyncio.run_coroutine_threadsafe(self.llm.ainvoke(messages), _get_model_loop())
+            response = await asyncio.wrap_future(call)
+            result = self._parse_response(response.content)
+        except Exception as e:
+            return {
+                'type': 'error',
+                'message': f'Error processing request: {str(e)}'
+            }
+        
+        self._cache_response(cache_key, result)
+        return result
+    
+    def _parse_locally(self, user_message: str, sheet_info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Answer common, unambiguous commands without the model"""
+        column_names = None
+        if sheet_info and isinstance(sheet_info.get('column_names'), list):
+            column_names = sheet_info['column_names']
+        
+        try:
+            parsed = intent_parser.parse(user_message, column_names)
+        except Exception as e:
+            logger.warning(f'Intent parser failed: {str(e)}')
+            return None
+        
+        if parsed is not None:
+            logger.info(f"Parsed without the model: {parsed['operations']}")
+        return parsed
+    
+    def _cache_key(
+        self, 
+        user_message: str, 
+        conversation_history: List[Dict[str, str]],
+        sheet_info: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Key of the response cache: what the model would be told, normalized"""
+        columns = []
+        if sheet_info and isinstance(sheet_info.get('column_names'), list):
+            column_profiles = sheet_info.get('column_profiles', {})
+            columns = [
+                {'name': name, 'type': (column_profiles.get(name) or {}).get('type')}
+                for name in sheet_info['column_names']
+            ]
+        
+        return llm_response_cache.make_key(
+            user_message,
+            conversation_history[-self.HISTORY_WINDOW:],
+            columns,
+            self.prompt_version
+        )
+    
+    def _cached_response(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get a stored response; a broken cache only means asking the model"""
+        try:
+            cached = llm_response_cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f'LLM response cache lookup failed: {str(e)}')
+            return None
+        
+        if cached is not None:
+            logger.info(f"Answered from the LLM response cache: {cached['operations']}")
+        return cached
+    
+    def _cache_response(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Store a response if it is a plan that passed validation"""
+        if result['type'] != 'operation':
+            return
+        try:
+            llm_response_cache.put(cache_key, result)
+        except Exception as e:
+            logger.warning(f'LLM response cache store failed: {str(e)}')
+    
+    def _build_messages(
+        self, 
+        user_message: str, 
+        conversation_history: List[Dict[str, str]],
+        sheet_info: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        """Build the messages sent to the model, within the prompt token budget"""
+        messages, size = self.prompt_builder.build(user_message, conversation_history, sheet_info)
+        logger.info(f'Prompt size: {size.describe()}')
+        return messages
+    
+    def _parse_response(self, content: str) -> Dict[str, Any]:
+        """Turn the model's reply into a validated plan or an error"""
+        try:
             # Parse JSON response
-            response_text = response.content.strip()
+            response_text = content.strip()
             
             # Extract JSON if it's wrapped in markdown code blocks
             if response_text.startswith("```json"):
@@ -138,17 +302,33 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
                     'suggestion': operation_data.get('suggestion')
                 }
             
-            # Validate the operation
-            operation = operation_data.get('operation')
-            params = operation_data.get('params', {})
-
-            print("AI suggested operation:", operation)
-            print("With parameters:", params)
+            # A single operation is a plan with one step
+            if 'operations' in operation_data:
+                steps = operation_data['operations']
+            else:
+                steps = [{
+                    'operation': operation_data.get('operation'),
+                    'params': operation_data.get('params', {})
+                }]
+            
+            if not isinstance(steps, list):
+                return {
+                    'type': 'error',
+                    'message': 'Invalid operation: operations must be a list'
+                }
+            
+            logger.debug(f"AI suggested operations: {steps}")
             
             # Normalize parameter names to match expected format
-            params = self._normalize_params(operation, params)
+            steps = [
+                {
+                    'operation': step.get('operation'),
+                    'params': self._normalize_params(step.get('operation'), step.get('params') or {})
+                } if isinstance(step, dict) else step
+                for step in steps
+            ]
             
-            is_valid, error_msg = ExcelOperationValidator.validate_operation(operation, params)
+            is_valid, error_msg = ExcelOperationValidator.validate_plan(steps)
             
             if not is_valid:
                 return {
@@ -158,8 +338,7 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
             
             return {
                 'type': 'operation',
-                'operation': operation,
-                'params': params,
+                'operations': steps,
                 'explanation': operation_data.get('explanation', '')
             }
             
@@ -208,31 +387,29 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
         Returns:
             Dict with operation results
         """
-        try:
-            executor = PandasExecutor(file_path, sheet_name)
-            
-            # Execute the operation
-            result = executor.execute_operation(operation, params)
-            
-            # Save the modified file
-            executor.save_to_file(file_path, sheet_name)
-            
-            # Get preview and stats
-            preview = executor.get_preview(5)
-            stats = executor.get_stats()
-            
-            return {
-                'success': True,
-                'result': result,
-                'preview': preview,
-                'stats': stats
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        return self.execute_plan(file_path, sheet_name, [{'operation': operation, 'params': params}])
+    
+    def execute_plan(
+        self, 
+        file_path: str, 
+        sheet_name: str, 
+        steps: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Execute a validated list of operations on an Excel file.
+        
+        The sheet is loaded once and saved once, and only if every step
+        succeeded.
+        
+        Args:
+            file_path: Path to the Excel file
+            sheet_name: Name of the sheet to operate on
+            steps: Ordered list of {"operation", "params"} dicts
+        
+        Returns:
+            Dict with operation results
+        """
+        return run_plan(file_path, sheet_name, steps)
     
     def get_sheet_preview(self, file_path: str, sheet_name: str, n_rows: int = 5) -> List[Dict[str, Any]]:
         """Get preview of a sheet"""
@@ -242,10 +419,69 @@ Only respond with valid JSON. Do not include any other text or explanation outsi
         except Exception as e:
             raise Exception(f"Error getting preview: {str(e)}")
     
-    def get_sheet_info(self, file_path: str, sheet_name: str) -> Dict[str, Any]:
-        """Get information about a sheet"""
+    def preview_plan(
+        self,
+        file_path: str,
+        sheet_name: str,
+        steps: List[Dict[str, Any]],
+        n_rows: int = 5
+    ) -> List[Dict[str, Any]]:
+        """Get the first rows of a sheet as a row-local plan will leave them, without saving"""
+        return preview_plan(file_path, sheet_name, steps, n_rows)
+    
+    def get_sheet_page(
+        self, 
+        file_path: str, 
+        sheet_name: str, 
+        offset: int = 0, 
+        limit: int = 5, 
+        columns: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a page of rows of a sheet.
+        
+        Served from the parsed sheet cache when the sheet is in memory,
+        otherwise only the requested columns and rows are read from the
+        working copy.
+        """
+        try:
+            working_copy = WorkingCopy.open_or_create(file_path)
+            sheet_path = working_copy.sheet_path(sheet_name)
+            df = dataframe_cache.get(sheet_path, sheet_name, DataFrameCache.file_version(sheet_path))
+            
+            if df is None:
+                window = working_copy.read_window(sheet_name, offset, limit, columns)
+            else:
+                window = df.iloc[offset:offset + limit]
+                if columns is not None:
+                    window = window[columns]
+            
+            return frame_to_records(window)
+        except Exception as e:
+            raise Exception(f"Error getting preview: {str(e)}")
+    
+    def get_sheet_info(self, file_path: str, sheet_name: str, include_profiles: bool = False) -> Dict[str, Any]:
+        """
+        Get information about a sheet.
+        
+        With ``include_profiles`` the detected type of every column is added
+        under 'column_profiles' (stored whenever the sheet is saved).
+        """
         try:
-            executor = PandasExecutor(file_path, sheet_name)
-            return executor.get_stats()
+            # Stats are stored with the working copy, no need to load the sheet
+            working_copy = WorkingCopy.open_or_create(file_path)
+            stats = working_copy.sheet_stats(sheet_name)
+            if stats is not None:
+                info = stats.summary()
+            else:
+                info = PandasExecutor(file_path, sheet_name).get_stats()
+            
+            if include_profiles:
+                info['column_profiles'] = {
+                    name: profile.to_dict()
+                    for name, profile in working_copy.sheet_profile(sheet_name).items()
+                }
+            
+            return info
         except Exception as e:
             raise Exception(f"Error getting sheet info: {str(e)}")
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+from models.spreadsheet_info import SpreadsheetData
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded workbooks.
+
+    Each distinct file is stored once, under its SHA-256, together with the
+    results derived from its content (the FileService analysis and the
+    converted working copy). Sessions get a hard link to the blob, so storing
+    the same export again costs no extra disk space.
+    """
+
+    WORKBOOK = 'workbook'
+    # Bumped when the analysis format changes, so older results are recomputed
+    ANALYSIS = 'analysis.v2.json'
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir(digest), self.WORKBOOK)
+
+    def add(self, path: str, digest: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Move a file into the store.
+
+        If the content is already stored the file is simply discarded.
+
+        Returns:
+            Tuple of (sha256 hex digest, path of the stored blob)
+        """
+        if digest is None:
+            digest = file_sha256(path)
+
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            os.remove(path)
+        else:
+            os.makedirs(self.blob_dir(digest), exist_ok=True)
+            os.replace(path, blob_path)
+
+        return digest, blob_path
+
+    def checkout(self, digest: str, path: str) -> str:
+        """Give a session its own path to a blob without copying the content"""
+        try:
+            os.link(self.blob_path(digest), path)
+        except OSError:
+            # Hard links not supported here (e.g. across devices)
+            shutil.copyfile(self.blob_path(digest), path)
+        return path
+
+    def load_analysis(self, digest: str) -> Optional[List[SpreadsheetData]]:
+        """Get the cached analysis of a blob, or None if it was never analyzed"""
+        path = os.path.join(self.blob_dir(digest), self.ANALYSIS)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return [SpreadsheetData.from_dict(sheet) for sheet in json.load(f)]
+
+    def save_analysis(self, digest: str, spreadsheet_data: List[SpreadsheetData]) -> None:
+        path = os.path.join(self.blob_dir(digest), self.ANALYSIS)
+        os.makedirs(self.blob_dir(digest), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([sheet.to_dict() for sheet in spreadsheet_data], f, default=str)
+        os.replace(tmp_path, path)
+
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
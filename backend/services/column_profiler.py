@@ -0,0 +1,158 @@
+import datetime
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+# Most values looked at per column
+SAMPLE_ROWS = 500
+
+# Shapes of strings worth trying to parse as dates: 2024-01-31, 31/01/2024,
+# 31 Jan 2024, January 31, 2024 (with an optional time after them)
+DATE_LIKE_PATTERN = (
+    r'^\s*(?:\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}'
+    r'|\d{1,2}\s+[A-Za-z]{3,}\.?,?\s+\d{2,4}'
+    r'|[A-Za-z]{3,}\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{2,4})'
+)
+
+# Kinds of object columns pandas can tell from its own type inference
+INFERRED_KINDS = {
+    'string': 'string',
+    'integer': 'number',
+    'floating': 'number',
+    'mixed-integer-float': 'number',
+    'boolean': 'boolean',
+    'datetime': 'datetime',
+    'date': 'datetime',
+}
+
+
+@dataclass
+class ColumnProfile:
+    """
+    Detected type of a column.
+
+    ``confidence`` is the share of sampled non-null values that fit the type,
+    ``parse_failures`` the number that didn't.
+    """
+    type: str
+    confidence: float
+    parse_failures: int
+    sample_size: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'type': self.type,
+            'confidence': self.confidence,
+            'parse_failures': self.parse_failures,
+            'sample_size': self.sample_size
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ColumnProfile':
+        return cls(
+            type=data['type'],
+            confidence=data['confidence'],
+            parse_failures=data['parse_failures'],
+            sample_size=data['sample_size']
+        )
+
+
+def profile_frame(df: pd.DataFrame, sample_rows: int = SAMPLE_ROWS) -> Dict[str, ColumnProfile]:
+    """Profile every column of a frame, keyed by column name"""
+    positions = _sample_positions(len(df), sample_rows)
+    return {str(col): _profile_sample(df.iloc[positions, i]) for i, col in enumerate(df.columns)}
+
+
+def profile_column(series: pd.Series, sample_rows: int = SAMPLE_ROWS) -> ColumnProfile:
+    """
+    Detect the type of a column from a bounded, evenly spaced sample.
+
+    Typed columns are classified by dtype. Object columns are classified by
+    parsing the whole sample at once (to_numeric / to_datetime with
+    errors='coerce'); the type fitting most values wins.
+    """
+    return _profile_sample(series.iloc[_sample_positions(len(series), sample_rows)])
+
+
+def _sample_positions(n_rows: int, sample_rows: int) -> np.ndarray:
+    if n_rows <= sample_rows:
+        return np.arange(n_rows)
+    return np.linspace(0, n_rows - 1, sample_rows).astype(int)
+
+
+def _profile_sample(sample: pd.Series) -> ColumnProfile:
+    sample = sample.dropna()
+    size = len(sample)
+
+    if size == 0:
+        return ColumnProfile('unknown', 0.0, 0, 0)
+
+    dtype = sample.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return ColumnProfile('boolean', 1.0, 0, size)
+    if pd.api.types.is_integer_dtype(dtype):
+        return ColumnProfile('integer', 1.0, 0, size)
+    if pd.api.types.is_float_dtype(dtype):
+        return ColumnProfile('float', 1.0, 0, size)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return ColumnProfile('datetime', 1.0, 0, size)
+
+    # Object (or string) column: count how many values fit each type, the
+    # kind of each distinct Python type is only looked up once
+    inferred = pd.api.types.infer_dtype(sample, skipna=True)
+    if inferred in INFERRED_KINDS:
+        # Every value is of one kind, no need to look at their types
+        value_kinds = pd.Series(INFERRED_KINDS[inferred], index=sample.index)
+    else:
+        value_types = sample.map(type)
+        value_kinds = value_types.map({value_type: _value_kind(value_type) for value_type in value_types.unique()})
+
+    counts = {
+        kind: int((value_kinds == kind).sum())
+        for kind in ('boolean', 'number', 'datetime')
+    }
+    counts['numeric_string'] = 0
+    counts['date'] = 0
+    # Anything can be shown as text
+    counts['text'] = int((value_kinds == 'other').sum())
+
+    is_string = (value_kinds == 'string').to_numpy()
+    if is_string.any():
+        # Parse each distinct string once
+        string_counts = sample[is_string].str.strip().value_counts()
+        strings = pd.Series(string_counts.index, dtype=object)
+        occurrences = string_counts.to_numpy()
+
+        is_numeric_string = pd.to_numeric(strings, errors='coerce').notna().to_numpy()
+        counts['numeric_string'] = int(occurrences[is_numeric_string].sum())
+
+        # Only date-shaped strings are handed to the (slow) flexible date parser
+        is_candidate = ~is_numeric_string & strings.str.match(DATE_LIKE_PATTERN).to_numpy(dtype=bool)
+        if is_candidate.any():
+            dates = pd.to_datetime(strings[is_candidate], errors='coerce', format='mixed')
+            counts['date'] = int(occurrences[is_candidate][dates.notna().to_numpy()].sum())
+
+        counts['text'] += int(occurrences.sum()) - counts['numeric_string'] - counts['date']
+
+    column_type = max(counts, key=counts.get)
+    matched = counts[column_type]
+    return ColumnProfile(
+        type=column_type,
+        confidence=round(matched / size, 4),
+        parse_failures=size - matched,
+        sample_size=size
+    )
+
+
+def _value_kind(value_type: type) -> str:
+    if issubclass(value_type, (bool, np.bool_)):
+        return 'boolean'
+    if issubclass(value_type, (int, float, np.number)):
+        return 'number'
+    if issubclass(value_type, (datetime.date, np.datetime64)):
+        return 'datetime'
+    if issubclass(value_type, str):
+        return 'string'
+    return 'other'
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+
+class DataFrameCache:
+    """
+    Process-wide LRU cache of parsed sheets.
+
+    Entries are keyed by (file_path, sheet_name) and tagged with the file
+    version (mtime and size) they were parsed from, so a stale frame is never
+    served after the file changes on disk. The total estimated memory of the
+    cached frames is kept under ``max_bytes`` by evicting least recently used
+    entries.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], pd.DataFrame, int]]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def file_version(file_path: str) -> Tuple[int, int]:
+        """Return the version tag (mtime in ns, size) of a file on disk"""
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _key(file_path: str, sheet_name: str) -> Tuple[str, str]:
+        return (os.path.abspath(file_path), str(sheet_name))
+
+    @staticmethod
+    def _estimate_size(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def get(self, file_path: str, sheet_name: str, version: Tuple[int, int]) -> Optional[pd.DataFrame]:
+        """
+        Return the cached frame for this file version, or None on a miss.
+
+        The returned frame is shared and must be treated as read-only.
+        """
+        key = self._key(file_path, sheet_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            cached_version, df, size = entry
+            if cached_version != version:
+                # The file changed on disk, the cached frame is stale
+                del self._entries[key]
+                self._current_bytes -= size
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return df
+
+    def put(self, file_path: str, sheet_name: str, version: Tuple[int, int], df: pd.DataFrame) -> None:
+        """Store a frame for the given file version, evicting LRU entries as needed"""
+        key = self._key(file_path, sheet_name)
+        size = self._estimate_size(df)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._current_bytes -= previous[2]
+
+            # Frames larger than the whole budget are never cached
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (version, df, size)
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._current_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        file_path: str,
+        sheet_name: str,
+        loader: Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """Return the cached frame for the current file version, loading it on a miss"""
+        version = self.file_version(file_path)
+        df = self.get(file_path, sheet_name, version)
+        if df is None:
+            df = loader()
+            self.put(file_path, sheet_name, version, df)
+        return df
+
+    def invalidate(self, file_path: str, sheet_name: Optional[str] = None) -> None:
+        """Drop cached frames for a file, or for a single sheet of it"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if key[0] == path and (sheet_name is None or key[1] == str(sheet_name)):
+                    self._current_bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        """Drop all cached frames (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters for sizing the memory budget"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'current_bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Shared by every PandasExecutor in this process
+dataframe_cache = DataFrameCache(
+    max_bytes=int(os.environ.get('DATAFRAME_CACHE_MAX_MB', '256')) * 1024 * 1024
+)
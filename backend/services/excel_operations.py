@@ -1,7 +1,15 @@
+import time
 import pandas as pd
-import numpy as np
 from typing import Dict, Any, List, Optional
-import os
+
+from services.dataframe_cache import DataFrameCache, dataframe_cache
+from services.filter_expression import FilterExpression, FilterExpressionError
+from services.plan_optimizer import PlanOptimizer
+from services.serialization import frame_to_records
+from services.sheet_stats import SheetStats
+from services.text_kernels import apply_text_functions, is_text, object_columns_for
+from services.version_store import VersionStore
+from services.working_copy import WorkingCopy
 
 class ExcelOperationValidator:
     """Validates that AI-requested operations are safe Excel operations"""
@@ -27,6 +35,9 @@ class ExcelOperationValidator:
         'format_date',
     }
     
+    # Most operations accepted in a single multi-step plan
+    MAX_PLAN_STEPS = 10
+    
     @classmethod
     def validate_operation(cls, operation: str, params: Dict[str, Any]) -> tuple[bool, str]:
         """
@@ -47,8 +58,16 @@ class ExcelOperationValidator:
                 return False, "Both old_name and new_name are required for rename_column"
         
         if operation == 'filter_rows':
-            if 'column' not in params or 'condition' not in params:
-                return False, "Column and condition are required for filter_rows"
+            if 'expression' not in params and ('column' not in params or 'condition' not in params):
+                return False, "An expression, or a column and condition, are required for filter_rows"
+            try:
+                FilterExpression.from_params(params)
+            except FilterExpressionError as e:
+                return False, str(e)
+        
+        if operation in ('upper_case', 'lower_case', 'capitalize'):
+            if not params.get('column') and not (isinstance(params.get('columns'), list) and params['columns']):
+                return False, f"A column or a list of columns is required for {operation}"
         
         if operation == 'sort_values' and 'columns' not in params:
             return False, "Columns parameter is required for sort_values"
@@ -62,16 +81,108 @@ class ExcelOperationValidator:
                 return False, "Both column and format are required for format_date"
         
         return True, ""
+    
+    @classmethod
+    def validate_plan(cls, steps: List[Dict[str, Any]]) -> tuple[bool, str]:
+        """
+        Validate an ordered list of {"operation", "params"} steps.
+        
+        Returns:
+            tuple: (is_valid, error_message)
+        """
+        if not isinstance(steps, list) or not steps:
+            return False, "At least one operation is required"
+        
+        if len(steps) > cls.MAX_PLAN_STEPS:
+            return False, f"At most {cls.MAX_PLAN_STEPS} operations can be performed at once"
+        
+        for index, step in enumerate(steps, start=1):
+            if not isinstance(step, dict) or not isinstance(step.get('params', {}), dict):
+                return False, f"Step {index} must have an operation and params object"
+            
+            is_valid, error_msg = cls.validate_operation(step.get('operation'), step.get('params', {}))
+            if not is_valid:
+                return False, f"Step {index}: {error_msg}" if len(steps) > 1 else error_msg
+        
+        return True, ""
 
 
 class PandasExecutor:
     """Executes validated operations on pandas DataFrames"""
     
-    def __init__(self, file_path: str, sheet_name: str):
+    # Operations whose result for a row only depends on that row, so the
+    # first rows of their result only need the first rows of the sheet.
+    # Every other operation is global (e.g. sorting, filtering, dropping
+    # duplicates).
+    ROW_LOCAL_OPERATIONS = {
+        'upper_case',
+        'lower_case',
+        'capitalize',
+        'trim_whitespace',
+        'transform_text',
+        'round_numbers',
+        'format_date',
+    }
+    
+    # How the string functions of a fused text transform are reported
+    TEXT_FUNCTION_SUMMARIES = {
+        'strip': 'trimmed whitespace',
+        'upper': 'converted to uppercase',
+        'lower': 'converted to lowercase',
+        'capitalize': 'capitalized',
+    }
+    
+    def __init__(
+        self,
+        file_path: str,
+        sheet_name: str,
+        cache: Optional[DataFrameCache] = None,
+        df: Optional[pd.DataFrame] = None
+    ):
+        """
+        Args:
+            file_path: Uploaded file whose working copy is operated on
+            sheet_name: Sheet to operate on
+            cache: Parsed sheet cache (the process-wide one by default)
+            df: Frame to start from instead of the sheet's current state,
+                e.g. a checkpoint being replayed by VersionStore
+        """
         self.file_path = file_path
         self.sheet_name = sheet_name
-        self.df = pd.read_excel(file_path, sheet_name=sheet_name)
+        self.cache = cache if cache is not None else dataframe_cache
+        
+        # Operations work on the columnar working copy, never on the XLSX itself
+        self.working_copy = WorkingCopy.open_or_create(file_path)
+        stored_stats = None
+        if df is None:
+            sheet_path = self.working_copy.sheet_path(sheet_name)
+            df = self.cache.get_or_load(
+                sheet_path,
+                sheet_name,
+                lambda: self.working_copy.load_sheet(sheet_name)
+            )
+            stored_stats = self.working_copy.sheet_stats(sheet_name)
+        self.df = df
+        # The frame is shared with the cache until the first operation copies it
+        self._owns_df = False
         self.original_shape = self.df.shape
+        
+        # Kept up to date by the operations, so stats never rescan the frame
+        self.stats = stored_stats
+        if self.stats is None or not self.stats.matches(self.df):
+            self.stats = SheetStats.from_frame(self.df)
+    
+    @classmethod
+    def is_row_local(cls, steps: List[Dict[str, Any]]) -> bool:
+        """Whether every step of a plan is row-local (see ROW_LOCAL_OPERATIONS)"""
+        for step in steps:
+            operation = step['operation']
+            # Replacing in one column is row-local too
+            if operation == 'replace_value' and step.get('params', {}).get('column'):
+                continue
+            if operation not in cls.ROW_LOCAL_OPERATIONS:
+                return False
+        return True
     
     def execute_operation(self, operation: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -84,6 +195,10 @@ class PandasExecutor:
         if not hasattr(self, method_name):
             raise ValueError(f"Operation {operation} not implemented")
         
+        if not self._owns_df:
+            self.df = self.df.copy()
+            self._owns_df = True
+        
         before_shape = self.df.shape
         before_columns = list(self.df.columns)
         
@@ -91,6 +206,13 @@ class PandasExecutor:
         method = getattr(self, method_name)
         result = method(params)
         
+        # Operations update the stats with their own delta; recount if one didn't
+        if not self.stats.matches(self.df):
+            self.stats = SheetStats.from_frame(self.df)
+        else:
+            # Filling, replacing or parsing values may change column dtypes
+            self.stats.refresh_dtypes(self.df)
+        
         after_shape = self.df.shape
         after_columns = list(self.df.columns)
         
@@ -112,11 +234,68 @@ class PandasExecutor:
             }
         }
     
+    def execute_plan(self, steps: List[Dict[str, Any]], optimize: bool = True) -> Dict[str, Any]:
+        """
+        Execute an ordered list of validated operations as a single unit.
+        
+        All steps run against the same in-memory frame, after PlanOptimizer
+        has rewritten them into an equivalent cheaper order. If any step
+        fails the frame is restored to its state before the plan, so nothing
+        of a partially applied plan can be saved.
+        
+        Returns:
+            Dict with per-step results, the overall changes and the plan
+        """
+        plan = PlanOptimizer.explain(steps, list(self.df.columns)) if optimize else {
+            'original': steps,
+            'optimized': steps,
+            'rewrites': []
+        }
+        
+        original_df, original_owns_df = self.df, self._owns_df
+        original_stats = self.stats.copy()
+        # Make the first step copy the frame, so the original stays untouched
+        self._owns_df = False
+        
+        before_shape = self.df.shape
+        before_columns = list(self.df.columns)
+        
+        step_results = []
+        for index, step in enumerate(plan['optimized'], start=1):
+            operation = step['operation']
+            try:
+                step_results.append(self.execute_operation(operation, step.get('params', {})))
+            except Exception as e:
+                self.df, self._owns_df = original_df, original_owns_df
+                self.stats = original_stats
+                raise ValueError(f"Step {index} ({operation}) failed: {str(e)}") from e
+        
+        after_shape = self.df.shape
+        after_columns = list(self.df.columns)
+        
+        return {
+            'success': True,
+            'operations': [step['operation'] for step in steps],
+            'summary': '\n'.join(result['summary'] for result in step_results),
+            'steps': step_results,
+            'plan': plan,
+            'rows_affected': before_shape[0] - after_shape[0],
+            'columns_affected': before_shape[1] - after_shape[1],
+            'before_shape': before_shape,
+            'after_shape': after_shape,
+            'column_changes': {
+                'removed': [c for c in before_columns if c not in after_columns],
+                'added': [c for c in after_columns if c not in before_columns]
+            }
+        }
+    
     def _execute_drop_duplicates(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Remove duplicate rows"""
         subset = params.get('columns', None)
         initial_count = len(self.df)
+        before = self.df
         self.df = self.df.drop_duplicates(subset=subset, keep='first')
+        self.stats.remove_rows(before, self.df)
         removed = initial_count - len(self.df)
         return {'summary': f'Removed {removed} duplicate rows'}
     
@@ -124,7 +303,9 @@ class PandasExecutor:
         """Remove rows with missing values"""
         subset = params.get('columns', None)
         initial_count = len(self.df)
+        before = self.df
         self.df = self.df.dropna(subset=subset)
+        self.stats.remove_rows(before, self.df)
         removed = initial_count - len(self.df)
         return {'summary': f'Removed {removed} rows with missing values'}
     
@@ -133,9 +314,13 @@ class PandasExecutor:
         fill_value = params.get('value', 0)
         columns = params.get('columns', None)
         if columns:
+            object_columns_for(self.df, columns, fill_value)
             self.df[columns] = self.df[columns].fillna(fill_value)
+            self.stats.clear_nulls(columns)
         else:
+            object_columns_for(self.df, list(self.df.columns), fill_value)
             self.df = self.df.fillna(fill_value)
+            self.stats.clear_nulls(self.df.columns)
         return {'summary': f'Filled missing values with {fill_value}'}
     
     def _execute_remove_column(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -143,6 +328,7 @@ class PandasExecutor:
         column = params['column']
         if column in self.df.columns:
             self.df = self.df.drop(columns=[column])
+            self.stats.drop_columns([column])
             return {'summary': f'Removed column: {column}'}
         return {'summary': f'Column {column} not found'}
     
@@ -152,66 +338,27 @@ class PandasExecutor:
         new_name = params['new_name']
         if old_name in self.df.columns:
             self.df = self.df.rename(columns={old_name: new_name})
+            self.stats.rename_column(old_name, new_name)
             return {'summary': f'Renamed column {old_name} to {new_name}'}
         return {'summary': f'Column {old_name} not found'}
     
     def _execute_filter_rows(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Filter rows based on condition"""
-        column = params['column']
-        condition = params['condition']  # e.g., "> 10", "== 'value'", "contains 'text'"
+        """Filter rows based on a condition on a column, or an expression on several"""
+        # e.g. condition "> 10" on a column, or expression "Amount > 10 and City in ('Paris', 'Rome')"
+        expression = FilterExpression.from_params(params)
         
         initial_count = len(self.df)
+        before = self.df
         
-        if column not in self.df.columns:
-            return {'summary': f'Column {column} not found'}
-        
-        # Parse and apply condition safely
-        if 'contains' in condition.lower():
-            if "'" in condition:
-                parts = condition.split("'")
-                if len(parts) > 1:
-                    search_term = parts[1]
-                else:
-                    return {'summary': f"Invalid condition format: {condition}"}
-            elif '"' in condition:
-                parts = condition.split('"')
-                if len(parts) > 1:
-                    search_term = parts[1]
-                else:
-                    return {'summary': f"Invalid condition format: {condition}"}
-            else:
-                return {'summary': f"Condition must contain quotes for 'contains': {condition}"}
-            self.df = self.df[self.df[column].astype(str).str.contains(search_term, na=False)]
-        elif '>=' in condition:
-            try:
-                value = float(condition.split('>=')[1].strip())
-            except ValueError:
-                return {'summary': f"Invalid value for condition: {condition}. Could not parse a number after '>='."}
-            self.df = self.df[self.df[column] >= value]
-        elif '<=' in condition:
-            try:
-                value = float(condition.split('<=')[1].strip())
-            except ValueError:
-                return {'summary': f"Invalid value for condition: {condition}. Could not parse a number after '<='."}
-            self.df = self.df[self.df[column] <= value]
-        elif '>' in condition:
-            try:
-                value = float(condition.split('>')[1].strip())
-            except ValueError:
-                return {'summary': f"Invalid value for condition: {condition}. Could not parse a number after '>'."}
-            self.df = self.df[self.df[column] > value]
-        elif '<' in condition:
-            try:
-                value = float(condition.split('<')[1].strip())
-            except ValueError:
-                return {'summary': f"Invalid value for condition: {condition}. Could not parse a number after '<'."}
-            self.df = self.df[self.df[column] < value]
-        elif '==' in condition:
-            value = condition.split('==')[1].strip().strip("'\"")
-            self.df = self.df[self.df[column] == value]
+        try:
+            mask = expression.mask(self.df)
+        except FilterExpressionError as e:
+            return {'summary': str(e)}
+        self.df = self.df[mask]
         
+        self.stats.remove_rows(before, self.df)
         filtered = initial_count - len(self.df)
-        return {'summary': f'Filtered {filtered} rows based on {column} {condition}'}
+        return {'summary': f'Filtered {filtered} rows based on {expression}'}
     
     def _execute_sort_values(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Sort DataFrame by columns"""
@@ -221,7 +368,8 @@ class PandasExecutor:
         if isinstance(columns, str):
             columns = [columns]
         
-        self.df = self.df.sort_values(by=columns, ascending=ascending)
+        # Stable, so equal rows keep their order (the plan optimizer relies on it)
+        self.df = self.df.sort_values(by=columns, ascending=ascending, kind='stable')
         return {'summary': f'Sorted by {", ".join(columns)}'}
     
     def _execute_replace_value(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -232,11 +380,15 @@ class PandasExecutor:
         
         if column:
             if column in self.df.columns:
+                object_columns_for(self.df, [column], new_value)
                 self.df[column] = self.df[column].replace(old_value, new_value)
+                self._replaced_nulls([column], old_value, new_value)
                 return {'summary': f'Replaced "{old_value}" with "{new_value}" in column {column}'}
             return {'summary': f'Column {column} not found'}
         else:
+            object_columns_for(self.df, list(self.df.columns), new_value)
             self.df = self.df.replace(old_value, new_value)
+            self._replaced_nulls(list(self.df.columns), old_value, new_value)
             return {'summary': f'Replaced "{old_value}" with "{new_value}" in all columns'}
     
     def _execute_change_type(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -257,8 +409,11 @@ class PandasExecutor:
             elif new_type == 'datetime':
                 self.df[column] = pd.to_datetime(self.df[column], errors='coerce')
             
+            # Coercion turns unparseable values into nulls
+            self.stats.recount(self.df, [column])
             return {'summary': f'Changed {column} to {new_type}'}
         except Exception as e:
+            self.stats.recount(self.df, [column])
             return {'summary': f'Error changing type: {str(e)}'}
     
     def _execute_trim_whitespace(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -266,39 +421,37 @@ class PandasExecutor:
         columns = params.get('columns', None)
         
         if columns:
-            for col in columns:
-                if col in self.df.columns:
-                    self.df[col] = self.df[col].astype(str).str.strip()
+            columns = [col for col in columns if col in self.df.columns]
         else:
-            # Trim all string columns
-            for col in self.df.select_dtypes(include=['object']).columns:
-                self.df[col] = self.df[col].astype(str).str.strip()
+            # Trim all text columns
+            columns = [col for col in self.df.columns if is_text(self.df[col])]
+        self._apply_text_functions(columns, ['strip'])
         
         return {'summary': 'Trimmed whitespace from text columns'}
     
     def _execute_upper_case(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Convert text to uppercase"""
-        column = params['column']
-        if column in self.df.columns:
-            self.df[column] = self.df[column].astype(str).str.upper()
-            return {'summary': f'Converted {column} to uppercase'}
-        return {'summary': f'Column {column} not found'}
+        return self._change_case(params, 'upper', 'Converted {} to uppercase')
     
     def _execute_lower_case(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Convert text to lowercase"""
-        column = params['column']
-        if column in self.df.columns:
-            self.df[column] = self.df[column].astype(str).str.lower()
-            return {'summary': f'Converted {column} to lowercase'}
-        return {'summary': f'Column {column} not found'}
+        return self._change_case(params, 'lower', 'Converted {} to lowercase')
     
     def _execute_capitalize(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Capitalize text"""
+        return self._change_case(params, 'capitalize', 'Capitalized {}')
+    
+    def _execute_transform_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply several string functions to a column in one pass (built by the plan optimizer)"""
         column = params['column']
-        if column in self.df.columns:
-            self.df[column] = self.df[column].astype(str).str.capitalize()
-            return {'summary': f'Capitalized {column}'}
-        return {'summary': f'Column {column} not found'}
+        
+        if column not in self.df.columns:
+            return {'summary': f'Column {column} not found'}
+        
+        self._apply_text_functions([column], params['functions'])
+        
+        done = ', '.join(self.TEXT_FUNCTION_SUMMARIES[name] for name in params['functions'])
+        return {'summary': f'{done[0].upper()}{done[1:]} in {column}'}
     
     def _execute_round_numbers(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Round numeric columns"""
@@ -313,14 +466,18 @@ class PandasExecutor:
     def _execute_drop_empty_rows(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Drop rows that are completely empty"""
         initial_count = len(self.df)
+        before = self.df
         self.df = self.df.dropna(how='all')
+        self.stats.remove_rows(before, self.df)
         removed = initial_count - len(self.df)
         return {'summary': f'Removed {removed} empty rows'}
     
     def _execute_drop_empty_columns(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Drop columns that are completely empty"""
         initial_cols = len(self.df.columns)
+        before_columns = list(self.df.columns)
         self.df = self.df.dropna(axis=1, how='all')
+        self.stats.drop_columns([col for col in before_columns if col not in self.df.columns])
         removed = initial_cols - len(self.df.columns)
         return {'summary': f'Removed {removed} empty columns'}
     
@@ -340,6 +497,8 @@ class PandasExecutor:
             
             # Count how many valid dates we have
             valid_dates = self.df[column].notna().sum()
+            # Dates that failed to parse are null, formatting keeps them that way
+            self.stats.null_counts[str(column)] = len(self.df) - int(valid_dates)
             
             if valid_dates == 0:
                 return {'summary': f'No valid dates found in column {column}'}
@@ -350,64 +509,130 @@ class PandasExecutor:
             return {'summary': f'Formatted {valid_dates} dates in column {column} to {date_format} format'}
             
         except Exception as e:
+            self.stats.recount(self.df, [column])
             return {'summary': f'Error formatting dates: {str(e)}. Make sure the column contains valid dates and the format string is correct (e.g., %Y-%m-%d, %d/%m/%Y, %B %d, %Y)'}
     
-    def get_preview(self, n_rows: int = 5) -> List[Dict[str, Any]]:
-        """Get first N rows as preview"""
-        preview_df = self.df.head(n_rows).copy()
-        
-        # Handle NaT values in datetime columns first
-        for col in preview_df.columns:
-            if pd.api.types.is_datetime64_any_dtype(preview_df[col]):
-                # Replace NaT with None for datetime columns
-                preview_df[col] = preview_df[col].where(preview_df[col].notna(), None)
-        
-        # Handle other NaN values
-        preview_df = preview_df.fillna("")
-        
-        # Convert to records with proper serialization
-        records = []
-        for _, row in preview_df.iterrows():
-            record = {}
-            for col, value in row.items():
-                if pd.isna(value) or value is pd.NaT:
-                    record[col] = None
-                elif isinstance(value, (pd.Timestamp, np.datetime64)):
-                    record[col] = str(value) if pd.notna(value) else None
-                else:
-                    record[col] = value
-            records.append(record)
-        
-        return records
+    def get_preview(self, n_rows: int = 5, offset: int = 0, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get N rows starting at offset as JSON-ready records"""
+        window = self.df.iloc[offset:offset + n_rows]
+        if columns is not None:
+            window = window[columns]
+        return frame_to_records(window)
     
     def save_to_file(self, output_path: str, sheet_name: Optional[str] = None) -> str:
-        """Save DataFrame to Excel file"""
+        """
+        Persist the DataFrame to the working copy of the given file.
+        
+        Only the sheet's Parquet file is rewritten; the XLSX is rendered from
+        the working copy when the file is downloaded.
+        """
         if sheet_name is None:
             sheet_name = self.sheet_name
         
-        # If file already exists, try to preserve other sheets
-        if os.path.exists(output_path):
-            try:
-                with pd.ExcelFile(output_path) as xls:
-                    sheets_dict = {name: pd.read_excel(xls, name) for name in xls.sheet_names}
-                    sheets_dict[sheet_name] = self.df
-                
-                with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                    for name, df in sheets_dict.items():
-                        df.to_excel(writer, sheet_name=name, index=False)
-            except Exception:
-                # If error, just save current sheet
-                self.df.to_excel(output_path, sheet_name=sheet_name, index=False)
-        else:
-            self.df.to_excel(output_path, sheet_name=sheet_name, index=False)
+        working_copy = WorkingCopy.open_or_create(output_path)
+        self.df = working_copy.save_sheet(sheet_name, self.df, self.stats)
+        
+        # Write through to the cache so the next request doesn't reload the sheet
+        sheet_path = working_copy.sheet_path(sheet_name)
+        self.cache.put(sheet_path, sheet_name, DataFrameCache.file_version(sheet_path), self.df)
+        self._owns_df = False
         
         return output_path
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get DataFrame statistics"""
+        """Get DataFrame statistics, from the maintained stats without scanning the cells"""
+        if not self.stats.matches(self.df):
+            self.stats = SheetStats.from_frame(self.df)
+        
+        return self.stats.summary()
+    
+    def _change_case(self, params: Dict[str, Any], function: str, summary: str) -> Dict[str, Any]:
+        """Apply a case change to the "column" or "columns" of the params"""
+        requested = params.get('columns') or [params['column']]
+        columns = [col for col in requested if col in self.df.columns]
+        if not columns:
+            return {'summary': f"Column {', '.join(map(str, requested))} not found"}
+        self._apply_text_functions(columns, [function])
+        return {'summary': summary.format(', '.join(map(str, columns)))}
+    
+    def _apply_text_functions(self, columns: List[Any], functions: List[str]) -> None:
+        """Run string functions over text columns as Arrow kernels, keeping nulls"""
+        for col in columns:
+            self.df[col] = apply_text_functions(self.df[col], functions)
+    
+    def _replaced_nulls(self, columns: List[Any], old_value: Any, new_value: Any) -> None:
+        """Update null counts after a replace, which only changes them if either value is null"""
+        if self._is_null(old_value) or self._is_null(new_value):
+            self.stats.recount(self.df, columns)
+    
+    @staticmethod
+    def _is_null(value: Any) -> bool:
+        return not isinstance(value, (list, dict)) and bool(pd.isna(value))
+
+
+def run_plan(file_path: str, sheet_name: str, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Execute a validated plan on a sheet and save it, for AIExcelService and
+    the job workers.
+    
+    The sheet is loaded once and saved once, and only if every step
+    succeeded. The plan is logged in the file's VersionStore so it can be
+    undone.
+    
+    Returns:
+        Dict with success, and the result, preview, stats and new version or
+        the error
+    """
+    try:
+        executor = PandasExecutor(file_path, sheet_name)
+        
+        # Execute all operations in memory
+        started = time.perf_counter()
+        result = executor.execute_plan(steps)
+        seconds = time.perf_counter() - started
+        
+        # Persist the working state, XLSX is only rendered on download
+        versions = VersionStore(executor.working_copy)
+        versions.prepare(sheet_name)
+        executor.save_to_file(file_path, sheet_name)
+        version = versions.record(sheet_name, steps, result['summary'], seconds)
+        
+        # Get preview and stats
+        preview = executor.get_preview(5)
+        stats = executor.get_stats()
+        
         return {
-            'rows': len(self.df),
-            'columns': len(self.df.columns),
-            'column_names': list(self.df.columns),
-            'null_counts': self.df.isnull().sum().to_dict()
+            'success': True,
+            'result': result,
+            'preview': preview,
+            'stats': stats,
+            'version': version
         }
+        
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def preview_plan(file_path: str, sheet_name: str, steps: List[Dict[str, Any]], n_rows: int = 5) -> List[Dict[str, Any]]:
+    """
+    Get the first rows of a sheet as a row-local plan will leave them.
+    
+    Only the first rows are read and transformed, so this takes the same
+    time whatever the size of the sheet. The plan must be row-local (see
+    PandasExecutor.is_row_local); nothing is saved.
+    """
+    working_copy = WorkingCopy.for_file(file_path)
+    sheet_path = working_copy.sheet_path(sheet_name)
+    df = dataframe_cache.get(sheet_path, sheet_name, DataFrameCache.file_version(sheet_path))
+    
+    if df is None:
+        head = working_copy.read_window(sheet_name, 0, n_rows)
+    else:
+        head = df.iloc[:n_rows]
+    
+    executor = PandasExecutor(file_path, sheet_name, df=head)
+    executor.execute_plan(steps)
+    return executor.get_preview(n_rows)
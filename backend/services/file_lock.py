@@ -0,0 +1,34 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+# Fallback used where advisory file locks are not available (single process only)
+_thread_lock = threading.RLock()
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """
+    Hold an advisory lock on ``path`` for the duration of the block.
+
+    The lock works across threads and across gunicorn worker processes, since
+    every acquisition opens its own file description. ``shared`` locks can be
+    held by several readers at once.
+    """
+    if fcntl is None:
+        with _thread_lock:
+            yield
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a+') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
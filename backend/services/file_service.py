@@ -1,13 +1,23 @@
 import pandas as pd
-import numpy as np
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 import io
+import zipfile
 from werkzeug.datastructures import FileStorage
 
 from models.spreadsheet_info import SpreadsheetData, ColumnInfo
+from services.column_profiler import profile_frame
+from services.serialization import frame_to_records
+from services.upload_ingest import UploadSpool, open_mapped
+from services.xlsx_package import XlsxPackage
 
 class FileService:
     
+    # Number of data rows returned as a snippet for each sheet
+    SNIPPET_ROWS = 5
+    
+    # Number of data rows read to detect column types
+    PROFILE_ROWS = 200
+    
     def __init__(self):
         pass
     
@@ -18,6 +28,12 @@ class FileService:
         """
         Analyze an XLSX file and return spreadsheet information for all sheets.
         
+        XLSX files are read in streaming mode: only the header and the first
+        rows of each sheet (used for the snippet and the column types) are
+        parsed, so the cost does not grow with the number of rows. Files on
+        disk are memory-mapped rather than copied into memory. Other formats
+        (e.g. XLS) are loaded through pandas.
+        
         Args:
             file: Can be a FileStorage object, file path string, or bytes
             
@@ -25,129 +41,82 @@ class FileService:
             List of SpreadsheetData objects containing sheet info
         """
         try:
-            if isinstance(file, FileStorage):
-                file_content = file.read()
+            if isinstance(file, FileStorage) and isinstance(file.stream, UploadSpool):
+                # Already spooled to disk by IngestRequest, analyze it from there
+                file.stream.flush()
+                file = file.stream.name
+            
+            if isinstance(file, str):
+                if not XlsxPackage.is_xlsx(file):
+                    return self._analyze_with_pandas(file)
+                with open_mapped(file) as mapped:
+                    return self._analyze_streaming(mapped)
+            elif isinstance(file, FileStorage):
+                spreadsheet_data_list = self._analyze_stream(file.stream)
                 file.seek(0)
-                excel_file = pd.ExcelFile(io.BytesIO(file_content))
-            elif isinstance(file, str):
-                excel_file = pd.ExcelFile(file)
+                return spreadsheet_data_list
             elif isinstance(file, bytes):
-                excel_file = pd.ExcelFile(io.BytesIO(file))
+                return self._analyze_stream(io.BytesIO(file))
             else:
                 raise ValueError("Unsupported file type")
             
-            spreadsheet_data_list = []
-            
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(excel_file, sheet_name=sheet_name, nrows=5)
-                
-                columns = []
-                for col_name in df.columns:
-                    col_type = self._determine_column_type(df[col_name])
-                    columns.append(ColumnInfo(name=str(col_name), type=col_type))
-                
-                # Convert DataFrame to records and ensure JSON serializable types
-                snippet_raw = df.head(5).fillna("").to_dict('records')
-                snippet = self._make_json_serializable(snippet_raw)
-                
-                sheet_data = SpreadsheetData(
-                    spreadsheet_name=sheet_name,
-                    columns=columns,
-                    spreadsheet_snippet=snippet
-                )
-                
-                spreadsheet_data_list.append(sheet_data)
-            
-            return spreadsheet_data_list
-            
         except Exception as e:
             raise Exception(f"Error analyzing XLSX file: {str(e)}")
     
-    def _determine_column_type(self, series: pd.Series) -> str:
-        """
-        Determine the type of a pandas Series column.
-        
-        Args:
-            series: Pandas Series to analyze
+    def _analyze_stream(self, stream) -> List[SpreadsheetData]:
+        is_xlsx = XlsxPackage.is_xlsx(stream)
+        stream.seek(0)
+        if is_xlsx:
+            return self._analyze_streaming(stream)
+        return self._analyze_with_pandas(stream)
+    
+    def _analyze_streaming(self, source) -> List[SpreadsheetData]:
+        """Analyze an XLSX package without loading whole worksheets"""
+        with zipfile.ZipFile(source) as zf:
+            package = XlsxPackage(zf)
             
-        Returns:
-            String representation of the column type
-        """
-        non_null_series = series.dropna()
-        
-        if len(non_null_series) == 0:
-            return "unknown"
-        
-        if pd.api.types.is_integer_dtype(series):
-            return "integer"
-        elif pd.api.types.is_float_dtype(series):
-            return "float"
-        elif pd.api.types.is_bool_dtype(series):
-            return "boolean"
-        elif pd.api.types.is_datetime64_any_dtype(series):
-            return "datetime"
-        else:
-            sample_value = non_null_series.iloc[0]
+            spreadsheet_data_list = []
+            for sheet_name in package.sheet_parts():
+                df, dimension = package.read_head(sheet_name, self.PROFILE_ROWS)
+                spreadsheet_data_list.append(self._build_sheet_data(sheet_name, df, dimension))
             
-            if isinstance(sample_value, (int, float)):
-                return "number"
-            elif isinstance(sample_value, bool):
-                return "boolean"
-            elif isinstance(sample_value, str):
-                if self._is_date_string(sample_value):
-                    return "date"
-                elif self._is_numeric_string(sample_value):
-                    return "numeric_string"
-                else:
-                    return "text"
-            else:
-                return "text"
-    
-    def _is_date_string(self, value: str) -> bool:
-        """Check if a string represents a date."""
-        try:
-            pd.to_datetime(value)
-            return True
-        except:
-            return False
-    
-    def _is_numeric_string(self, value: str) -> bool:
-        """Check if a string represents a number."""
-        try:
-            float(value)
-            return True
-        except:
-            return False
+            return spreadsheet_data_list
     
-    def _make_json_serializable(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """
-        Convert pandas/numpy data types to JSON serializable Python types.
+    def _analyze_with_pandas(self, source) -> List[SpreadsheetData]:
+        """Analyze a workbook in a format the streaming reader doesn't support"""
+        excel_file = pd.ExcelFile(source)
         
-        Args:
-            data: List of dictionaries that may contain pandas/numpy types
-            
-        Returns:
-            List of dictionaries with JSON serializable values
-        """
+        spreadsheet_data_list = []
+        for sheet_name in excel_file.sheet_names:
+            df = pd.read_excel(excel_file, sheet_name=sheet_name, nrows=self.PROFILE_ROWS)
+            spreadsheet_data_list.append(self._build_sheet_data(sheet_name, df))
         
+        return spreadsheet_data_list
+    
+    def _build_sheet_data(
+        self, 
+        sheet_name: str, 
+        df: pd.DataFrame, 
+        dimension: Optional[Tuple[int, int]] = None
+    ) -> SpreadsheetData:
+        profiles = profile_frame(df)
+        columns = [
+            ColumnInfo(
+                name=name,
+                type=profile.type,
+                confidence=profile.confidence,
+                parse_failures=profile.parse_failures
+            )
+            for name, profile in profiles.items()
+        ]
         
-        serializable_data = []
+        # Convert the snippet to JSON serializable records, keeping nulls as null
+        snippet = frame_to_records(df.head(self.SNIPPET_ROWS))
         
-        for record in data:
-            serializable_record = {}
-            
-            for key, value in record.items():
-                if pd.isna(value) or value is pd.NaT:
-                    serializable_record[key] = None
-                elif isinstance(value, (np.integer, np.floating)):
-                    serializable_record[key] = value.item()
-                elif isinstance(value, np.bool_):
-                    serializable_record[key] = bool(value)
-                elif isinstance(value, (pd.Timestamp, np.datetime64)):
-                    serializable_record[key] = str(value)
-                else:
-                    serializable_record[key] = value
-                    
-            serializable_data.append(serializable_record)
-            
-        return serializable_data
\ No newline at end of file
+        return SpreadsheetData(
+            spreadsheet_name=sheet_name,
+            columns=columns,
+            spreadsheet_snippet=snippet,
+            row_count=dimension[0] if dimension else None,
+            column_count=dimension[1] if dimension else None
+        )
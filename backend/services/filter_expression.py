@@ -0,0 +1,672 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from re import _parser as _regex_parser
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_parse as _regex_parser
+
+try:
+    import numexpr
+except ImportError:  # pragma: no cover - optional, numpy evaluates everything too
+    numexpr = None
+
+# Longest expression accepted, and deepest nesting of and/or/not/parentheses
+MAX_EXPRESSION_LENGTH = 2000
+MAX_DEPTH = 32
+# Longest regular expression of ``matches``. Patterns that can backtrack
+# exponentially (nested repeats, backreferences) are refused outright; the
+# job deadline bounds the time of the rest.
+MAX_PATTERN_LENGTH = 200
+# numexpr is only used with several threads: on one core numpy's vectorized
+# passes are faster. Below NUMEXPR_MIN_ROWS its setup costs more than it saves.
+USE_NUMEXPR = numexpr is not None and numexpr.nthreads > 1
+NUMEXPR_MIN_ROWS = 100_000
+
+COMPARISONS = ('==', '!=', '>=', '<=', '>', '<')
+KEYWORDS = {'and', 'or', 'not', 'between', 'in', 'contains', 'matches', 'is', 'null', 'empty', 'true', 'false'}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<quoted>`[^`]+`)
+      | (?P<word>[^\W\d]\w*)
+      | (?P<symbol>==|!=|>=|<=|=|>|<|\(|\)|\[|\]|,)
+    )""", re.VERBOSE)
+
+# A single-column condition whose value is all the text after the comparison
+_CONDITION = re.compile(r'\s*(?P<op>==|!=|>=|<=|=|>|<)\s*(?P<value>[^\s=<>!].*?)\s*', re.S)
+
+
+class FilterExpressionError(ValueError):
+    """A filter expression that can't be parsed or applied"""
+
+
+# Syntax tree. Every node renders back to the expression text it stands for.
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+
+    def __str__(self) -> str:
+        return self.name if re.fullmatch(r'[^\W\d]\w*', self.name) and self.name.lower() not in KEYWORDS else f'`{self.name}`'
+
+
+@dataclass(frozen=True)
+class Literal:
+    value: Union[str, float, int, bool]
+
+    def __str__(self) -> str:
+        if isinstance(self.value, bool):
+            return 'true' if self.value else 'false'
+        if isinstance(self.value, str):
+            return "'" + self.value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+        return repr(self.value)
+
+
+Operand = Union[Column, Literal]
+
+
+@dataclass(frozen=True)
+class Compare:
+    left: Operand
+    op: str
+    right: Operand
+
+    def __str__(self) -> str:
+        return f'{self.left} {self.op} {self.right}'
+
+
+# ``negated`` tests (``not between``, ``not in``, ``not contains``, ``not
+# matches``) fail on missing values, like ``!=``; ``not (test)`` keeps them.
+
+@dataclass(frozen=True)
+class Between:
+    operand: Operand
+    low: Operand
+    high: Operand
+    negated: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.operand} {'not ' if self.negated else ''}between {self.low} and {self.high}"
+
+
+@dataclass(frozen=True)
+class InList:
+    operand: Operand
+    values: Tuple[Literal, ...]
+    negated: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.operand} {'not ' if self.negated else ''}in ({', '.join(str(value) for value in self.values)})"
+
+
+@dataclass(frozen=True)
+class TextMatch:
+    """``contains`` (plain text) or ``matches`` (regular expression, anywhere in the value)"""
+    operand: Operand
+    op: str
+    pattern: str
+    negated: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.operand} {'not ' if self.negated else ''}{self.op} {Literal(self.pattern)}"
+
+
+@dataclass(frozen=True)
+class IsNull:
+    """``is null`` (missing) or ``is empty`` (missing or blank text)"""
+    operand: Operand
+    blank: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.operand} is {'empty' if self.blank else 'null'}"
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: 'Node'
+
+    def __str__(self) -> str:
+        return f'not ({self.operand})' if isinstance(self.operand, (And, Or)) else f'not {self.operand}'
+
+
+@dataclass(frozen=True)
+class And:
+    operands: Tuple['Node', ...]
+
+    def __str__(self) -> str:
+        return ' and '.join(f'({operand})' if isinstance(operand, Or) else str(operand) for operand in self.operands)
+
+
+@dataclass(frozen=True)
+class Or:
+    operands: Tuple['Node', ...]
+
+    def __str__(self) -> str:
+        return ' or '.join(str(operand) for operand in self.operands)
+
+
+Node = Union[Compare, Between, InList, TextMatch, IsNull, Not, And, Or]
+
+
+class _Parser:
+    """
+    Recursive descent parser of the grammar below (keywords are case-insensitive):
+
+        expression := term ('or' term)*
+        term       := factor ('and' factor)*
+        factor     := 'not' factor | '(' expression ')' | predicate
+        predicate  := operand test
+        test       := comparison operand
+                    | ['not'] 'between' operand 'and' operand
+                    | ['not'] 'in' '(' literal (',' literal)* ')'
+                    | ['not'] ('contains' | 'matches') string
+                    | 'is' ['not'] ('null' | 'empty')
+        operand    := column | literal
+        column     := name | `any name`
+        literal    := number | 'text' | "text" | true | false
+
+    With a default column the operand before a test may be left out
+    (``> 10 and < 20``), and bare words after a test are text rather than
+    columns, as in the single-column conditions filter_rows always took
+    (see parse_filter for unquoted text of several words).
+    """
+
+    def __init__(self, text: str, default_column: Optional[str]):
+        self.text = text
+        self.default_column = default_column
+        self.tokens = self._tokenize(text)
+        self.position = 0
+        self.depth = 0
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise FilterExpressionError('The filter expression is empty')
+        node = self._expression()
+        if self.position < len(self.tokens):
+            raise FilterExpressionError(f"Unexpected '{self.tokens[self.position][1]}' in filter expression: {self.text}")
+        return node
+
+    def _tokenize(self, text: str) -> List[Tuple[str, str]]:
+        tokens = []
+        position = 0
+        while position < len(text):
+            if text[position:].strip() == '':
+                break
+            match = _TOKEN.match(text, position)
+            if match is None:
+                raise FilterExpressionError(f"Unexpected '{text[position:].strip()[:10]}' in filter expression: {text}")
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'word' and value.lower() in KEYWORDS:
+                kind, value = 'keyword', value.lower()
+            elif kind == 'symbol' and value == '=':
+                value = '=='
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def _peek(self) -> Tuple[str, str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ('end', '')
+
+    def _accept(self, *values: str) -> Optional[str]:
+        kind, value = self._peek()
+        if kind in ('keyword', 'symbol') and value in values:
+            self.position += 1
+            return value
+        return None
+
+    def _expect(self, *values: str) -> str:
+        value = self._accept(*values)
+        if value is None:
+            found = self._peek()[1] or 'the end'
+            raise FilterExpressionError(f"Expected {' or '.join(repr(v) for v in values)} but found '{found}' in filter expression: {self.text}")
+        return value
+
+    def _expression(self) -> Node:
+        operands = [self._term()]
+        while self._accept('or'):
+            operands.append(self._term())
+        return operands[0] if len(operands) == 1 else Or(tuple(operands))
+
+    def _term(self) -> Node:
+        operands = [self._factor()]
+        while self._accept('and'):
+            operands.append(self._factor())
+        return operands[0] if len(operands) == 1 else And(tuple(operands))
+
+    def _factor(self) -> Node:
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise FilterExpressionError(f'Filter expression is nested more than {MAX_DEPTH} levels deep')
+        try:
+            if self._accept('not'):
+                return Not(self._factor())
+            if self._accept('('):
+                node = self._expression()
+                self._expect(')')
+                return node
+            return self._predicate()
+        finally:
+            self.depth -= 1
+
+    def _predicate(self) -> Node:
+        kind, value = self._peek()
+        starts_test = (kind == 'symbol' and value in COMPARISONS) or (
+            kind == 'keyword' and value in ('between', 'in', 'contains', 'matches', 'is', 'not'))
+        if starts_test and self.default_column is not None:
+            operand: Operand = Column(self.default_column)
+        else:
+            operand = self._operand(left=True)
+
+        negated = self._accept('not') is not None
+        op = self._accept(*COMPARISONS, 'between', 'in', 'contains', 'matches', 'is')
+        if op is None or (negated and op in COMPARISONS + ('is',)):
+            found = self._peek()[1] or 'the end'
+            raise FilterExpressionError(f"Expected a comparison after {operand} but found '{found}' in filter expression: {self.text}")
+
+        if op in COMPARISONS:
+            node: Node = Compare(operand, op, self._operand())
+        elif op == 'between':
+            low = self._operand()
+            self._expect('and')
+            node = Between(operand, low, self._operand(), negated)
+        elif op == 'in':
+            closing = ')' if self._expect('(', '[') == '(' else ']'
+            values = [self._literal()]
+            while self._accept(','):
+                values.append(self._literal())
+            self._expect(closing)
+            node = InList(operand, tuple(values), negated)
+        elif op in ('contains', 'matches'):
+            pattern = self._literal()
+            if not isinstance(pattern.value, str):
+                raise FilterExpressionError(f"'{op}' needs quoted text in filter expression: {self.text}")
+            if op == 'matches':
+                _check_pattern(pattern.value)
+            node = TextMatch(operand, op, pattern.value, negated)
+        else:
+            negated = self._accept('not') is not None
+            node = IsNull(operand, blank=self._expect('null', 'empty') == 'empty')
+            return Not(node) if negated else node
+        return node
+
+    def _operand(self, left: bool = False) -> Operand:
+        kind, value = self._peek()
+        if kind == 'quoted':
+            self.position += 1
+            return Column(value[1:-1])
+        if kind == 'word':
+            self.position += 1
+            # Conditions of a single column compare it to bare text
+            if self.default_column is not None and not left:
+                return Literal(value)
+            return Column(value)
+        return self._literal()
+
+    def _literal(self) -> Literal:
+        kind, value = self._peek()
+        if kind == 'number':
+            self.position += 1
+            number = float(value)
+            return Literal(int(number) if number.is_integer() and re.fullmatch(r'-?\d+', value) else number)
+        if kind == 'string':
+            self.position += 1
+            return Literal(re.sub(r'\\(.)', r'\1', value[1:-1]))
+        if kind == 'keyword' and value in ('true', 'false'):
+            self.position += 1
+            return Literal(value == 'true')
+        if kind == 'word' and self.default_column is not None:
+            self.position += 1
+            return Literal(value)
+        found = value or 'the end'
+        raise FilterExpressionError(f"Expected a value but found '{found}' in filter expression: {self.text}")
+
+
+@lru_cache(maxsize=256)
+def parse_filter(text: str, default_column: Optional[str] = None) -> Node:
+    """
+    Parse a filter expression (see _Parser for the grammar), e.g.
+    ``Amount > 100 and City in ('Paris', 'Rome') and not Email is null``.
+
+    With a default column, a single comparison that doesn't parse, e.g.
+    ``== Paris Hotel``, compares the column with the rest of the text, as
+    filter_rows conditions always did.
+
+    Raises:
+        FilterExpressionError: If the expression is invalid
+    """
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise FilterExpressionError(f'Filter expression is longer than {MAX_EXPRESSION_LENGTH} characters')
+    try:
+        return _Parser(text, default_column).parse()
+    except FilterExpressionError:
+        match = _CONDITION.fullmatch(text) if default_column is not None else None
+        if match is None:
+            raise
+        op = '==' if match.group('op') == '=' else match.group('op')
+        return Compare(Column(default_column), op, Literal(match.group('value').strip('\'"')))
+
+
+class FilterExpression:
+    """
+    A parsed filter that evaluates to one boolean mask over a frame.
+
+    Every predicate is computed with a vectorized pandas or numpy operation
+    and the results are combined with numpy, so a compound filter costs a
+    single pass per referenced column instead of one pass per condition.
+    When numexpr is installed and has several threads, and/or/not trees of
+    numeric comparisons on large frames are evaluated by it in one fused,
+    multi-threaded loop.
+
+    Missing values fail every comparison and test, negated ones included
+    (``!=``, ``not in``, ``not between``, ``not contains``); ``not (...)``
+    keeps them. Ordering comparisons between text and numbers read the text
+    as numbers.
+    """
+
+    def __init__(self, text: str, default_column: Optional[str] = None):
+        self.tree = parse_filter(text, default_column)
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> 'FilterExpression':
+        """The filter of filter_rows params: an ``expression``, or a ``condition`` on a ``column``"""
+        if params.get('expression') is not None:
+            return cls(str(params['expression']))
+        return cls(str(params['condition']), default_column=str(params['column']))
+
+    def __str__(self) -> str:
+        return str(self.tree)
+
+    @property
+    def columns(self) -> FrozenSet[str]:
+        """Columns the filter reads"""
+        return frozenset(_columns(self.tree))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean array of the rows of ``df`` the filter keeps"""
+        missing = [name for name in sorted(self.columns) if name not in df.columns]
+        if missing:
+            raise FilterExpressionError(f"Column {', '.join(missing)} not found")
+        return _Evaluator(df).mask(self.tree)
+
+
+def conjunction(filters: List[Dict[str, Any]]) -> str:
+    """Expression keeping the rows that every one of several filter_rows params keeps"""
+    operands: List[Node] = []
+    for params in filters:
+        tree = FilterExpression.from_params(params).tree
+        operands.extend(tree.operands if isinstance(tree, And) else [tree])
+    return str(And(tuple(operands)))
+
+
+def _columns(node: Any) -> List[str]:
+    if isinstance(node, Column):
+        return [node.name]
+    if isinstance(node, Literal):
+        return []
+    if isinstance(node, (And, Or)):
+        return [name for operand in node.operands for name in _columns(operand)]
+    if isinstance(node, Not):
+        return _columns(node.operand)
+    if isinstance(node, Compare):
+        return _columns(node.left) + _columns(node.right)
+    if isinstance(node, Between):
+        return _columns(node.operand) + _columns(node.low) + _columns(node.high)
+    return _columns(node.operand)
+
+
+class _Evaluator:
+    """Computes the masks of a tree's nodes over one frame"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.use_numexpr = USE_NUMEXPR and len(df) >= NUMEXPR_MIN_ROWS
+
+    def mask(self, node: Node) -> np.ndarray:
+        if self.use_numexpr and not isinstance(node, (Compare, Between)):
+            # Single comparisons gain nothing over numpy
+            variables: Dict[str, np.ndarray] = {}
+            source = self._numexpr_source(node, variables)
+            if source is not None:
+                return numexpr.evaluate(source, local_dict=variables)
+
+        if isinstance(node, And):
+            result = self.mask(node.operands[0])
+            for operand in node.operands[1:]:
+                result = result & self.mask(operand)
+            return result
+        if isinstance(node, Or):
+            result = self.mask(node.operands[0])
+            for operand in node.operands[1:]:
+                result = result | self.mask(operand)
+            return result
+        if isinstance(node, Not):
+            return ~self.mask(node.operand)
+        if isinstance(node, Compare):
+            left, right = self._comparable(self._value(node.left), self._value(node.right), node.op)
+            return _to_mask(_compare(left, node.op, right), len(self.df))
+        if isinstance(node, Between):
+            value = self._value(node.operand)
+            value, low = self._comparable(value, self._value(node.low), '>=')
+            value, high = self._comparable(value, self._value(node.high), '<=')
+            result = _to_mask(value >= low, len(self.df)) & _to_mask(value <= high, len(self.df))
+            return self._negated(node, result)
+        if isinstance(node, InList):
+            result = self._in_list(self._series(node.operand), [literal.value for literal in node.values])
+            return self._negated(node, result)
+        if isinstance(node, TextMatch):
+            text = self._series(node.operand).astype('string')
+            result = _to_mask(text.str.contains(node.pattern, regex=node.op == 'matches', na=False), len(self.df))
+            return self._negated(node, result)
+        values = self._series(node.operand)
+        result = values.isna().to_numpy()
+        if node.blank:
+            result = result | (values.astype('string').str.strip() == '').fillna(False).to_numpy(dtype=bool)
+        return result
+
+    def _negated(self, node: Union[Between, InList, TextMatch], result: np.ndarray) -> np.ndarray:
+        if not node.negated:
+            return result
+        return ~result & self._series(node.operand).notna().to_numpy()
+
+    def _value(self, operand: Operand) -> Any:
+        return self.df[operand.name] if isinstance(operand, Column) else operand.value
+
+    def _series(self, operand: Operand) -> pd.Series:
+        if isinstance(operand, Column):
+            return self.df[operand.name]
+        return pd.Series([operand.value] * len(self.df), index=self.df.index)
+
+    @staticmethod
+    def _comparable(left: Any, right: Any, op: str) -> Tuple[Any, Any]:
+        """Convert the sides of a comparison so they compare as the same kind of value"""
+        if isinstance(left, pd.Series) and isinstance(right, pd.Series):
+            if _numeric(left) != _numeric(right):
+                left, right = pd.to_numeric(left, errors='coerce'), pd.to_numeric(right, errors='coerce')
+            return left, right
+        if not isinstance(left, pd.Series):
+            right, left = _Evaluator._comparable(right, left, op)
+            return left, right
+
+        if isinstance(right, bool):
+            return left, right
+        if isinstance(right, (int, float)):
+            if not _numeric(left):
+                left = pd.to_numeric(left, errors='coerce')
+        elif isinstance(right, str):
+            if _numeric(left):
+                try:
+                    right = float(right)
+                except ValueError:
+                    pass
+            elif pd.api.types.is_datetime64_any_dtype(left):
+                try:
+                    right = pd.Timestamp(right)
+                except ValueError as e:
+                    raise FilterExpressionError(f"Can't compare dates with '{right}'") from e
+            elif op not in ('==', '!='):
+                # Text is ordered as text, numbers stored as text as numbers
+                numbers = pd.to_numeric(left, errors='coerce')
+                try:
+                    return numbers, float(right)
+                except ValueError:
+                    left = left.astype('string')
+        return left, right
+
+    @staticmethod
+    def _in_list(values: pd.Series, candidates: List[Any]) -> np.ndarray:
+        if _numeric(values):
+            numbers = []
+            for candidate in candidates:
+                try:
+                    numbers.append(float(candidate))
+                except (TypeError, ValueError):
+                    pass
+            return values.isin(numbers).to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.isin([pd.Timestamp(candidate) for candidate in candidates if isinstance(candidate, str)]).to_numpy()
+        # Cells of a text column may also hold numbers, match either form
+        texts = [_number_text(candidate) for candidate in candidates if isinstance(candidate, (int, float)) and not isinstance(candidate, bool)]
+        return values.isin(candidates + texts).to_numpy()
+
+    def _numexpr_source(self, node: Node, variables: Dict[str, np.ndarray]) -> Optional[str]:
+        """numexpr source of a tree of numeric comparisons, None if it has anything else"""
+        if isinstance(node, (And, Or)):
+            parts = [self._numexpr_source(operand, variables) for operand in node.operands]
+            if any(part is None for part in parts):
+                return None
+            return '(' + (' & ' if isinstance(node, And) else ' | ').join(parts) + ')'
+        if isinstance(node, Not):
+            part = self._numexpr_source(node.operand, variables)
+            return None if part is None else f'(~{part})'
+        if isinstance(node, Compare):
+            left, right = self._numexpr_operand(node.left, variables), self._numexpr_operand(node.right, variables)
+            if left is None or right is None:
+                return None
+            if node.op == '!=':
+                # NaN != x holds in numexpr, missing values fail comparisons here
+                return f'(({left} != {right}) & ({left} == {left}) & ({right} == {right}))'
+            return f'({left} {node.op} {right})'
+        if isinstance(node, Between):
+            value = self._numexpr_operand(node.operand, variables)
+            low, high = self._numexpr_operand(node.low, variables), self._numexpr_operand(node.high, variables)
+            if value is None or low is None or high is None:
+                return None
+            if node.negated:
+                return f'((~(({value} >= {low}) & ({value} <= {high}))) & ({value} == {value}))'
+            return f'(({value} >= {low}) & ({value} <= {high}))'
+        return None
+
+    def _numexpr_operand(self, operand: Operand, variables: Dict[str, np.ndarray]) -> Optional[str]:
+        if isinstance(operand, Literal):
+            value = operand.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return None
+            return repr(float(value))
+        values = self.df[operand.name]
+        # Plain numpy numbers only; nullable and boolean columns stay with pandas
+        if not isinstance(values.dtype, np.dtype) or values.dtype.kind not in 'iuf':
+            return None
+        name = f'c{self.df.columns.get_loc(operand.name)}'
+        variables[name] = values.to_numpy()
+        return name
+
+
+def _check_pattern(pattern: str) -> None:
+    """Refuse regular expressions that are too long or can backtrack exponentially"""
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise FilterExpressionError(f'Regular expression is longer than {MAX_PATTERN_LENGTH} characters')
+    try:
+        parsed = _regex_parser.parse(pattern)
+    except re.error as e:
+        raise FilterExpressionError(f"Invalid regular expression {Literal(pattern)}: {e}") from e
+    problem = _backtracking(parsed)
+    if problem:
+        raise FilterExpressionError(f'Regular expression {Literal(pattern)} is too slow to match: {problem}')
+
+
+_REPEATS = ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+
+
+def _backtracking(parsed: Any, repeated: bool = False) -> Optional[str]:
+    """Why a parsed pattern can take exponential time, e.g. ``(a+)+``; None if it can't"""
+    for op, value in parsed:
+        name = str(op)
+        if name in ('GROUPREF', 'GROUPREF_EXISTS'):
+            return 'it refers back to a group'
+        if name in _REPEATS:
+            low, high, item = value
+            if high > 1:
+                if repeated:
+                    return 'it repeats a repetition'
+                problem = _backtracking(item, repeated=True)
+            else:
+                problem = _backtracking(item, repeated)
+        elif name == 'SUBPATTERN':
+            problem = _backtracking(value[-1], repeated)
+        elif name == 'BRANCH':
+            if repeated and not _distinct_starts(value[1]):
+                return 'it repeats alternatives that can match the same text'
+            problem = next((p for p in (_backtracking(branch, repeated) for branch in value[1]) if p), None)
+        elif name in ('ASSERT', 'ASSERT_NOT', 'ATOMIC_GROUP'):
+            problem = _backtracking(value[-1], repeated)
+        else:
+            problem = None
+        if problem:
+            return problem
+    return None
+
+
+def _distinct_starts(branches: List[Any]) -> bool:
+    """Whether alternatives each start with a different literal character, e.g. ``foo|bar``"""
+    starts = []
+    for branch in branches:
+        if not len(branch) or str(branch[0][0]) != 'LITERAL':
+            return False
+        starts.append(branch[0][1])
+    return len(set(starts)) == len(starts)
+
+
+def _numeric(values: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+
+def _number_text(value: Union[int, float]) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def _compare(left: Any, op: str, right: Any) -> Any:
+    if op == '==':
+        return left == right
+    if op == '!=':
+        # Missing values fail this comparison too
+        result = left != right
+        for side in (left, right):
+            if isinstance(side, pd.Series):
+                result = result & side.notna()
+        return result
+    if op == '>=':
+        return left >= right
+    if op == '<=':
+        return left <= right
+    if op == '>':
+        return left > right
+    return left < right
+
+
+def _to_mask(result: Any, rows: int) -> np.ndarray:
+    """A comparison result as a numpy boolean array, missing values as False"""
+    if isinstance(result, pd.Series):
+        if result.dtype != bool:
+            result = result.fillna(False)
+        return result.to_numpy(dtype=bool)
+    # Two literals compared with each other
+    return np.full(rows, bool(result))
@@ -0,0 +1,519 @@
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.excel_operations import ExcelOperationValidator
+from services.filter_expression import Column, Compare, Literal
+
+# Words around a command that don't change it
+_POLITE_PREFIX = re.compile(r'^(?:(?:please|pls|kindly|can you|could you|would you|now|then|also)\s+)+', re.I)
+_POLITE_SUFFIX = re.compile(r'(?:\s+(?:please|pls|for me|thanks|thank you))+$', re.I)
+_TRAILING_PUNCTUATION = re.compile(r'[\s.!?]+$')
+_QUOTES = '\'"`‘’“”'
+
+# Separators between commands of one message. A part is only split at weak
+# separators when every piece is a command ("sort by A and B" is one command).
+_STRONG_SEPARATORS = re.compile(r'\s*(?:;|\.\s+|,?\s+and then\s+|,?\s+then\s+|,?\s+after that\s+)\s*', re.I)
+_WEAK_SEPARATORS = re.compile(r'\s*(?:,\s*and\s+|\s+and\s+|\s+also\s+|,\s*)\s*', re.I)
+_COLUMN_LIST_SEPARATORS = re.compile(r'\s*(?:,\s*and\s+|,|\s+and\s+|\s*&\s*)\s*', re.I)
+
+_REMOVE = r'(?:remove|delete|drop|get rid of|eliminate|clear out)'
+_ALL = r'(?:(?:all|any|every)\s+)?(?:(?:the|of the)\s+)?'
+_MISSING = r'(?:missing|null|empty|blank|na|nan|n/a)'
+
+_DESCENDING = re.compile(
+    r'^(?:in\s+)?(?:desc|descending|decreasing|reverse|z\s*(?:-|to)\s*a|high(?:est)?\s+to\s+low(?:est)?'
+    r'|highest first|largest first|biggest first|newest first|latest first)(?:\s+order)?$', re.I
+)
+_ASCENDING = re.compile(
+    r'^(?:in\s+)?(?:asc|ascending|increasing|a\s*(?:-|to)\s*z|low(?:est)?\s+to\s+high(?:est)?'
+    r'|lowest first|smallest first|oldest first|earliest first)(?:\s+order)?$', re.I
+)
+
+# Comparisons of filter conditions by regex group name, longest phrases first
+_COMPARISONS = [
+    ('ge', '>=', r'>=|=>|greater than or equal to|at least|no less than'),
+    ('le', '<=', r'<=|=<|less than or equal to|at most|no more than'),
+    ('gt', '>', r'>|greater than|more than|bigger than|larger than|higher than|above|over'),
+    ('lt', '<', r'<|less than|smaller than|fewer than|lower than|below|under'),
+    ('eq', '==', r'==|=|equals|equal to|is equal to|is'),
+    ('contains', 'contains', r'contains|contain|includes|include|has'),
+]
+_COMPARISON = '|'.join(f'(?P<{group}>{pattern})' for group, _, pattern in _COMPARISONS)
+_COMPARISON_SYMBOLS = {group: symbol for group, symbol, _ in _COMPARISONS}
+# Bare words after "fill/replace ... with" that name a way of filling rather
+# than a value, e.g. "with mean", "with nothing"
+_FILL_METHODS = re.compile(
+    r'(?:mean|average|avg|median|mode|min|minimum|max|maximum|sum|total|previous|next|above|below|'
+    r'forward|backward|ffill|bfill|interpolate|interpolation|nothing|none|null|nan|blank|empty|zero|zeros)',
+    re.I
+)
+
+_TYPE_NAMES = {
+    'int': 'int', 'integer': 'int', 'integers': 'int', 'whole number': 'int', 'whole numbers': 'int',
+    'float': 'float', 'decimal': 'float', 'decimals': 'float', 'number': 'float', 'numbers': 'float',
+    'numeric': 'float',
+    'str': 'str', 'string': 'str', 'strings': 'str', 'text': 'str',
+    'date': 'datetime', 'dates': 'datetime', 'datetime': 'datetime', 'datetimes': 'datetime',
+}
+
+# Date format tokens, longest first, and the strftime codes they stand for
+_DATE_TOKENS = [
+    ('YYYY', '%Y'), ('Month', '%B'), ('MONTH', '%B'), ('month', '%B'), ('Mon', '%b'), ('MMM', '%b'),
+    ('YY', '%y'), ('DD', '%d'), ('HH', '%H'), ('mm', '%M'), ('SS', '%S'), ('ss', '%S'),
+]
+# After hours "MM" is minutes, elsewhere months
+_MINUTES_AFTER = re.compile(r'(?:%H|%I):$')
+
+
+class IntentParser:
+    """
+    Deterministic parser for common, unambiguous commands.
+
+    Runs before the model. A message is only answered when every part of it
+    matches one of the rules below and every column it names resolves to
+    exactly one column of the sheet; anything else returns None so the model
+    handles it. Results are validated like model responses.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.fallbacks = 0
+        self._rules: List[Tuple[re.Pattern, Callable[..., Optional[Dict[str, Any]]]]] = [
+            (self._pattern(rf'(?:dedupe|de-duplicate|deduplicate|{_REMOVE}\s+{_ALL}(?:duplicate|duplicated)s?(?:\s+(?:rows|records|entries|lines))?)'
+                           r'(?:\s+(?:based on|by|in|using|on)\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+))?'),
+             self._drop_duplicates),
+            (self._pattern(rf'{_REMOVE}\s+{_ALL}(?:empty|blank)\s+(?:rows|records|lines)'),
+             lambda match, columns: {'operation': 'drop_empty_rows', 'params': {}}),
+            (self._pattern(rf'{_REMOVE}\s+{_ALL}(?:empty|blank)\s+columns'),
+             lambda match, columns: {'operation': 'drop_empty_columns', 'params': {}}),
+            (self._pattern(rf'{_REMOVE}\s+{_ALL}(?:rows|records)\s+(?:with|containing|that have|having)\s+(?:any\s+)?{_MISSING}\s+(?:values?|cells?|data)'
+                           r'(?:\s+in\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+))?'),
+             self._drop_na),
+            (self._pattern(rf'(?:fill|replace)\s+{_ALL}{_MISSING}(?:\s+(?:values?|cells?|data))?'
+                           r'(?:\s+in\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+?))?\s+with\s+(?P<value>.+)'),
+             self._fill_na),
+            (self._pattern(r'rename\s+(?:the\s+)?(?:column\s+)?(?P<column>.+?)(?:\s+column)?\s+(?:to|as|into)\s+(?P<new_name>.+)'),
+             self._rename_column),
+            (self._pattern(r'sort\s+(?:the\s+)?(?:data\s+|rows\s+|sheet\s+|table\s+)?(?:by|on|using)\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+?)'
+                           r'(?:\s+(?P<direction>(?:in\s+)?\S+(?:\s+(?:to|first|order)(?:\s+\S+)?)?))?'),
+             self._sort_values),
+            (self._pattern(r'(?:trim|strip)(?:\s+(?:the\s+)?(?:extra\s+)?(?:leading\s+and\s+trailing\s+)?(?:white\s*space|spaces))?'
+                           r'(?:\s+(?:from|in|of|on)\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+?))?'),
+             self._trim_whitespace),
+            (self._pattern(rf'{_REMOVE}\s+(?:the\s+)?(?:extra\s+)?(?:leading\s+and\s+trailing\s+)?(?:white\s*space|spaces)'
+                           r'(?:\s+(?:from|in)\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+?))?'),
+             self._trim_whitespace),
+            (self._pattern(r'(?:trim|strip)\s+(?:the\s+)?(?:columns?\s+)?(?P<columns>.+?)(?:\s+columns?)?'),
+             self._trim_whitespace),
+            (self._pattern(r'(?P<case>upper\s*case|lower\s*case|capitali[sz]e)\s+(?:the\s+)?(?:values\s+in\s+)?(?:column\s+)?(?P<column>.+?)'),
+             self._change_case),
+            (self._pattern(r'(?:make|convert|change|turn|set)\s+(?:the\s+)?(?:values\s+in\s+)?(?:column\s+)?(?P<column>.+?)\s+(?:to\s+|in\s+|into\s+)?'
+                           r'(?P<case>upper\s*case|lower\s*case|capitali[sz]ed)'),
+             self._change_case),
+            (self._pattern(r'round\s+(?:the\s+)?(?:values\s+in\s+|numbers\s+in\s+)?(?:column\s+)?(?P<column>.+?)'
+                           r'(?:\s+to\s+(?:(?P<decimals>\d+)\s+(?:decimal\s+places?|decimals?|places?|digits?|dp)|(?P<whole>whole numbers|integers)))?'),
+             self._round_numbers),
+            (self._pattern(r'(?:convert|change|cast)\s+(?:the\s+)?(?:type\s+of\s+)?(?:column\s+)?(?P<column>.+?)\s+(?:to|into)\s+(?:an?\s+)?(?P<type>[a-z ]+?)(?:\s+type)?'),
+             self._change_type),
+            (self._pattern(r'(?:format|reformat)\s+(?:the\s+)?(?:dates\s+in\s+)?(?:column\s+)?(?P<column>.+?)(?:\s+column)?\s+(?:as|to|like|in)\s+(?P<format>.+)'),
+             self._format_date),
+            (self._pattern(rf'(?P<verb>keep|show|filter(?:\s+to)?|{_REMOVE})\s+(?:only\s+)?(?:the\s+)?(?:rows|records)\s+(?:where|with|whose|in which)\s+'
+                           rf'(?P<column>.+?)\s+(?:is\s+|are\s+)?(?:{_COMPARISON})\s+(?P<value>.+)'),
+             self._filter_rows),
+            (self._pattern(rf'{_REMOVE}\s+(?:the\s+)?(?:column\s+(?P<named>.+)|(?P<column>.+?)(?:\s+column)?)'),
+             self._remove_column),
+            (self._pattern(r'replace\s+(?P<old>.+?)\s+with\s+(?P<new>.+?)(?:\s+in\s+(?:the\s+)?(?:column\s+)?(?P<column>.+))?'),
+             self._replace_value),
+        ]
+
+    def parse(self, user_message: str, column_names: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Parse a message without the model.
+
+        Args:
+            user_message: The user's message
+            column_names: Columns of the sheet; without them only commands
+                that don't name a column are recognized
+
+        Returns:
+            The same result as AIExcelService.parse_user_request for a valid
+            plan, or None when the message should go to the model
+        """
+        steps = self._parse_message(user_message, column_names or [])
+        if steps is not None:
+            is_valid, _ = ExcelOperationValidator.validate_plan(steps)
+            if not is_valid:
+                steps = None
+
+        with self._lock:
+            if steps is None:
+                self.fallbacks += 1
+            else:
+                self.parsed += 1
+
+        if steps is None:
+            return None
+        return {
+            'type': 'operation',
+            'operations': steps,
+            'explanation': ' Then '.join(self._explain(step) for step in steps)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Get how many messages were answered without the model"""
+        with self._lock:
+            total = self.parsed + self.fallbacks
+            return {
+                'parsed': self.parsed,
+                'fallbacks': self.fallbacks,
+                'parse_rate': round(self.parsed / total, 4) if total else 0.0
+            }
+
+    def resolve_column(self, reference: str, column_names: List[str]) -> Optional[str]:
+        """
+        Find the one column a reference means.
+
+        Tried in order: exact name, case-insensitive, and ignoring spaces and
+        punctuation. None if nothing or more than one column matches.
+        """
+        reference = reference.strip().strip(_QUOTES).strip()
+        if not reference:
+            return None
+        candidates = [reference]
+        stripped = re.sub(r'^(?:the\s+)?(?:column\s+)?|\s+column$', '', reference, flags=re.I).strip(_QUOTES).strip()
+        if stripped and stripped != reference:
+            candidates.append(stripped)
+
+        for key in (lambda name: name, str.casefold, lambda name: re.sub(r'[\W_]+', '', name.casefold())):
+            for candidate in candidates:
+                matches = [name for name in column_names if key(str(name)) == key(candidate)]
+                if len(matches) == 1:
+                    return matches[0]
+                if len(matches) > 1:
+                    return None
+        return None
+
+    def _resolve_columns(self, reference: str, column_names: List[str]) -> Optional[List[str]]:
+        """Resolve "A", "A and B" or "A, B and C"; None unless every one resolves"""
+        column = self.resolve_column(reference, column_names)
+        if column is not None:
+            return [column]
+        parts = [part for part in _COLUMN_LIST_SEPARATORS.split(reference) if part]
+        if len(parts) < 2:
+            return None
+        columns = [self.resolve_column(part, column_names) for part in parts]
+        if any(column is None for column in columns):
+            return None
+        return columns
+
+    def _parse_message(self, user_message: str, column_names: List[str]) -> Optional[List[Dict[str, Any]]]:
+        text = self._normalize(user_message)
+        if not text:
+            return None
+
+        steps = []
+        for part in _STRONG_SEPARATORS.split(text):
+            part = self._normalize(part)
+            if not part:
+                continue
+            # Several commands joined by "and" or commas. Tried first, as a
+            # trailing value like "rename A to B and sort by C" swallows them.
+            sub_steps = [self._parse_command(self._normalize(sub_part), column_names) for sub_part in _WEAK_SEPARATORS.split(part)]
+            if len(sub_steps) > 1 and all(sub_step is not None for sub_step in sub_steps):
+                steps.extend(sub_steps)
+                continue
+            step = self._parse_command(part, column_names)
+            if step is None:
+                return None
+            steps.append(step)
+        return steps or None
+
+    def _parse_command(self, text: str, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        for pattern, build in self._rules:
+            match = pattern.fullmatch(text)
+            if match is None:
+                continue
+            step = build(match, column_names)
+            if step is not None:
+                return step
+        return None
+
+    @staticmethod
+    def _pattern(pattern: str) -> re.Pattern:
+        return re.compile(pattern, re.I)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        text = re.sub(r'\s+', ' ', text).strip()
+        text = _TRAILING_PUNCTUATION.sub('', text)
+        text = _POLITE_PREFIX.sub('', text)
+        text = _POLITE_SUFFIX.sub('', text)
+        return _TRAILING_PUNCTUATION.sub('', text)
+
+    @staticmethod
+    def _literal(text: str) -> Any:
+        """A quoted value stays text, a bare number becomes a number"""
+        text = text.strip()
+        if len(text) >= 2 and text[0] in _QUOTES and text[-1] in _QUOTES:
+            return text[1:-1]
+        number = IntentParser._number(text)
+        return number if number is not None else text
+
+    @staticmethod
+    def _number(text: str) -> Optional[Any]:
+        text = text.strip().replace(',', '')
+        if re.fullmatch(r'[-+]?\d+', text):
+            return int(text)
+        if re.fullmatch(r'[-+]?(?:\d+\.\d*|\.\d+)', text):
+            return float(text)
+        return None
+
+    def _drop_duplicates(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        if match.group('columns') is None:
+            return {'operation': 'drop_duplicates', 'params': {}}
+        columns = self._resolve_columns(match.group('columns'), column_names)
+        if columns is None:
+            return None
+        return {'operation': 'drop_duplicates', 'params': {'columns': columns}}
+
+    def _drop_na(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        if match.group('columns') is None:
+            return {'operation': 'drop_na', 'params': {}}
+        columns = self._resolve_columns(match.group('columns'), column_names)
+        if columns is None:
+            return None
+        return {'operation': 'drop_na', 'params': {'columns': columns}}
+
+    def _fill_na(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        value_text = match.group('value').strip()
+        quoted = len(value_text) >= 2 and value_text[0] in _QUOTES and value_text[-1] in _QUOTES
+        # "with the average", "with the previous value", "with nothing" are
+        # ways of filling, not values, the model handles those
+        if not quoted and self._number(value_text) is None:
+            if ' ' in value_text or _FILL_METHODS.fullmatch(value_text):
+                return None
+        params: Dict[str, Any] = {'value': self._literal(value_text)}
+        if match.group('columns') is not None:
+            columns = self._resolve_columns(match.group('columns'), column_names)
+            if columns is None:
+                return None
+            params['columns'] = columns
+        return {'operation': 'fill_na', 'params': params}
+
+    def _rename_column(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('column'), column_names)
+        new_name = match.group('new_name').strip().strip(_QUOTES).strip()
+        if column is None or not new_name:
+            return None
+        return {'operation': 'rename_column', 'params': {'old_name': column, 'new_name': new_name}}
+
+    def _sort_values(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        reference, direction = match.group('columns'), match.group('direction')
+        ascending = True
+        if direction is not None:
+            if _DESCENDING.fullmatch(direction):
+                ascending = False
+            elif not _ASCENDING.fullmatch(direction):
+                # Not a direction, so part of the column reference
+                reference = f'{reference} {direction}'
+        columns = self._resolve_columns(reference, column_names)
+        if columns is None:
+            return None
+        return {'operation': 'sort_values', 'params': {'columns': columns, 'ascending': ascending}}
+
+    def _trim_whitespace(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        reference = match.group('columns')
+        if reference is None or re.fullmatch(r'(?:all|every|each)(?:\s+(?:the\s+)?(?:text\s+)?(?:columns|cells))?|everything', reference, re.I):
+            return {'operation': 'trim_whitespace', 'params': {}}
+        columns = self._resolve_columns(reference, column_names)
+        if columns is None:
+            return None
+        return {'operation': 'trim_whitespace', 'params': {'columns': columns}}
+
+    def _change_case(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('column'), column_names)
+        if column is None:
+            return None
+        case = re.sub(r'\s+', '', match.group('case').lower())
+        if case.startswith('upper'):
+            operation = 'upper_case'
+        elif case.startswith('lower'):
+            operation = 'lower_case'
+        else:
+            operation = 'capitalize'
+        return {'operation': operation, 'params': {'column': column}}
+
+    def _round_numbers(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('column'), column_names)
+        if column is None:
+            return None
+        if match.group('whole') is not None:
+            decimals = 0
+        elif match.group('decimals') is not None:
+            decimals = int(match.group('decimals'))
+        else:
+            decimals = 2
+        return {'operation': 'round_numbers', 'params': {'column': column, 'decimals': decimals}}
+
+    def _change_type(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('column'), column_names)
+        new_type = _TYPE_NAMES.get(re.sub(r'\s+', ' ', match.group('type').strip().lower()))
+        if column is None or new_type is None:
+            return None
+        return {'operation': 'change_type', 'params': {'column': column, 'type': new_type}}
+
+    def _format_date(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('column'), column_names)
+        date_format = self._date_format(match.group('format').strip().strip(_QUOTES).strip())
+        if column is None or date_format is None:
+            return None
+        return {'operation': 'format_date', 'params': {'column': column, 'format': date_format}}
+
+    @staticmethod
+    def _date_format(pattern: str) -> Optional[str]:
+        """Translate e.g. "DD/MM/YYYY" to "%d/%m/%Y"; strftime codes are kept"""
+        if '%' in pattern:
+            return pattern if re.fullmatch(r'(?:%[a-zA-Z]|[\s/.,:-])+', pattern) else None
+        result, position, has_token = [], 0, False
+        while position < len(pattern):
+            if pattern.startswith('MM', position) and not pattern.startswith('MMM', position):
+                result.append('%M' if _MINUTES_AFTER.search(''.join(result)) else '%m')
+                position += 2
+                has_token = True
+                continue
+            for token, code in _DATE_TOKENS:
+                if pattern.startswith(token, position):
+                    result.append(code)
+                    position += len(token)
+                    has_token = True
+                    break
+            else:
+                if pattern[position] not in ' /.,:-':
+                    return None
+                result.append(pattern[position])
+                position += 1
+        return ''.join(result) if has_token else None
+
+    def _filter_rows(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('column'), column_names)
+        if column is None:
+            return None
+        comparison = next(_COMPARISON_SYMBOLS[name] for name in _COMPARISON_SYMBOLS if match.group(name))
+        value_text = match.group('value').strip()
+        removing = re.fullmatch(_REMOVE, match.group('verb'), re.I) is not None
+
+        if comparison == 'contains':
+            if removing:
+                return None
+            search_term = value_text.strip(_QUOTES)
+            if not search_term or "'" in search_term:
+                return None
+            return {'operation': 'filter_rows', 'params': {'column': column, 'condition': f"contains '{search_term}'"}}
+
+        if comparison == '==':
+            # Equality compares text; there is no "not equal" or "is empty" condition
+            if removing or self._number(value_text) is not None:
+                return None
+            if re.match(rf"(?:not|no|{_MISSING}|none)\b", value_text, re.I):
+                return None
+            quoted = len(value_text) >= 2 and value_text[0] in _QUOTES and value_text[-1] in _QUOTES
+            if not quoted:
+                # "is before 2024-01-01", "is active or pending": not a value
+                # to compare with, the model handles those
+                if re.match(r'(?:before|after|between|in|like|not)\b', value_text, re.I):
+                    return None
+                if re.search(r'\b(?:and|or)\b', value_text, re.I):
+                    return None
+                # A bare "is" is followed by anything, only take a single word
+                if match.group('eq').lower() == 'is' and len(value_text.split()) > 1:
+                    return None
+            value = value_text.strip(_QUOTES)
+            if "'" in value:
+                return None
+            return {'operation': 'filter_rows', 'params': {'column': column, 'condition': f"== '{value}'"}}
+
+        number = self._number(value_text)
+        if number is None:
+            return None
+        if removing:
+            # Only the matching rows go; rows without a value fail the
+            # comparison, so they are kept through the "not"
+            test = Compare(Column(column), comparison, Literal(number))
+            return {'operation': 'filter_rows', 'params': {'expression': f'not ({test})'}}
+        return {'operation': 'filter_rows', 'params': {'column': column, 'condition': f'{comparison} {number}'}}
+
+    def _remove_column(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        column = self.resolve_column(match.group('named') or match.group('column'), column_names)
+        if column is None:
+            return None
+        return {'operation': 'remove_column', 'params': {'column': column}}
+
+    def _replace_value(self, match: re.Match, column_names: List[str]) -> Optional[Dict[str, Any]]:
+        old_text, new_text = match.group('old').strip(), match.group('new').strip()
+        # Multi-word values are only taken when quoted
+        for text in (old_text, new_text):
+            quoted = len(text) >= 2 and text[0] in _QUOTES and text[-1] in _QUOTES
+            if not quoted and ' ' in text:
+                return None
+        # "with nothing", "with the mean" aren't values either
+        new_quoted = len(new_text) >= 2 and new_text[0] in _QUOTES and new_text[-1] in _QUOTES
+        if not new_quoted and _FILL_METHODS.fullmatch(new_text):
+            return None
+        params: Dict[str, Any] = {'old_value': self._literal(old_text), 'new_value': self._literal(new_text)}
+        if match.group('column') is not None:
+            column = self.resolve_column(match.group('column'), column_names)
+            if column is None:
+                return None
+            params['column'] = column
+        return {'operation': 'replace_value', 'params': params}
+
+    @staticmethod
+    def _explain(step: Dict[str, Any]) -> str:
+        operation, params = step['operation'], step['params']
+        columns = ', '.join(params.get('columns') or [])
+        if operation == 'drop_duplicates':
+            return f'Remove duplicate rows (comparing {columns}).' if columns else 'Remove duplicate rows.'
+        if operation == 'drop_na':
+            return f'Remove rows with missing values in {columns}.' if columns else 'Remove rows with missing values.'
+        if operation == 'fill_na':
+            where = f' in {columns}' if columns else ''
+            return f"Fill missing values{where} with {params['value']!r}."
+        if operation == 'drop_empty_rows':
+            return 'Remove rows where every cell is empty.'
+        if operation == 'drop_empty_columns':
+            return 'Remove columns where every cell is empty.'
+        if operation == 'rename_column':
+            return f"Rename column {params['old_name']} to {params['new_name']}."
+        if operation == 'sort_values':
+            order = 'ascending' if params['ascending'] else 'descending'
+            return f'Sort rows by {columns} in {order} order.'
+        if operation == 'trim_whitespace':
+            return f'Trim leading and trailing spaces in {columns}.' if columns else 'Trim leading and trailing spaces in every text column.'
+        if operation == 'upper_case':
+            return f"Convert {params['column']} to uppercase."
+        if operation == 'lower_case':
+            return f"Convert {params['column']} to lowercase."
+        if operation == 'capitalize':
+            return f"Capitalize the values in {params['column']}."
+        if operation == 'round_numbers':
+            return f"Round {params['column']} to {params['decimals']} decimal places."
+        if operation == 'change_type':
+            return f"Convert {params['column']} to {params['type']}."
+        if operation == 'format_date':
+            return f"Format the dates in {params['column']} as {params['format']}."
+        if operation == 'filter_rows':
+            if 'expression' in params:
+                return f"Keep only rows where {params['expression']}."
+            return f"Keep only rows where {params['column']} {params['condition']}."
+        if operation == 'remove_column':
+            return f"Remove column {params['column']}."
+        if operation == 'replace_value':
+            where = f" in {params['column']}" if 'column' in params else ''
+            return f"Replace {params['old_value']!r} with {params['new_value']!r}{where}."
+        return f'Perform {operation}.'
+
+
+# Shared by every AIExcelService in this process
+intent_parser = IntentParser()
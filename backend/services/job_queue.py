@@ -0,0 +1,313 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Jobs are ended this long after they were queued, and jobs unfinished after
+# this long were lost with their worker (e.g. a restart)
+JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', '600'))
+
+# How often waiting for a session's jobs checks on them
+JOB_POLL_SECONDS = 0.05
+
+# Imported once by the fork server, every job worker is forked with them loaded
+PRELOAD_MODULES = ['pandas', 'openpyxl', 'pyarrow.parquet', 'services.excel_operations', 'database']
+
+
+def _warm_up() -> int:
+    """Runs first in every worker: imports anything the fork server couldn't preload"""
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+    import services.excel_operations  # noqa: F401
+    return os.getpid()
+
+
+def _run_until(deadline: float, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a job in a worker, ending the worker if the job passes its deadline.
+
+    SIGALRM's default action ends the process even while it is inside C
+    code, e.g. matching a regular expression, where no Python exception
+    could interrupt the job. The pool then replaces its workers.
+    """
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TimeoutError('The job was not started before its deadline')
+    if not hasattr(signal, 'setitimer'):
+        return fn(*args)
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+@dataclass
+class _Job:
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    on_done: Callable[[Any, Optional[BaseException]], None]
+    finished: Future
+    deadline: float
+    ready: Optional[Callable[[], bool]] = None
+    pool: Optional[ProcessPoolExecutor] = field(default=None, repr=False)
+
+
+class JobQueue:
+    """
+    Runs CPU-bound jobs on a pool of worker processes.
+
+    Workers are forked from a server process that imported pandas, openpyxl
+    and the sheet operations once, and all of them are started with the pool,
+    so a job starts without paying for imports or process startup. The pool
+    is created lazily (or by ``start()``), so each gunicorn worker gets its
+    own, and replaced if a worker process dies.
+
+    Jobs are handed to the pool by a dispatcher thread of the calling
+    process, at most one per worker, and only once their ``ready`` check
+    passes, e.g. once the earlier jobs of their session have finished
+    (whichever process runs those). Waiting never holds a worker, so jobs
+    queued in several processes can't wait on each other. A job still
+    running at its deadline ends its worker; as the pool is then replaced,
+    the other jobs it was running fail as interrupted.
+
+    ``submit`` hands the job's outcome to a callback on a thread of the
+    calling process, which records it; the returned future completes once
+    the callback has run.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._waiting: List[_Job] = []
+        self._running = 0
+        self._dispatcher: Optional[threading.Thread] = None
+        # Outcomes are recorded one at a time, off the pool's management thread
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-done')
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Fork the workers now rather than on the first job"""
+        with self._lock:
+            self._get_pool()
+            self._start_dispatcher()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Callable[[Any, Optional[BaseException]], None],
+        ready: Optional[Callable[[], bool]] = None,
+        deadline: Optional[float] = None
+    ) -> Future:
+        """
+        Run ``fn(*args)`` on a worker process.
+
+        ``fn`` and its arguments must be picklable. ``on_done(result, error)``
+        is called in this process when the job finished or failed.
+
+        Args:
+            ready: Checked in this process until it returns True before the
+                job is handed to a worker (jobs wait in submission order)
+            deadline: time.time() by which the job is ended (by default
+                JOB_TIMEOUT_SECONDS from now)
+        """
+        if deadline is None:
+            deadline = time.time() + JOB_TIMEOUT_SECONDS
+        job = _Job(fn, args, on_done, Future(), deadline, ready)
+        with self._lock:
+            self.submitted += 1
+            self._waiting.append(job)
+            self._start_dispatcher()
+            self._wake.notify()
+        return job.finished
+
+    def stats(self) -> Dict[str, Any]:
+        """Get job counters of this process"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'started': self._pool is not None,
+                'submitted': self.submitted,
+                'pending': self.submitted - self.succeeded - self.failed,
+                'waiting': len(self._waiting),
+                'succeeded': self.succeeded,
+                'failed': self.failed
+            }
+
+    def _start_dispatcher(self) -> None:
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatch', daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self) -> None:
+        """Hand waiting jobs that are ready to free workers, in submission order"""
+        while True:
+            with self._lock:
+                while not self._waiting or self._running >= self.max_workers:
+                    self._wake.wait()
+                waiting = list(self._waiting)
+
+            # Checked without the lock, they may query the database
+            ready = [job for job in waiting if self._is_ready(job)]
+
+            with self._lock:
+                for job in ready[:self.max_workers - self._running]:
+                    self._waiting.remove(job)
+                    self._start(job)
+                if self._waiting and self._running < self.max_workers:
+                    self._wake.wait(JOB_POLL_SECONDS)
+
+    @staticmethod
+    def _is_ready(job: _Job) -> bool:
+        if job.ready is None or time.time() >= job.deadline:
+            return True
+        try:
+            return job.ready()
+        except Exception as e:
+            logger.error(f'Error checking whether a job can start: {str(e)}', exc_info=True)
+            return False
+
+    def _start(self, job: _Job) -> None:
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_run_until, job.deadline, job.fn, *job.args)
+        except BrokenProcessPool:
+            self._discard(pool)
+            pool = self._get_pool()
+            future = pool.submit(_run_until, job.deadline, job.fn, *job.args)
+        job.pool = pool
+        self._running += 1
+        future.add_done_callback(lambda done: self._callbacks.submit(self._finish, job, done))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self._context(),
+                initializer=_warm_up
+            )
+            # Processes are otherwise only started once every worker is busy
+            for _ in range(self.max_workers):
+                self._pool.submit(_warm_up)
+        return self._pool
+
+    @staticmethod
+    def _context() -> multiprocessing.context.BaseContext:
+        # Forking the web worker itself would copy its threads' locks mid-use
+        if 'forkserver' not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('spawn')
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        return context
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        # Jobs of a broken pool fail all at once, only the first one replaces it
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False)
+
+    def _finish(self, job: _Job, future: Future) -> None:
+        error = future.exception()
+        broken = isinstance(error, BrokenProcessPool)
+        if broken:
+            if time.time() >= job.deadline:
+                error = TimeoutError(f'The job took longer than {JOB_TIMEOUT_SECONDS} seconds and was stopped')
+            else:
+                error = RuntimeError('The job was interrupted, please try again')
+        with self._lock:
+            self._running -= 1
+            if broken and self._pool is job.pool:
+                logger.error('A job worker process ended, restarting the pool')
+                self._discard(job.pool)
+            if error is None:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self._wake.notify()
+        try:
+            job.on_done(None if error is not None else future.result(), error)
+        except Exception as e:
+            logger.error(f'Error recording job outcome: {str(e)}', exc_info=True)
+        finally:
+            job.finished.set_result(None)
+
+
+def wait_for_session_jobs(db, session_id: str, created_before: Optional[datetime] = None) -> None:
+    """
+    Wait until a session has no unfinished job (queued before ``created_before``).
+
+    A chat message whose preview was answered early keeps applying its
+    operations to the rest of the sheet in a job; anything that reads or
+    changes the whole sheet waits for it first. Jobs older than
+    JOB_TIMEOUT_SECONDS were lost and are not waited for.
+    """
+    from repositories.ai_job_repository import AIJobRepository
+
+    job_repo = AIJobRepository(db)
+    while job_repo.has_unfinished(session_id, created_before, JOB_TIMEOUT_SECONDS):
+        # End the read transaction, so the next check sees the job finish
+        db.commit()
+        time.sleep(JOB_POLL_SECONDS)
+    db.commit()
+
+
+def session_jobs_finished(session_id: str, created_before: datetime) -> bool:
+    """
+    Whether a session has no unfinished job queued before ``created_before``.
+
+    The ``ready`` check of a chat message's job, run by the dispatcher of
+    the process that queued it. Jobs older than JOB_TIMEOUT_SECONDS were
+    lost and are not waited for.
+    """
+    from database import get_db_session
+    from repositories.ai_job_repository import AIJobRepository
+
+    db = get_db_session()
+    try:
+        return not AIJobRepository(db).has_unfinished(session_id, created_before, JOB_TIMEOUT_SECONDS)
+    finally:
+        db.close()
+
+
+def run_plan_job(job_id: str, file_path: str, sheet_name: str, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Execute a chat message's plan in a job worker.
+
+    The job is only dispatched once the session's earlier jobs finished
+    (see session_jobs_finished), so plans are applied in the order they were
+    sent. Marks the job running and runs the plan while holding the
+    session's file lock, so two jobs of one session never overwrite each
+    other.
+    """
+    from database import get_db_session
+    from repositories.ai_job_repository import AIJobRepository
+    from services.excel_operations import run_plan
+    from services.file_lock import file_lock
+
+    db = get_db_session()
+    try:
+        AIJobRepository(db).mark_running(job_id)
+    finally:
+        db.close()
+
+    with file_lock(file_path + '.job.lock'):
+        return run_plan(file_path, sheet_name, steps)
+
+
+# Shared by every request of this process
+job_queue = JobQueue(max_workers=int(os.environ.get('JOB_WORKERS', '2')))
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Punctuation and spacing that don't change what a message asks for
+_TRAILING_PUNCTUATION = re.compile(r'[\s.!?]+$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of validated model responses.
+
+    Entries are keyed by a hash of the normalized user message, the
+    conversation window sent to the model, the sheet's column names and types
+    and the prompt version, so "Remove duplicates." asked about the same
+    columns is only sent to the model once. Only responses that passed
+    ExcelOperationValidator should be stored.
+
+    Backed by SQLite so every worker process shares the entries. Entries
+    expire after ``ttl_seconds``, and the least recently used ones are evicted
+    once there are more than ``max_entries``.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def normalize_message(message: str) -> str:
+        """
+        Collapse whitespace and trailing punctuation of a message.
+
+        Case is kept: values the user typed ("replace 'yes' with 'YES'") are
+        part of the plan.
+        """
+        return _TRAILING_PUNCTUATION.sub('', _WHITESPACE.sub(' ', message.strip()))
+
+    @classmethod
+    def make_key(
+        cls,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        columns: List[Dict[str, Any]],
+        prompt_version: str
+    ) -> str:
+        """
+        Hash everything the model's answer depends on.
+
+        Args:
+            user_message: The user's message
+            conversation_history: The messages sent to the model along with it
+            columns: [{"name", "type"}] of the sheet's columns, in order
+            prompt_version: Identifies the model and system prompt
+        """
+        payload = json.dumps({
+            'message': cls.normalize_message(user_message),
+            'history': [[msg['role'], cls.normalize_message(msg['content'])] for msg in conversation_history],
+            'columns': columns,
+            'prompt': prompt_version
+        }, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a stored response, or None if there is none or it expired"""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT response FROM responses WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute('UPDATE responses SET last_used_at = ? WHERE key = ?', (now, key))
+            connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a validated response, evicting expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO responses (key, response, created_at, last_used_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(response), now, now, now + self.ttl_seconds)
+            )
+            connection.execute('DELETE FROM responses WHERE expires_at <= ?', (now,))
+            connection.execute(
+                'DELETE FROM responses WHERE key IN ('
+                'SELECT key FROM responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            connection.commit()
+            self.stores += 1
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            connection = self._connect()
+            connection.execute('DELETE FROM responses')
+            connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters; hits and misses are counted per process"""
+        with self._lock:
+            entries = self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily, so each forked worker gets its own connection
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, '
+                'last_used_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_responses_last_used_at ON responses (last_used_at)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+
+# Shared by every AIExcelService in this process
+llm_response_cache = LLMResponseCache(
+    path=os.environ.get('LLM_CACHE_PATH', 'llm_cache.db'),
+    ttl_seconds=int(os.environ.get('LLM_CACHE_TTL_HOURS', '24')) * 3600,
+    max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '10000'))
+)
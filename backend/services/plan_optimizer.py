@@ -0,0 +1,333 @@
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from services.filter_expression import FilterExpression, FilterExpressionError, conjunction
+
+# Operations that change a column cell by cell
+TEXT_TRANSFORMS = {
+    'trim_whitespace': 'strip',
+    'upper_case': 'upper',
+    'lower_case': 'lower',
+    'capitalize': 'capitalize',
+}
+
+# Kinds of operations, by how they interact with rows and columns
+ROW_FILTER = 'row_filter'        # keeps a subset of rows, deciding each row on its own
+DEDUPE = 'dedupe'                # keeps a subset of rows, depending on the other rows
+SORT = 'sort'                    # reorders rows
+ROW_LOCAL = 'row_local'          # rewrites cells, each value on its own
+COLUMN_VALUE = 'column_value'    # rewrites cells, dtype may depend on the whole column
+COLUMN_FILTER = 'column_filter'  # drops columns depending on their values
+SCHEMA = 'schema'                # drops or renames a named column
+BARRIER = 'barrier'              # unknown, never reordered
+
+COLUMNWISE_KINDS = (ROW_LOCAL, COLUMN_VALUE, COLUMN_FILTER)
+
+
+@dataclass(frozen=True)
+class StepEffects:
+    """Columns a step reads and writes (None means every column) and its kind"""
+    kind: str
+    reads: Optional[FrozenSet[str]] = frozenset()
+    writes: Optional[FrozenSet[str]] = frozenset()
+
+
+class PlanOptimizer:
+    """
+    Rewrites an operation plan into an equivalent, cheaper one.
+
+    Rewrites are driven by which columns each operation reads and writes and
+    whether it filters, reorders or rewrites rows:
+
+    - row filters (filter_rows, drop_na, drop_empty_rows) run before sorts,
+      deduplication and cell transforms, so those see fewer rows
+    - remove_column runs before the steps that don't depend on the column,
+      and cell transforms of a column that is removed later are dropped
+    - consecutive row filters are combined into a single filter_rows step,
+      when every column they name exists at that point of the plan (a
+      filter on a missing column does nothing, a combined one would drop
+      the filters it was combined with)
+    - consecutive text transforms of one column are fused into a single pass
+
+    Only steps that commute are reordered, so the result is the same as
+    running the original plan.
+    """
+
+    @classmethod
+    def optimize(
+        cls,
+        steps: List[Dict[str, Any]],
+        columns: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Optimize a validated plan.
+
+        Args:
+            steps: The plan
+            columns: Columns of the sheet the plan runs on; without them
+                filters are combined as if every column they name exists
+
+        Returns:
+            tuple: (optimized steps, descriptions of the rewrites applied)
+        """
+        plan = [{'operation': step['operation'], 'params': dict(step.get('params', {}))} for step in steps]
+        rewrites: List[str] = []
+
+        plan = cls._push_down_row_filters(plan, rewrites)
+        plan = cls._fuse_row_filters(plan, rewrites, columns)
+        plan = cls._push_down_column_removals(plan, rewrites)
+        plan = cls._fuse_text_transforms(plan, rewrites)
+
+        return plan, rewrites
+
+    @classmethod
+    def explain(cls, steps: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Get the original and the optimized plan, with the rewrites in between"""
+        optimized, rewrites = cls.optimize(steps, columns)
+        return {
+            'original': steps,
+            'optimized': optimized,
+            'rewrites': rewrites
+        }
+
+    @classmethod
+    def explain_text(cls, steps: List[Dict[str, Any]]) -> str:
+        """Human readable version of explain()"""
+        explanation = cls.explain(steps)
+        lines = ['Original plan:']
+        lines += [f'  {i}. {cls._describe(step)}' for i, step in enumerate(explanation['original'], start=1)]
+        lines.append('Optimized plan:')
+        lines += [f'  {i}. {cls._describe(step)}' for i, step in enumerate(explanation['optimized'], start=1)]
+        lines.append('Rewrites:')
+        lines += [f'  - {rewrite}' for rewrite in explanation['rewrites']] or ['  (none)']
+        return '\n'.join(lines)
+
+    @classmethod
+    def effects(cls, step: Dict[str, Any]) -> StepEffects:
+        """Get the columns a step reads and writes and how it treats rows"""
+        operation = step['operation']
+        params = step.get('params', {})
+
+        if operation == 'filter_rows':
+            try:
+                return StepEffects(ROW_FILTER, reads=FilterExpression.from_params(params).columns)
+            except FilterExpressionError:
+                return StepEffects(ROW_FILTER, reads=None)
+        if operation == 'drop_na':
+            return StepEffects(ROW_FILTER, reads=cls._columns(params.get('columns')))
+        if operation == 'drop_empty_rows':
+            return StepEffects(ROW_FILTER, reads=None)
+        if operation == 'drop_duplicates':
+            return StepEffects(DEDUPE, reads=cls._columns(params.get('columns')))
+        if operation == 'sort_values':
+            return StepEffects(SORT, reads=cls._columns(params['columns']))
+        if operation in ('upper_case', 'lower_case', 'capitalize'):
+            columns = cls._columns(params.get('columns') or params['column'])
+            return StepEffects(ROW_LOCAL, reads=columns, writes=columns)
+        if operation in ('round_numbers', 'transform_text'):
+            columns = frozenset([params['column']])
+            return StepEffects(ROW_LOCAL, reads=columns, writes=columns)
+        if operation == 'trim_whitespace':
+            columns = cls._columns(params.get('columns'))
+            return StepEffects(ROW_LOCAL, reads=columns, writes=columns)
+        if operation in ('fill_na', 'replace_value', 'change_type', 'format_date'):
+            key = 'columns' if operation == 'fill_na' else 'column'
+            columns = cls._columns(params.get(key))
+            return StepEffects(COLUMN_VALUE, reads=columns, writes=columns)
+        if operation == 'drop_empty_columns':
+            return StepEffects(COLUMN_FILTER, reads=None, writes=None)
+        if operation == 'remove_column':
+            return StepEffects(SCHEMA, writes=frozenset([params['column']]))
+        if operation == 'rename_column':
+            return StepEffects(SCHEMA, writes=frozenset([params['old_name'], params['new_name']]))
+        return StepEffects(BARRIER, reads=None, writes=None)
+
+    @classmethod
+    def can_move_before(cls, step: Dict[str, Any], previous: Dict[str, Any]) -> bool:
+        """Whether running ``step`` before ``previous`` gives the same result"""
+        effects, previous_effects = cls.effects(step), cls.effects(previous)
+        if BARRIER in (effects.kind, previous_effects.kind):
+            return False
+
+        if effects.kind == ROW_FILTER:
+            if previous_effects.kind == SORT:
+                # Sorting is stable, so filtered rows keep their relative order
+                return True
+            if previous_effects.kind == DEDUPE:
+                # Duplicates must get the same filter result, i.e. the filter
+                # may only look at the compared columns
+                if previous_effects.reads is None:
+                    return True
+                return effects.reads is not None and effects.reads <= previous_effects.reads
+            if previous_effects.kind in (ROW_FILTER, ROW_LOCAL, SCHEMA):
+                return not _overlap(effects.reads, previous_effects.writes)
+            # Column dtypes and empty columns depend on which rows are present
+            return False
+
+        if step['operation'] == 'remove_column':
+            if previous_effects.kind in COLUMNWISE_KINDS:
+                # Steps working column by column just have one column less to do
+                return not _overlap(effects.writes, previous_effects.writes) or previous_effects.writes is None
+            if previous_effects.kind in (ROW_FILTER, DEDUPE, SORT):
+                return not _overlap(effects.writes, previous_effects.reads)
+            return False
+
+        if effects.kind == ROW_LOCAL:
+            return not (
+                _overlap(effects.writes, previous_effects.reads)
+                or _overlap(effects.writes, previous_effects.writes)
+                or _overlap(effects.reads, previous_effects.writes)
+            )
+
+        return False
+
+    @classmethod
+    def _push_down_column_removals(cls, plan: List[Dict[str, Any]], rewrites: List[str]) -> List[Dict[str, Any]]:
+        for step in [step for step in plan if step['operation'] == 'remove_column']:
+            column = step['params']['column']
+            position = _index_of(plan, step)
+            while position > 0:
+                previous = plan[position - 1]
+                previous_effects = cls.effects(previous)
+                if previous_effects.kind in (ROW_LOCAL, COLUMN_VALUE) and previous_effects.writes == frozenset([column]):
+                    # Work on a column that is removed afterwards is wasted
+                    del plan[position - 1]
+                    position -= 1
+                    rewrites.append(f"Dropped {previous['operation']} on {column}, the column is removed later")
+                    continue
+                if not cls.can_move_before(step, previous):
+                    break
+                plan[position - 1], plan[position] = step, previous
+                position -= 1
+                rewrites.append(f"Moved remove_column {column} ahead of {previous['operation']}")
+        return plan
+
+    @classmethod
+    def _push_down_row_filters(cls, plan: List[Dict[str, Any]], rewrites: List[str]) -> List[Dict[str, Any]]:
+        for step in [step for step in plan if cls.effects(step).kind == ROW_FILTER]:
+            position = _index_of(plan, step)
+            while position > 0:
+                previous = plan[position - 1]
+                # Filters keep their relative order
+                if cls.effects(previous).kind == ROW_FILTER or not cls.can_move_before(step, previous):
+                    break
+                plan[position - 1], plan[position] = step, previous
+                position -= 1
+                rewrites.append(f"Moved {step['operation']} ahead of {previous['operation']}")
+        return plan
+
+    @classmethod
+    def _fuse_row_filters(
+        cls,
+        plan: List[Dict[str, Any]],
+        rewrites: List[str],
+        columns: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        fused: List[Dict[str, Any]] = []
+        # Columns known to exist before each step (None: not checked)
+        present = None if columns is None else frozenset(str(col) for col in columns)
+        for step in plan:
+            fusable = (
+                step['operation'] == 'filter_rows' and fused and fused[-1]['operation'] == 'filter_rows'
+                and cls._filter_applies(fused[-1], present) and cls._filter_applies(step, present)
+            )
+            present = cls._columns_after(step, present)
+            if fusable:
+                # Consecutive filters keep the rows all of them keep, in one mask
+                fused[-1] = {
+                    'operation': 'filter_rows',
+                    'params': {'expression': conjunction([fused[-1]['params'], step['params']])}
+                }
+                rewrites.append('Combined consecutive filter_rows into a single pass')
+                continue
+            fused.append(step)
+        return fused
+
+    @staticmethod
+    def _filter_applies(step: Dict[str, Any], present: Optional[FrozenSet[str]]) -> bool:
+        """Whether a filter_rows step parses and names only columns that exist"""
+        try:
+            columns = FilterExpression.from_params(step['params']).columns
+        except FilterExpressionError:
+            return False
+        return present is None or columns <= present
+
+    @staticmethod
+    def _columns_after(step: Dict[str, Any], present: Optional[FrozenSet[str]]) -> Optional[FrozenSet[str]]:
+        """Columns known to exist after a step"""
+        if present is None:
+            return None
+        operation, params = step['operation'], step.get('params', {})
+        if operation == 'remove_column':
+            return present - {str(params['column'])}
+        if operation == 'rename_column' and str(params['old_name']) in present:
+            return (present - {str(params['old_name'])}) | {str(params['new_name'])}
+        if operation == 'drop_empty_columns':
+            # Which ones remain depends on the values
+            return frozenset()
+        return present
+
+    @classmethod
+    def _fuse_text_transforms(cls, plan: List[Dict[str, Any]], rewrites: List[str]) -> List[Dict[str, Any]]:
+        fused: List[Dict[str, Any]] = []
+        for step in plan:
+            transform = cls._text_transform(step)
+            merged = False
+            if transform is not None:
+                column, functions = transform
+                # Look back for an earlier transform of the column this one can join
+                for position in range(len(fused) - 1, -1, -1):
+                    earlier = cls._text_transform(fused[position])
+                    if earlier is not None and earlier[0] == column:
+                        fused[position] = {
+                            'operation': 'transform_text',
+                            'params': {'column': column, 'functions': earlier[1] + functions}
+                        }
+                        rewrites.append(f"Fused {step['operation']} on {column} into a single text pass")
+                        merged = True
+                        break
+                    if not cls.can_move_before(step, fused[position]):
+                        break
+            if not merged:
+                fused.append(step)
+        return fused
+
+    @staticmethod
+    def _text_transform(step: Dict[str, Any]) -> Optional[Tuple[str, List[str]]]:
+        """Get (column, string functions) of a single-column text transform"""
+        operation, params = step['operation'], step.get('params', {})
+        if operation == 'transform_text':
+            return params['column'], list(params['functions'])
+        if operation in TEXT_TRANSFORMS:
+            columns = params.get('columns')
+            if isinstance(columns, list) and len(columns) == 1:
+                return columns[0], [TEXT_TRANSFORMS[operation]]
+            if operation != 'trim_whitespace' and not columns:
+                return params['column'], [TEXT_TRANSFORMS[operation]]
+        return None
+
+    @staticmethod
+    def _columns(columns: Any) -> Optional[FrozenSet[str]]:
+        if not columns:
+            return None
+        if isinstance(columns, str):
+            return frozenset([columns])
+        return frozenset(columns)
+
+    @staticmethod
+    def _describe(step: Dict[str, Any]) -> str:
+        params = ', '.join(f'{key}={value!r}' for key, value in step.get('params', {}).items())
+        return f"{step['operation']}({params})"
+
+
+def _overlap(columns: Optional[FrozenSet[str]], other: Optional[FrozenSet[str]]) -> bool:
+    """Whether two column sets share a column, None standing for every column"""
+    if columns is None:
+        return other is None or bool(other)
+    if other is None:
+        return bool(columns)
+    return bool(columns & other)
+
+
+def _index_of(plan: List[Dict[str, Any]], step: Dict[str, Any]) -> int:
+    return next(i for i, candidate in enumerate(plan) if candidate is step)
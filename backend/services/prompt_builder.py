@@ -0,0 +1,362 @@
+import json
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from services.filter_expression import FilterExpression, FilterExpressionError
+
+# Most prompt tokens per request, system prompt included
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '1500'))
+
+# Tokens the chat format adds per message, and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+# Most tokens kept of a single earlier message written as prose
+MAX_USER_TURN_TOKENS = 80
+MAX_ASSISTANT_TURN_TOKENS = 40
+
+# Used until the tokenizer is loaded, or when it can't be (its file is downloaded once)
+CHARS_PER_TOKEN = 4
+
+_encoding_lock = threading.Lock()
+_encoding: Any = None
+_encoding_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the model's tokenizer, or estimate them from the length"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def load_encoding() -> Any:
+    """
+    Load the model's tokenizer, None if it can't be loaded.
+
+    The first load may download its file, so this runs at startup (see
+    start_loading_encoding) rather than inside a request.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception:
+                _encoding = None
+            _encoding_loaded = True
+        return _encoding
+
+
+def start_loading_encoding() -> None:
+    """Load the tokenizer on a background thread, tokens are estimated meanwhile"""
+    threading.Thread(target=load_encoding, name='load-tokenizer', daemon=True).start()
+
+
+def _get_encoding() -> Any:
+    # Never waits for the tokenizer: None until it was loaded
+    return _encoding if _encoding_loaded else None
+
+
+@dataclass
+class PromptSize:
+    """Where the tokens of a prompt went, logged per call"""
+    total: int = 0
+    system: int = 0
+    sheet: int = 0
+    history: int = 0
+    message: int = 0
+    columns_listed: int = 0
+    columns_total: int = 0
+    turns_included: int = 0
+    turns_summarized: int = 0
+    budget: int = 0
+    exact: bool = True
+
+    def describe(self) -> str:
+        method = 'tiktoken' if self.exact else 'estimated'
+        return (
+            f'{self.total}/{self.budget} tokens ({method}): system {self.system}, sheet {self.sheet}, '
+            f'history {self.history}, message {self.message}; '
+            f'{self.columns_listed}/{self.columns_total} columns listed, '
+            f'{self.turns_included} turns included, {self.turns_summarized} summarized'
+        )
+
+
+class PromptBuilder:
+    """
+    Builds the messages of parse_user_request within a token budget.
+
+    The system prompt and the user's message are always sent. The rest of
+    the budget goes, in this order, to:
+
+    - columns the message names, with their detected types
+    - earlier turns, newest first; the assistant's turns as compact operation
+      records (from the message metadata) rather than their prose, and turns
+      that don't fit folded into a one-line summary
+    - the remaining columns, most relevant to the message first, with a
+      count of the ones left out
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        budget: int = PROMPT_TOKEN_BUDGET,
+        history_window: int = 5,
+        counter: Callable[[str], int] = count_tokens
+    ):
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.history_window = history_window
+        self.count = counter
+
+    def build(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, Any]],
+        sheet_info: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[BaseMessage], PromptSize]:
+        """
+        Build the messages for the model.
+
+        Returns:
+            tuple: (messages, size of the prompt)
+        """
+        size = PromptSize(budget=self.budget, exact=_get_encoding() is not None)
+        size.system = self._message_tokens(self.system_prompt)
+        size.message = self._message_tokens(user_message)
+        remaining = self.budget - size.system - size.message - REPLY_OVERHEAD_TOKENS
+
+        history = list(conversation_history[-(self.history_window + 1):])
+        # The controller stores the message before asking, it is sent once below
+        if history and history[-1].get('role') == 'user' and history[-1].get('content') == user_message:
+            history.pop()
+        history = history[-self.history_window:]
+
+        columns = self._columns(sheet_info)
+        ranked = self._rank_columns(columns, user_message, history)
+        profiles = dict(columns)
+        sheet_header = self._sheet_header(sheet_info, len(columns))
+
+        # Columns the message names come first, they matter most for the answer
+        listed = [column for column, score in ranked if score >= 3]
+        column_tokens = {column: self.count(self._describe_column(column, profiles[column]) + ', ') for column, _ in ranked}
+        sheet_tokens = 0
+        if sheet_info:
+            sheet_tokens = self._message_tokens(self._sheet_context(sheet_header, [], columns))
+            sheet_tokens += sum(column_tokens[column] for column in listed)
+        remaining -= sheet_tokens
+
+        # Earlier turns, newest first, while they fit in half of what's left
+        history_messages, included, summarized, history_tokens = self._history(history, max(remaining // 2, 0))
+        remaining -= history_tokens
+
+        # Fill up with the other columns, most relevant first
+        for column, _ in ranked:
+            if column in listed:
+                continue
+            if column_tokens[column] > remaining:
+                break
+            listed.append(column)
+            remaining -= column_tokens[column]
+
+        messages: List[BaseMessage] = [SystemMessage(content=self.system_prompt)]
+        if sheet_info:
+            messages.append(SystemMessage(content=self._sheet_context(sheet_header, listed, columns)))
+        messages.extend(history_messages)
+        messages.append(HumanMessage(content=user_message))
+
+        # Measured on what is actually sent
+        size.sheet = self._message_tokens(messages[1].content) if sheet_info else 0
+        size.history = history_tokens
+        size.columns_listed = len(listed)
+        size.columns_total = len(columns)
+        size.turns_included = included
+        size.turns_summarized = summarized
+        size.total = size.system + size.sheet + size.history + size.message + REPLY_OVERHEAD_TOKENS
+        return messages, size
+
+    def _message_tokens(self, content: str) -> int:
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+    @staticmethod
+    def _columns(sheet_info: Optional[Dict[str, Any]]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        if not sheet_info or not isinstance(sheet_info.get('column_names'), list):
+            return []
+        profiles = sheet_info.get('column_profiles') or {}
+        return [(str(name), profiles.get(name)) for name in sheet_info['column_names']]
+
+    @staticmethod
+    def _sheet_header(sheet_info: Optional[Dict[str, Any]], n_columns: int) -> str:
+        if not sheet_info:
+            return ''
+        return (
+            f"\n\nCurrent sheet information:\n"
+            f"Number of rows: {sheet_info.get('rows', 0)}\n"
+            f"Number of columns: {n_columns or sheet_info.get('columns', 0)}\n"
+        )
+
+    def _sheet_context(self, header: str, listed: List[str], columns: List[Tuple[str, Any]]) -> str:
+        if not columns:
+            return header
+        profiles = dict(columns)
+        # Listed in sheet order, whatever order they were picked in
+        picked = set(listed)
+        described = [self._describe_column(name, profiles[name]) for name, _ in columns if name in picked]
+        context = header + f"Columns: {', '.join(described)}\n"
+        if len(listed) < len(columns):
+            context += f"({len(columns) - len(listed)} more columns not listed)\n"
+        return context
+
+    @staticmethod
+    def _describe_column(name: str, profile: Optional[Dict[str, Any]]) -> str:
+        """Column name with its detected type, e.g. "Amount (number, 90% of values)" """
+        if not profile or profile['type'] == 'unknown':
+            return name
+        if profile['confidence'] < 1:
+            return f"{name} ({profile['type']}, {profile['confidence']:.0%} of values)"
+        return f"{name} ({profile['type']})"
+
+    @staticmethod
+    def _rank_columns(
+        columns: List[Tuple[str, Any]],
+        user_message: str,
+        history: List[Dict[str, Any]]
+    ) -> List[Tuple[str, float]]:
+        """
+        Score columns by relevance to the request, best first.
+
+        3 when the message names the column, 1-2 when it shares words with
+        the name, 1 when a recent operation used it, else 0. Words found in
+        most column names (e.g. "column") don't count. Ties keep sheet order.
+        """
+        message = user_message.casefold()
+        compact_message = re.sub(r'[\W_]+', '', message)
+        message_words = set(re.findall(r'[^\W_]+', message))
+
+        column_words = [set(re.findall(r'[^\W_]+', name.casefold())) for name, _ in columns]
+        frequency: Dict[str, int] = {}
+        for words in column_words:
+            for word in words:
+                frequency[word] = frequency.get(word, 0) + 1
+        common = {word for word, count in frequency.items() if count > max(len(columns) // 2, 1)}
+        message_words -= common
+
+        used = set()
+        for msg in history:
+            for step in _operations(msg):
+                used.update(_step_columns(step))
+
+        scored = []
+        for position, (name, _) in enumerate(columns):
+            compact_name = re.sub(r'[\W_]+', '', name.casefold())
+            words = [word for word in column_words[position] if len(word) > 1]
+            if compact_name and (compact_name in compact_message if len(compact_name) > 2 else compact_name in message_words):
+                score = 3.0
+            elif words and message_words.intersection(words):
+                score = 1.0 + len(message_words.intersection(words)) / len(words)
+            elif name in used:
+                score = 1.0
+            else:
+                score = 0.0
+            scored.append((name, score, position))
+
+        scored.sort(key=lambda item: (-item[1], item[2]))
+        return [(name, score) for name, score, _ in scored]
+
+    def _history(
+        self,
+        history: List[Dict[str, Any]],
+        budget: int
+    ) -> Tuple[List[BaseMessage], int, int, int]:
+        """
+        Compact earlier turns, newest first, within a budget.
+
+        Returns:
+            tuple: (messages, turns included, turns summarized, tokens used)
+        """
+        included: List[BaseMessage] = []
+        tokens = 0
+        cut = 0
+        for index in range(len(history) - 1, -1, -1):
+            message = self._compact_turn(history[index])
+            if message is None:
+                continue
+            message_tokens = self._message_tokens(message.content)
+            if tokens + message_tokens > budget:
+                cut = index + 1
+                break
+            included.insert(0, message)
+            tokens += message_tokens
+
+        summarized = 0
+        if cut:
+            # Operation names only, each once, so the summary stays short
+            applied = list(dict.fromkeys(str(step.get('operation')) for msg in history[:cut] for step in _operations(msg)))
+            summarized = cut
+            if applied:
+                summary = SystemMessage(content=f"Earlier in this conversation: applied {', '.join(applied)}.")
+                summary_tokens = self._message_tokens(summary.content)
+                if tokens + summary_tokens <= budget:
+                    included.insert(0, summary)
+                    tokens += summary_tokens
+
+        return included, len(history) - cut, summarized, tokens
+
+    def _compact_turn(self, msg: Dict[str, Any]) -> Optional[BaseMessage]:
+        role, content = msg.get('role'), msg.get('content') or ''
+        if role == 'user':
+            return HumanMessage(content=self._truncate(content, MAX_USER_TURN_TOKENS))
+        if role == 'assistant':
+            operations = _operations(msg)
+            if operations:
+                # The same format the model answers in, without the prose
+                return AIMessage(content=json.dumps({'operations': operations}, separators=(',', ':'), default=str))
+            return AIMessage(content=self._truncate(content, MAX_ASSISTANT_TURN_TOKENS))
+        return None
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        # Cut by the estimated length, then trim until it fits
+        cut = text[:max_tokens * CHARS_PER_TOKEN]
+        while cut and self.count(cut + '…') > max_tokens:
+            cut = cut[:int(len(cut) * 0.9)]
+        return cut.rstrip() + '…'
+
+
+def _operations(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Operations an assistant message recorded in its metadata"""
+    metadata = msg.get('metadata') or {}
+    operations = metadata.get('operations')
+    if isinstance(operations, list):
+        return [step for step in operations if isinstance(step, dict)]
+    if isinstance(metadata.get('operation'), str):
+        return [{'operation': name.strip()} for name in metadata['operation'].split(',')]
+    return []
+
+
+def _step_columns(step: Dict[str, Any]) -> List[str]:
+    params = step.get('params') or {}
+    columns = []
+    for key in ('column', 'old_name', 'new_name'):
+        if isinstance(params.get(key), str):
+            columns.append(params[key])
+    if isinstance(params.get('columns'), list):
+        columns.extend(str(column) for column in params['columns'])
+    elif isinstance(params.get('columns'), str):
+        columns.append(params['columns'])
+    if isinstance(params.get('expression'), str):
+        try:
+            columns.extend(sorted(FilterExpression.from_params(params).columns))
+        except FilterExpressionError:
+            pass
+    return columns
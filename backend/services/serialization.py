@@ -0,0 +1,99 @@
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Values the JSON encoder handles as they are
+JSON_NATIVE_TYPES = (str, int, float, bool, type(None))
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a frame to JSON-serializable records.
+
+    Columns are converted in bulk, one block of same-dtype columns at a time:
+    nulls (NaN, NaT, None, pd.NA) become None, timestamps ISO 8601 strings
+    and numpy scalars Python scalars. Only object columns holding other
+    types fall back to converting cell by cell.
+    """
+    n_rows, n_columns = df.shape
+    if n_columns == 0:
+        return [{} for _ in range(n_rows)]
+
+    positions_by_dtype: Dict[Any, List[int]] = {}
+    for position, dtype in enumerate(df.dtypes):
+        positions_by_dtype.setdefault(dtype, []).append(position)
+
+    values = np.empty((n_rows, n_columns), dtype=object)
+    for dtype, positions in positions_by_dtype.items():
+        values[:, positions] = _block_to_json(df.iloc[:, positions], dtype)
+
+    columns = [str(col) for col in df.columns]
+    return [dict(zip(columns, row)) for row in values.tolist()]
+
+
+def column_to_json(series: pd.Series) -> List[Any]:
+    """Convert a single column to a list of JSON-serializable values"""
+    return _block_to_json(series.to_frame(), series.dtype)[:, 0].tolist()
+
+
+def to_json_value(value: Any) -> Any:
+    """Convert a single value that JSON can't encode as it is"""
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def _block_to_json(block: pd.DataFrame, dtype: Any) -> np.ndarray:
+    """Convert columns sharing one dtype to a 2D object array of JSON values"""
+    nulls = block.isna().to_numpy()
+
+    if isinstance(dtype, np.dtype) and dtype.kind == 'M':
+        values = _datetimes_to_iso(block.to_numpy(dtype='datetime64[ns]'))
+        values[nulls] = None
+        return values
+
+    if isinstance(dtype, pd.DatetimeTZDtype) or (isinstance(dtype, np.dtype) and dtype.kind == 'm'):
+        values = block.astype(str).to_numpy(dtype=object)
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            values = np.frompyfunc(lambda value: value.replace(' ', 'T', 1), 1, 1)(values)
+        values[nulls] = None
+        return values
+
+    values = block.to_numpy(dtype=object, na_value=None)
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        # Already Python scalars
+        return values
+
+    if not all(value_type in JSON_NATIVE_TYPES for value_type in set(map(type, values.ravel()))):
+        values = _convert_cells(values)
+    return values
+
+
+def _datetimes_to_iso(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Format datetime64[ns] values like Timestamp.isoformat(): fractional
+    seconds are only written when there are any, in micro- or nanoseconds.
+    """
+    values = np.datetime_as_string(timestamps, unit='s').astype(object)
+    nanoseconds = timestamps.view('i8') % 1_000_000_000
+    for unit, has_unit in (('us', nanoseconds % 1000 == 0), ('ns', nanoseconds % 1000 != 0)):
+        fractional = (nanoseconds != 0) & has_unit
+        if fractional.any():
+            values[fractional] = np.datetime_as_string(timestamps[fractional], unit=unit)
+    return values
+
+
+def _convert_cell(value: Any) -> Any:
+    return value if type(value) in JSON_NATIVE_TYPES else to_json_value(value)
+
+
+_convert_cells = np.frompyfunc(_convert_cell, 1, 1)
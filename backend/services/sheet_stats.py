@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
+
+import pandas as pd
+
+
+@dataclass
+class SheetStats:
+    """
+    Row count and per-column null counts and dtypes of a sheet.
+
+    Stored with the working copy and updated from the deltas operations
+    report, so reading stats never scans the cells. Only operations that
+    can't describe their effect recount the columns they touched.
+    """
+    rows: int
+    null_counts: Dict[str, int] = field(default_factory=dict)
+    dtypes: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'SheetStats':
+        """Compute the stats of a frame from scratch"""
+        return cls(
+            rows=len(df),
+            null_counts={str(col): int(count) for col, count in df.isnull().sum().items()},
+            dtypes={str(col): str(dtype) for col, dtype in df.dtypes.items()}
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SheetStats':
+        return cls(
+            rows=data['rows'],
+            null_counts=dict(data['null_counts']),
+            dtypes=dict(data['dtypes'])
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'null_counts': self.null_counts,
+            'dtypes': self.dtypes
+        }
+
+    def copy(self) -> 'SheetStats':
+        return SheetStats(self.rows, dict(self.null_counts), dict(self.dtypes))
+
+    def summary(self) -> Dict[str, Any]:
+        """Stats in the format returned by the API"""
+        return {
+            'rows': self.rows,
+            'columns': len(self.null_counts),
+            'column_names': list(self.null_counts),
+            'null_counts': dict(self.null_counts)
+        }
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Cheap consistency check against a frame (shape and column names only)"""
+        return self.rows == len(df) and list(self.null_counts) == [str(col) for col in df.columns]
+
+    def remove_rows(self, before: pd.DataFrame, after: pd.DataFrame) -> None:
+        """Account for rows dropped between two versions of a frame"""
+        removed = len(before) - len(after)
+        if removed == 0:
+            return
+        if removed > len(after):
+            # Fewer cells to look at in what's left than in what's gone
+            self.rows = len(after)
+            self.null_counts = {str(col): int(count) for col, count in after.isnull().sum().items()}
+            return
+        dropped = before[~before.index.isin(after.index)]
+        for col, count in dropped.isnull().sum().items():
+            self.null_counts[str(col)] -= int(count)
+        self.rows = len(after)
+
+    def recount(self, df: pd.DataFrame, columns: Iterable[Any]) -> None:
+        """Recount nulls of columns whose values changed in unknown ways"""
+        for col in columns:
+            self.null_counts[str(col)] = int(df[col].isnull().sum())
+            self.dtypes[str(col)] = str(df[col].dtype)
+
+    def clear_nulls(self, columns: Iterable[Any]) -> None:
+        """Columns that can no longer contain nulls"""
+        for col in columns:
+            self.null_counts[str(col)] = 0
+
+    def drop_columns(self, columns: Iterable[Any]) -> None:
+        for col in columns:
+            self.null_counts.pop(str(col), None)
+            self.dtypes.pop(str(col), None)
+
+    def rename_column(self, old_name: Any, new_name: Any) -> None:
+        # Rebuild the dicts so the column keeps its position
+        old_name, new_name = str(old_name), str(new_name)
+        self.null_counts = {new_name if col == old_name else col: count for col, count in self.null_counts.items()}
+        self.dtypes = {new_name if col == old_name else col: dtype for col, dtype in self.dtypes.items()}
+
+    def refresh_dtypes(self, df: pd.DataFrame) -> None:
+        """Take dtypes from a frame, which costs one lookup per column"""
+        self.dtypes = {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+    def empty_columns(self) -> List[str]:
+        """Columns in which every value is null"""
+        return [col for col, count in self.null_counts.items() if count == self.rows]
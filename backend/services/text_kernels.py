@@ -0,0 +1,65 @@
+from typing import Callable, Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Text columns changed by the text operations are held in this dtype: one
+# Arrow buffer per column instead of a Python object per cell, with nulls
+# kept as nulls
+TEXT_DTYPE = pd.StringDtype('pyarrow')
+
+# Arrow compute kernels of the string functions the text operations use,
+# run on whole columns outside the GIL
+KERNELS: Dict[str, Callable[[pa.Array], pa.Array]] = {
+    'strip': pc.utf8_trim_whitespace,
+    'upper': pc.utf8_upper,
+    'lower': pc.utf8_lower,
+    'capitalize': pc.utf8_capitalize,
+}
+
+
+def is_text(series: pd.Series) -> bool:
+    """Whether a column holds text (object columns, as read from Parquet, or TEXT_DTYPE)"""
+    return series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+
+
+def to_text(series: pd.Series) -> pd.Series:
+    """
+    A column as TEXT_DTYPE.
+
+    Nulls stay null. Other values that aren't text, e.g. numbers in a mixed
+    column, become their string form.
+    """
+    if series.dtype == TEXT_DTYPE:
+        return series
+    return series.astype(TEXT_DTYPE)
+
+
+def apply_text_functions(series: pd.Series, functions: List[str]) -> pd.Series:
+    """
+    Apply string functions (keys of KERNELS) in turn to a column.
+
+    The column is converted to Arrow once and every function runs as a
+    kernel over the whole array, so fused transforms make no intermediate
+    pandas columns.
+    """
+    values = pa.array(to_text(series).array)
+    for name in functions:
+        values = KERNELS[name](values)
+    return pd.Series(pd.arrays.ArrowStringArray(values), index=series.index, name=series.name)
+
+
+def object_columns_for(df: pd.DataFrame, columns: List[str], value) -> pd.DataFrame:
+    """
+    Make TEXT_DTYPE columns able to take a value that isn't text.
+
+    A fill or replace value such as 0 can't be stored in an Arrow string
+    column, so such columns go back to object dtype first.
+    """
+    if isinstance(value, str) or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return df
+    for col in columns:
+        if df[col].dtype == TEXT_DTYPE:
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class TokenAllowanceCache:
+    """
+    Short-lived per-process cache of users' token allowances.
+
+    Read-only endpoints such as /api/ai/tokens are polled by the frontend;
+    this answers them without a database round trip. Entries expire after
+    ``ttl_seconds`` and are dropped whenever this process spends or refunds
+    a token, so a stale value is only ever seen for a token spent by another
+    process, and for at most ``ttl_seconds``. Token accounting itself never
+    reads from here (see UserRepository.consume_token).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a user's cached allowance, or None if there is none or it expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, allowance: Dict[str, Any]) -> None:
+        """Cache a user's allowance for ``ttl_seconds``"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Cheaper than tracking recency: entries only live a few seconds
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[user_id] = (now + self.ttl_seconds, allowance)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's cached allowance after their tokens changed"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Shared by every request in this process
+token_allowance_cache = TokenAllowanceCache(
+    ttl_seconds=float(os.environ.get('TOKEN_CACHE_TTL_SECONDS', '5'))
+)
@@ -0,0 +1,108 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Largest single uploaded file accepted
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+
+class UploadSpool:
+    """
+    Writable file that receives an uploaded file straight from the request body.
+
+    Werkzeug's form parser writes each chunk exactly once; the size limit and
+    the SHA-256 of the content are computed as the chunks go by. The file lives
+    in an ``.incoming`` directory of the upload folder and is either moved into
+    place with :meth:`persist` or deleted when the request is closed.
+    """
+
+    def __init__(self, directory: str, max_size: Optional[int] = MAX_UPLOAD_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.name = tempfile.mkstemp(dir=directory, suffix='.upload')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.max_size = max_size
+        self.size = 0
+        self.persisted_path: Optional[str] = None
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 of everything written so far"""
+        return self._hash.hexdigest()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            # The parser drops this file on error, so clean it up here
+            self.close()
+            raise RequestEntityTooLarge()
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def persist(self, path: str) -> str:
+        """Move the spooled file to its final location without copying it"""
+        self._file.flush()
+        os.replace(self.name, path)
+        self.persisted_path = path
+        self.name = path
+        return path
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if self.persisted_path is None and os.path.exists(self.name):
+            os.remove(self.name)
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def __getattr__(self, name):
+        if name == '_file':
+            raise AttributeError(name)
+        # read, seek, tell, readline, ... go to the underlying file
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class IngestRequest(Request):
+    """Request class that spools uploaded files to the upload folder in one pass"""
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None,
+    ):
+        directory = os.path.join(current_app.config['UPLOAD_FOLDER'], '.incoming')
+        return UploadSpool(directory)
+
+
+class _MappedFile(mmap.mmap):
+    # zipfile checks seekable(), which mmap objects don't define
+    def seekable(self) -> bool:
+        return True
+
+
+@contextmanager
+def open_mapped(path: str):
+    """Open a file on disk as a read-only memory map, usable by zipfile"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files can't be mapped
+            yield f
+            return
+        mapped = _MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
@@ -0,0 +1,272 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from services.dataframe_cache import DataFrameCache, dataframe_cache
+from services.sheet_stats import SheetStats
+from services.working_copy import WorkingCopy
+
+# A sheet is checkpointed after this many plans changed it since its last
+# checkpoint...
+CHECKPOINT_EVERY = int(os.environ.get('VERSION_CHECKPOINT_EVERY', '5'))
+# ...or once replaying them would take this long
+CHECKPOINT_SECONDS = float(os.environ.get('VERSION_CHECKPOINT_SECONDS', '2'))
+# Checkpoints kept per sheet besides its first one
+MAX_CHECKPOINTS = int(os.environ.get('VERSION_MAX_CHECKPOINTS', '10'))
+
+
+class VersionStore:
+    """
+    Operation log and checkpoints of a working copy, for undo and redo.
+
+    Version 0 is the uploaded state and version k the state after the k-th
+    plan. Every plan is logged with its sheet and steps. Some versions also
+    keep a checkpoint of the sheet they changed: the sheet's Parquet file,
+    hard linked, so it costs nothing until the sheet is saved again. A sheet
+    at any version is rebuilt by loading its nearest earlier checkpoint and
+    replaying the plans logged for it since.
+
+    A sheet is checkpointed once ``checkpoint_every`` plans or
+    ``checkpoint_seconds`` of compute were logged for it since its last
+    checkpoint, which bounds the replay. At most ``max_checkpoints`` are kept
+    per sheet besides the first one, which bounds the disk use.
+
+    Callers hold the session's job lock while changing the store.
+    """
+
+    DIRECTORY = 'versions'
+    LOG = 'log.json'
+
+    def __init__(
+        self,
+        working_copy: WorkingCopy,
+        checkpoint_every: int = CHECKPOINT_EVERY,
+        checkpoint_seconds: float = CHECKPOINT_SECONDS,
+        max_checkpoints: int = MAX_CHECKPOINTS,
+        cache: Optional[DataFrameCache] = None
+    ):
+        self.working_copy = working_copy
+        self.root = os.path.join(working_copy.root, self.DIRECTORY)
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.max_checkpoints = max_checkpoints
+        self.cache = cache if cache is not None else dataframe_cache
+        self._log: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def for_file(cls, file_path: str) -> 'VersionStore':
+        """Get the version store of an uploaded file"""
+        return cls(WorkingCopy.open_or_create(file_path))
+
+    @property
+    def log(self) -> Dict[str, Any]:
+        if self._log is None:
+            path = os.path.join(self.root, self.LOG)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._log = json.load(f)
+            else:
+                self._log = {'current': 0, 'entries': [], 'checkpoints': {}}
+        return self._log
+
+    @property
+    def current(self) -> int:
+        """Version the working copy is at"""
+        return self.log['current']
+
+    @property
+    def latest(self) -> int:
+        """Newest version that can be redone"""
+        return len(self.log['entries'])
+
+    def history(self) -> List[Dict[str, Any]]:
+        """Describe every version, the uploaded state first"""
+        checkpointed = {version for versions in self.log['checkpoints'].values() for version in versions}
+        versions = [{
+            'version': 0,
+            'sheet_name': None,
+            'operations': [],
+            'summary': 'Uploaded file',
+            'created_at': None,
+            'checkpoint': 0 in checkpointed
+        }]
+        for entry in self.log['entries']:
+            versions.append({
+                'version': entry['version'],
+                'sheet_name': entry['sheet'],
+                'operations': entry['steps'],
+                'summary': entry['summary'],
+                'created_at': entry['created_at'],
+                'checkpoint': entry['version'] in checkpointed
+            })
+        return versions
+
+    def prepare(self, sheet_name: str) -> None:
+        """
+        Make the current state of a sheet recoverable before a plan saves it.
+
+        Versions that were undone are dropped, as a new plan replaces them,
+        and a sheet changed for the first time is checkpointed as it is.
+        """
+        log = self.log
+        if log['current'] < len(log['entries']):
+            log['entries'] = log['entries'][:log['current']]
+            for sheet, versions in log['checkpoints'].items():
+                for version in [version for version in versions if version > log['current']]:
+                    self._remove_checkpoint(sheet, version)
+                log['checkpoints'][sheet] = [version for version in versions if version <= log['current']]
+
+        if not log['checkpoints'].get(sheet_name):
+            self._add_checkpoint(sheet_name, log['current'])
+        self._write_log()
+
+    def record(self, sheet_name: str, steps: List[Dict[str, Any]], summary: str, seconds: float) -> int:
+        """
+        Log a plan that was just saved, checkpointing the sheet if due.
+
+        Args:
+            sheet_name: Sheet the plan changed
+            steps: The plan, as given to PandasExecutor.execute_plan
+            summary: What the plan did
+            seconds: How long the plan took to run, i.e. to replay
+
+        Returns:
+            The new version
+        """
+        log = self.log
+        version = log['current'] + 1
+        log['entries'].append({
+            'version': version,
+            'sheet': sheet_name,
+            'steps': steps,
+            'summary': summary,
+            'seconds': round(seconds, 4),
+            'created_at': datetime.now(timezone.utc).isoformat()
+        })
+        log['current'] = version
+
+        pending = self._replayed_entries(sheet_name, version)
+        if len(pending) >= self.checkpoint_every or sum(entry['seconds'] for entry in pending) >= self.checkpoint_seconds:
+            self._add_checkpoint(sheet_name, version)
+            self._prune_checkpoints(sheet_name)
+        self._write_log()
+        return version
+
+    def checkout(self, version: int) -> List[str]:
+        """
+        Bring the working copy to a version, e.g. to undo or redo plans.
+
+        Only the sheets changed between the current version and the target
+        are rebuilt and saved.
+
+        Returns:
+            Names of the sheets that changed
+        """
+        log = self.log
+        if version < 0 or version > len(log['entries']):
+            raise ValueError(f'Version {version} does not exist (0 to {len(log["entries"])})')
+
+        low, high = sorted((log['current'], version))
+        sheets = []
+        for entry in log['entries'][low:high]:
+            if entry['sheet'] not in sheets:
+                sheets.append(entry['sheet'])
+
+        for sheet_name in sheets:
+            df, stats = self.rebuild(sheet_name, version)
+            stored = self.working_copy.save_sheet(sheet_name, df, stats)
+            sheet_path = self.working_copy.sheet_path(sheet_name)
+            self.cache.put(sheet_path, sheet_name, DataFrameCache.file_version(sheet_path), stored)
+
+        log['current'] = version
+        self._write_log()
+        return sheets
+
+    def rebuild(self, sheet_name: str, version: int) -> Tuple[pd.DataFrame, Optional[SheetStats]]:
+        """
+        Rebuild a sheet as it was at a version.
+
+        Returns:
+            The frame, and its stats if plans were replayed (None otherwise)
+        """
+        checkpoints = self.log['checkpoints'].get(sheet_name, [])
+        if not checkpoints:
+            # Never changed
+            return self.working_copy.load_sheet(sheet_name), None
+
+        # The first checkpoint is taken before the sheet's first change, so
+        # it also holds every version before it
+        earlier = [v for v in checkpoints if v <= version]
+        start = earlier[-1] if earlier else checkpoints[0]
+
+        df = pd.read_parquet(self._checkpoint_path(sheet_name, start))
+        entries = self._replayed_entries(sheet_name, version, since=start)
+        if not entries:
+            return df, None
+
+        from services.excel_operations import PandasExecutor
+
+        executor = PandasExecutor(self.working_copy.source_path, sheet_name, df=df)
+        for entry in entries:
+            executor.execute_plan(entry['steps'])
+        return executor.df, executor.stats
+
+    def disk_usage(self) -> int:
+        """Bytes taken by the checkpoints and the log"""
+        if not os.path.isdir(self.root):
+            return 0
+        return sum(os.path.getsize(os.path.join(self.root, name)) for name in os.listdir(self.root))
+
+    def _replayed_entries(self, sheet_name: str, version: int, since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Entries of a sheet after its checkpoint (the latest one by default) up to a version"""
+        if since is None:
+            checkpoints = [v for v in self.log['checkpoints'].get(sheet_name, []) if v <= version]
+            since = checkpoints[-1] if checkpoints else 0
+        return [
+            entry for entry in self.log['entries'][since:version]
+            if entry['sheet'] == sheet_name
+        ]
+
+    def _checkpoint_path(self, sheet_name: str, version: int) -> str:
+        index = self.working_copy.sheet_names().index(sheet_name)
+        return os.path.join(self.root, f'sheet_{index}.v{version}.parquet')
+
+    def _add_checkpoint(self, sheet_name: str, version: int) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        source = self.working_copy.sheet_path(sheet_name)
+        target = self._checkpoint_path(sheet_name, version)
+        # Sheets are saved by replacing their file, which leaves the link intact
+        tmp_path = f'{target}.tmp'
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+
+        versions = self.log['checkpoints'].setdefault(sheet_name, [])
+        if version not in versions:
+            versions.append(version)
+            versions.sort()
+
+    def _prune_checkpoints(self, sheet_name: str) -> None:
+        # The first checkpoint stays, every older version is rebuilt from it
+        versions = self.log['checkpoints'][sheet_name]
+        while len(versions) > self.max_checkpoints + 1:
+            self._remove_checkpoint(sheet_name, versions.pop(1))
+
+    def _remove_checkpoint(self, sheet_name: str, version: int) -> None:
+        path = self._checkpoint_path(sheet_name, version)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _write_log(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, self.LOG)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.log, f)
+        os.replace(tmp_path, path)
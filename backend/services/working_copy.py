@@ -0,0 +1,370 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.column_profiler import ColumnProfile, profile_frame
+from services.file_lock import file_lock
+from services.sheet_stats import SheetStats
+from services.xlsx_package import XlsxPackage, write_patched_workbook
+
+logger = logging.getLogger(__name__)
+
+# Rows per Parquet row group; a page of rows only reads the groups it overlaps
+ROW_GROUP_ROWS = 65536
+
+# Converts uploads after the upload request has returned
+_conversion_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='working-copy')
+
+
+class WorkingCopy:
+    """
+    Columnar working state of an uploaded workbook.
+
+    Each sheet is converted once to a Parquet file stored in a directory next
+    to the upload (``<file_path>.work``). Operations load and save these files,
+    which keeps dtypes intact between chat turns; XLSX is only produced again
+    when the file is downloaded.
+
+    The manifest tracks a state version, bumped on every save, and the sheets
+    modified since upload. Rendered XLSX files are cached per state version.
+    """
+
+    MANIFEST = 'manifest.json'
+    PROFILE_SUFFIX = '.profile.json'
+    SUFFIX = '.work'
+
+    def __init__(self, root: str):
+        self.root = root
+        self.source_path = root[:-len(self.SUFFIX)] if root.endswith(self.SUFFIX) else None
+        self._manifest: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def for_file(cls, file_path: str) -> 'WorkingCopy':
+        """Get the working copy belonging to an uploaded file"""
+        return cls(file_path + cls.SUFFIX)
+
+    @classmethod
+    def create_from_excel(cls, file_path: str, base_path: Optional[str] = None) -> 'WorkingCopy':
+        """
+        Parse every sheet of the workbook once and store it as Parquet.
+
+        Concurrent calls for the same file, from any worker process, convert
+        it only once; the others wait and reuse the result.
+
+        Args:
+            file_path: Workbook to create the working copy for
+            base_path: Optional workbook with identical content (e.g. the
+                content-addressed blob) whose working copy is converted once
+                and shared copy-on-write instead of converting ``file_path``
+        """
+        working_copy = cls.for_file(file_path)
+        with working_copy._lock():
+            if working_copy.exists():
+                return working_copy
+            if base_path is not None:
+                working_copy._clone(cls.create_from_excel(base_path))
+            else:
+                working_copy._convert(file_path)
+        return working_copy
+
+    @classmethod
+    def create_in_background(cls, file_path: str, base_path: Optional[str] = None) -> Future:
+        """Start converting a workbook without waiting for it"""
+        def convert():
+            try:
+                return cls.create_from_excel(file_path, base_path)
+            except Exception:
+                # The next executor retries the conversion and reports the error
+                logger.error(f'Error converting {file_path} to a working copy', exc_info=True)
+                raise
+
+        return _conversion_pool.submit(convert)
+
+    def _clone(self, base: 'WorkingCopy') -> None:
+        """
+        Share the files of another working copy through hard links.
+
+        Every write replaces a file instead of modifying it in place, which
+        breaks the link, so changes never leak back into the shared copy.
+        """
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(self.root)
+
+        # The manifest goes last, it marks the working copy as complete
+        names = [
+            name for name in os.listdir(base.root)
+            if name.endswith('.parquet') or name.endswith(self.PROFILE_SUFFIX)
+        ] + [self.MANIFEST]
+        for name in names:
+            source, target = os.path.join(base.root, name), os.path.join(self.root, name)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+
+    def _convert(self, file_path: str) -> None:
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(self.root)
+
+        sheets = pd.read_excel(file_path, sheet_name=None)
+
+        manifest = {
+            'source': os.path.basename(file_path),
+            'version': 0,
+            'dirty_sheets': [],
+            'sheets': []
+        }
+        for index, (sheet_name, df) in enumerate(sheets.items()):
+            sheet_file = f'sheet_{index}.parquet'
+            stored = self._write_frame(os.path.join(self.root, sheet_file), df)
+            self._write_profile(os.path.join(self.root, sheet_file), stored)
+            manifest['sheets'].append({
+                'name': str(sheet_name),
+                'file': sheet_file,
+                'stats': SheetStats.from_frame(stored).to_dict()
+            })
+
+        self._write_manifest(manifest)
+
+    @classmethod
+    def open_or_create(cls, file_path: str) -> 'WorkingCopy':
+        """Get the working copy of a file, converting the workbook if needed"""
+        working_copy = cls.for_file(file_path)
+        if working_copy.exists():
+            return working_copy
+        return cls.create_from_excel(file_path)
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.root, self.MANIFEST))
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        if self._manifest is None:
+            with open(os.path.join(self.root, self.MANIFEST), 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def sheet_names(self) -> List[str]:
+        return [sheet['name'] for sheet in self.manifest['sheets']]
+
+    def sheet_path(self, sheet_name: str) -> str:
+        """Get the Parquet file holding a sheet"""
+        for sheet in self.manifest['sheets']:
+            if sheet['name'] == sheet_name:
+                return os.path.join(self.root, sheet['file'])
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+    def load_sheet(self, sheet_name: str) -> pd.DataFrame:
+        return pd.read_parquet(self.sheet_path(sheet_name))
+
+    def read_window(
+        self,
+        sheet_name: str,
+        offset: int,
+        limit: int,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Read a window of rows of a sheet.
+
+        Only the requested columns and the row groups overlapping the window
+        are read from disk.
+        """
+        parquet_file = pq.ParquetFile(self.sheet_path(sheet_name))
+        metadata = parquet_file.metadata
+
+        row_groups, window_start, group_start = [], None, 0
+        for index in range(metadata.num_row_groups):
+            group_rows = metadata.row_group(index).num_rows
+            if group_start + group_rows > offset and group_start < offset + limit:
+                if window_start is None:
+                    window_start = group_start
+                row_groups.append(index)
+            group_start += group_rows
+
+        if not row_groups:
+            schema = parquet_file.schema_arrow
+            table = schema.empty_table() if columns is None else schema.empty_table().select(columns)
+            return table.to_pandas()
+
+        table = parquet_file.read_row_groups(row_groups, columns=columns)
+        return table.slice(offset - window_start, limit).to_pandas()
+
+    def sheet_profile(self, sheet_name: str) -> Dict[str, ColumnProfile]:
+        """
+        Get the detected column types of a sheet.
+
+        Profiles are written next to the sheet's Parquet file whenever the
+        sheet is saved, so reading one never loads the sheet. Working copies
+        created without them have none.
+        """
+        profile_path = self.sheet_path(sheet_name) + self.PROFILE_SUFFIX
+        if not os.path.exists(profile_path):
+            return {}
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        return {name: ColumnProfile.from_dict(profile) for name, profile in stored['columns'].items()}
+
+    def sheet_stats(self, sheet_name: str) -> Optional[SheetStats]:
+        """Get the stored stats of a sheet, None for working copies created without them"""
+        for sheet in self.manifest['sheets']:
+            if sheet['name'] == sheet_name:
+                return SheetStats.from_dict(sheet['stats']) if 'stats' in sheet else None
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+    @property
+    def version(self) -> int:
+        """State version, bumped every time a sheet is saved"""
+        return self.manifest.get('version', 0)
+
+    def is_dirty(self) -> bool:
+        """Whether any sheet changed since the workbook was uploaded"""
+        return bool(self.manifest.get('dirty_sheets'))
+
+    def save_sheet(self, sheet_name: str, df: pd.DataFrame, stats: Optional[SheetStats] = None) -> pd.DataFrame:
+        """
+        Replace a sheet's working state, returns the frame as it was stored.
+
+        ``stats`` are the sheet stats kept up to date by the caller; without
+        them they are computed from the frame.
+        """
+        sheet_path = self.sheet_path(sheet_name)
+        stored = self._write_frame(sheet_path, df)
+        self._write_profile(sheet_path, stored)
+        if stats is None:
+            stats = SheetStats.from_frame(stored)
+        else:
+            stats.refresh_dtypes(stored)
+
+        # Re-read under the lock so a save from another request isn't lost
+        with self._lock():
+            self._manifest = None
+            manifest = self.manifest
+            for sheet in manifest['sheets']:
+                if sheet['name'] == sheet_name:
+                    sheet['stats'] = stats.to_dict()
+            manifest['version'] = manifest.get('version', 0) + 1
+            dirty_sheets = manifest.setdefault('dirty_sheets', [])
+            if sheet_name not in dirty_sheets:
+                dirty_sheets.append(sheet_name)
+            self._write_manifest(manifest)
+
+        return stored
+
+    def export_xlsx(self) -> str:
+        """
+        Get an XLSX file of the current state, rendering it only if needed.
+
+        An unmodified upload is served as-is; otherwise the render for the
+        current version is reused until the next save.
+        """
+        if not self.is_dirty() and self.source_path and self.source_path.lower().endswith('.xlsx'):
+            return self.source_path
+
+        version = self.version
+        export_path = os.path.join(self.root, f'export_{version}.xlsx')
+        if os.path.exists(export_path):
+            return export_path
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', dir=self.root)
+        os.close(fd)
+        try:
+            self.render_xlsx(tmp_path)
+            os.replace(tmp_path, export_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        # Renders of older versions can never be served again
+        for name in os.listdir(self.root):
+            if name.startswith('export_') and name.endswith('.xlsx') and name != f'export_{version}.xlsx':
+                os.remove(os.path.join(self.root, name))
+
+        return export_path
+
+    def render_xlsx(self, output_path: str) -> str:
+        """
+        Write the working copy to an XLSX file.
+
+        For XLSX uploads only the modified sheets are regenerated and every
+        other part of the original package is copied over unchanged. Other
+        sources (e.g. XLS) are written out in full.
+        """
+        if self.source_path and os.path.exists(self.source_path) and XlsxPackage.is_xlsx(self.source_path):
+            frames = {
+                sheet_name: self.load_sheet(sheet_name)
+                for sheet_name in self.manifest.get('dirty_sheets', [])
+            }
+            return write_patched_workbook(self.source_path, output_path, frames)
+
+        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+            for sheet_name in self.sheet_names():
+                self.load_sheet(sheet_name).to_excel(writer, sheet_name=sheet_name, index=False)
+        return output_path
+
+    def _lock(self):
+        """Lock of the working copy, held while creating it or updating its manifest"""
+        return file_lock(self.root + '.lock')
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        path = os.path.join(self.root, self.MANIFEST)
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        self._manifest = manifest
+
+    def _write_profile(self, sheet_path: str, df: pd.DataFrame) -> Dict[str, ColumnProfile]:
+        profiles = profile_frame(df)
+        profile_path = sheet_path + self.PROFILE_SUFFIX
+        tmp_path = _tmp_path(profile_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'columns': {name: profile.to_dict() for name, profile in profiles.items()}}, f)
+        os.replace(tmp_path, profile_path)
+        return profiles
+
+    def _write_frame(self, path: str, df: pd.DataFrame) -> pd.DataFrame:
+        df = self._prepare_for_arrow(df)
+        # Write next to the target and swap it in, so readers never see a partial file
+        tmp_path = _tmp_path(path)
+        df.to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_ROWS)
+        os.replace(tmp_path, path)
+        return df
+
+    @staticmethod
+    def _prepare_for_arrow(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Make a frame storable as Parquet.
+
+        Column names must be strings, and object columns that mix types
+        (common in spreadsheets, e.g. numbers and "N/A") are stored as text
+        with nulls kept as nulls.
+        """
+        df = df.reset_index(drop=True)
+        df.columns = [str(col) for col in df.columns]
+
+        for col in df.columns:
+            if df[col].dtype != object:
+                continue
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].map(lambda value: value if pd.isna(value) else str(value))
+
+        return df
+
+
+def _tmp_path(path: str) -> str:
+    """Temporary file to write ``path`` to, unique to this process and thread"""
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
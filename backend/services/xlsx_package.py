@@ -0,0 +1,611 @@
+import datetime
+import posixpath
+import re
+import shutil
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+DOC_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+OFFICE_DOCUMENT_REL = f'{DOC_REL_NS}/officeDocument'
+STYLES_REL = f'{DOC_REL_NS}/styles'
+SHARED_STRINGS_REL = f'{DOC_REL_NS}/sharedStrings'
+TABLE_REL = f'{DOC_REL_NS}/table'
+HYPERLINK_REL = f'{DOC_REL_NS}/hyperlink'
+
+# Excel's day zero (accounts for the 1900 leap year bug)
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+# Built-in number formats: 14 is a short date, 22 a date with time
+DATE_NUM_FMT = 14
+DATETIME_NUM_FMT = 22
+
+# Built-in number formats that display dates or times
+BUILTIN_DATE_FORMATS = set(range(14, 18)) | {22} | set(range(27, 37)) | set(range(50, 59))
+BUILTIN_TIME_FORMATS = set(range(18, 22)) | set(range(45, 48))
+
+# Worksheet elements holding cell ranges that no longer match regenerated data
+RANGE_ELEMENTS = ('mergeCells', 'autoFilter', 'conditionalFormatting', 'dataValidations', 'hyperlinks', 'tableParts')
+
+ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class XlsxPackage:
+    """Read-only view of the parts of an XLSX zip package"""
+
+    def __init__(self, zf: zipfile.ZipFile):
+        self.zf = zf
+        self.workbook_part = self._resolve_workbook_part()
+        self._workbook_rels = self._read_rels(self.workbook_part)
+
+    @staticmethod
+    def is_xlsx(path_or_file) -> bool:
+        return zipfile.is_zipfile(path_or_file)
+
+    @staticmethod
+    def rels_path(part: str) -> str:
+        directory, name = posixpath.split(part)
+        return posixpath.join(directory, '_rels', f'{name}.rels')
+
+    @staticmethod
+    def resolve_target(source_part: str, target: str) -> str:
+        if target.startswith('/'):
+            return target.lstrip('/')
+        return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+    def _resolve_workbook_part(self) -> str:
+        root = ET.fromstring(self.zf.read('_rels/.rels'))
+        for rel in root.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            if rel.get('Type') == OFFICE_DOCUMENT_REL:
+                return rel.get('Target').lstrip('/')
+        return 'xl/workbook.xml'
+
+    def _read_rels(self, part: str) -> Dict[str, Dict[str, str]]:
+        rels_path = self.rels_path(part)
+        if rels_path not in self.zf.namelist():
+            return {}
+        root = ET.fromstring(self.zf.read(rels_path))
+        return {
+            rel.get('Id'): {
+                'type': rel.get('Type'),
+                'target': self.resolve_target(part, rel.get('Target'))
+            }
+            for rel in root.iter(f'{{{PKG_REL_NS}}}Relationship')
+        }
+
+    def sheet_parts(self) -> "OrderedDict[str, str]":
+        """Map each sheet name, in workbook order, to its worksheet part"""
+        root = ET.fromstring(self.zf.read(self.workbook_part))
+        parts = OrderedDict()
+        for sheet in root.iter(f'{{{MAIN_NS}}}sheet'):
+            rel = self._workbook_rels.get(sheet.get(f'{{{DOC_REL_NS}}}id'))
+            if rel is not None:
+                parts[sheet.get('name')] = rel['target']
+        return parts
+
+    def relationships(self, part: str, rel_types: Tuple[str, ...]) -> Dict[str, str]:
+        """Map the ids of a part's relationships of the given types to their targets"""
+        return {
+            rel_id: rel['target']
+            for rel_id, rel in self._read_rels(part).items()
+            if rel['type'] in rel_types
+        }
+
+    def related_part(self, rel_type: str) -> Optional[str]:
+        """Get the workbook-level part of a relationship type, e.g. styles"""
+        for rel in self._workbook_rels.values():
+            if rel['type'] == rel_type:
+                return rel['target']
+        return None
+
+    def read_head(self, sheet_name: str, n_rows: int) -> Tuple[pd.DataFrame, Optional[Tuple[int, int]]]:
+        """
+        Read the header and the first ``n_rows`` data rows of a sheet.
+
+        The worksheet XML is parsed incrementally and parsing stops as soon as
+        enough rows were seen, and the shared strings table is only read up to
+        the highest index those rows reference. The cost is therefore
+        independent of the number of rows in the sheet.
+
+        Returns:
+            Tuple of (DataFrame shaped like ``pd.read_excel(..., nrows=n_rows)``,
+            declared (data rows, columns) from the sheet's dimension or None)
+        """
+        part = self.sheet_parts()[sheet_name]
+        dimension = None
+        rows: Dict[int, Dict[int, Tuple[str, str, int]]] = {}
+        row_number = 0
+
+        with self.zf.open(part) as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                tag = _local_name(elem.tag)
+                if event == 'start':
+                    if tag == 'dimension':
+                        dimension = _parse_dimension(elem.get('ref'))
+                    continue
+
+                if tag == 'row':
+                    row_number = int(elem.get('r', row_number + 1))
+                    if row_number > n_rows + 1:
+                        break
+                    cells = _row_cells(elem)
+                    if cells:
+                        rows[row_number] = cells
+                    elem.clear()
+                elif tag == 'sheetData':
+                    break
+
+        shared_indexes = [
+            int(value) for cells in rows.values()
+            for cell_type, value, _ in cells.values() if cell_type == 's'
+        ]
+        shared_strings = self._shared_strings(max(shared_indexes)) if shared_indexes else []
+        date_styles = self._date_styles()
+
+        def convert(cell):
+            cell_type, value, style = cell
+            return _convert_cell(cell_type, value, date_styles.get(style), shared_strings)
+
+        header_cells = rows.get(1, {})
+        last_row = max(rows) if rows else 1
+        n_cols = max((max(cells) + 1 for cells in rows.values()), default=0)
+
+        columns = _header_names([
+            convert(header_cells[i]) if i in header_cells else None
+            for i in range(n_cols)
+        ])
+        records = [
+            [convert(rows[r][i]) if r in rows and i in rows[r] else None for i in range(n_cols)]
+            for r in range(2, last_row + 1)
+        ]
+
+        df = pd.DataFrame(records, columns=columns).infer_objects()
+        return df, dimension
+
+    def _shared_strings(self, max_index: int) -> List[str]:
+        """Read the shared strings table up to and including ``max_index``"""
+        part = self.related_part(SHARED_STRINGS_REL)
+        strings: List[str] = []
+        if part is None:
+            return strings
+
+        with self.zf.open(part) as f:
+            for _, elem in ET.iterparse(f, events=('end',)):
+                if _local_name(elem.tag) != 'si':
+                    continue
+                strings.append(_text_of(elem))
+                elem.clear()
+                if len(strings) > max_index:
+                    break
+        return strings
+
+    def _date_styles(self) -> Dict[int, str]:
+        """Map cell style indexes that format dates to 'datetime' or 'time'"""
+        part = self.related_part(STYLES_REL)
+        if part is None:
+            return {}
+
+        root = ET.fromstring(self.zf.read(part))
+        custom_formats = {
+            int(fmt.get('numFmtId')): fmt.get('formatCode', '')
+            for fmt in root.iter() if _local_name(fmt.tag) == 'numFmt'
+        }
+
+        styles = {}
+        cell_xfs = next((elem for elem in root if _local_name(elem.tag) == 'cellXfs'), None)
+        if cell_xfs is None:
+            return styles
+
+        for index, xf in enumerate(cell_xfs):
+            kind = _date_format_kind(int(xf.get('numFmtId', 0)), custom_formats)
+            if kind:
+                styles[index] = kind
+        return styles
+
+
+def column_index(ref: str) -> int:
+    """Convert a cell reference such as 'AB12' to a 0-based column index"""
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def column_letter(index: int) -> str:
+    """Convert a 0-based column index to an Excel column letter"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def write_patched_workbook(source_path: str, output_path: str, frames: Dict[str, pd.DataFrame]) -> str:
+    """
+    Write a copy of an XLSX file with only the given sheets regenerated.
+
+    The worksheet parts of the sheets in ``frames`` are rebuilt from the
+    DataFrames (cells as inline strings, so the shared strings table is left
+    alone). Every other member is copied unchanged, which keeps formatting,
+    formulas and charts of untouched sheets intact and makes the cost
+    proportional to the size of the edited sheets.
+    """
+    with zipfile.ZipFile(source_path) as zin:
+        package = XlsxPackage(zin)
+        sheet_parts = package.sheet_parts()
+        patched_parts = {}
+        for sheet_name in frames:
+            if sheet_name not in sheet_parts:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+            patched_parts[sheet_parts[sheet_name]] = sheet_name
+
+        styles_part = package.related_part(STYLES_REL)
+        styles_xml = zin.read(styles_part).decode('utf-8') if styles_part else None
+        date_styles = _DateStyles(styles_xml)
+
+        worksheets = {
+            part: _worksheet_xml(zin.read(part).decode('utf-8'), frames[sheet_name], date_styles)
+            for part, sheet_name in patched_parts.items()
+        }
+
+        # Formulas in the patched sheets are gone, so the calculation chain is stale
+        calc_chain_part = package.related_part(f'{DOC_REL_NS}/calcChain')
+        workbook_rels_part = XlsxPackage.rels_path(package.workbook_part)
+        dropped_parts = {calc_chain_part} if calc_chain_part else set()
+
+        # Tables and hyperlinks are removed from the patched sheets (their
+        # ranges no longer match), so are their relationships and table parts
+        members = set(zin.namelist())
+        sheet_rels = {}
+        for part in patched_parts:
+            tables = package.relationships(part, (TABLE_REL,))
+            stale_ids = set(tables) | set(package.relationships(part, (HYPERLINK_REL,)))
+            if stale_ids:
+                sheet_rels[XlsxPackage.rels_path(part)] = stale_ids
+            for table_part in tables.values():
+                dropped_parts.add(table_part)
+                if XlsxPackage.rels_path(table_part) in members:
+                    dropped_parts.add(XlsxPackage.rels_path(table_part))
+
+        with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                name = info.filename
+                if name in dropped_parts:
+                    continue
+
+                out_info = zipfile.ZipInfo(name, date_time=info.date_time)
+                out_info.compress_type = zipfile.ZIP_DEFLATED
+                out_info.external_attr = info.external_attr
+
+                if name in worksheets:
+                    zout.writestr(out_info, worksheets[name])
+                elif name in sheet_rels:
+                    zout.writestr(out_info, _remove_relationships(zin.read(name).decode('utf-8'), sheet_rels[name]))
+                elif name == styles_part and date_styles.modified:
+                    zout.writestr(out_info, date_styles.xml)
+                elif name == package.workbook_part:
+                    zout.writestr(out_info, _force_recalculation(zin.read(name).decode('utf-8')))
+                elif dropped_parts and name == '[Content_Types].xml':
+                    content_types = zin.read(name).decode('utf-8')
+                    for part in dropped_parts:
+                        content_types = _remove_element_with(content_types, 'Override', f'"/{part}"')
+                    zout.writestr(out_info, content_types)
+                elif calc_chain_part and name == workbook_rels_part:
+                    target = posixpath.relpath(calc_chain_part, posixpath.dirname(package.workbook_part))
+                    zout.writestr(out_info, _remove_element_with(zin.read(name).decode('utf-8'), 'Relationship', target))
+                else:
+                    with zin.open(info) as src, zout.open(out_info, 'w') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    return output_path
+
+
+class _DateStyles:
+    """Adds cell formats for dates to styles.xml on first use"""
+
+    def __init__(self, styles_xml: Optional[str]):
+        self.xml = styles_xml
+        self.modified = False
+        self._indexes: Dict[int, int] = {}
+
+    def index_for(self, num_fmt_id: int) -> Optional[int]:
+        if self.xml is None:
+            return None
+        if num_fmt_id not in self._indexes:
+            self._indexes[num_fmt_id] = self._add_xf(num_fmt_id)
+            self.modified = True
+        return self._indexes[num_fmt_id]
+
+    def _add_xf(self, num_fmt_id: int) -> int:
+        match = re.search(r'<((?:\w+:)?)cellXfs\b[^>]*?(/?)>', self.xml)
+        prefix = match.group(1) if match else ''
+        xf = f'<{prefix}xf numFmtId="{num_fmt_id}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+
+        if match is None:
+            # No cell formats at all, index 0 must stay the default format
+            block = f'<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>{xf}</cellXfs>'
+            self.xml = re.sub(r'(</(?:\w+:)?styleSheet>)', block + r'\1', self.xml, count=1)
+            return 1
+
+        if match.group(2):
+            # Self-closing <cellXfs/>, nothing to append to
+            block = f'<{prefix}cellXfs count="2"><{prefix}xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>{xf}</{prefix}cellXfs>'
+            self.xml = self.xml[:match.start()] + block + self.xml[match.end():]
+            return 1
+
+        end = self.xml.index(f'</{prefix}cellXfs>', match.end())
+        index = len(re.findall(rf'<{prefix}xf\b', self.xml[match.end():end]))
+        opening = re.sub(r'count="\d+"', f'count="{index + 1}"', match.group(0))
+        self.xml = self.xml[:match.start()] + opening + self.xml[match.end():end] + xf + self.xml[end:]
+        return index
+
+
+def _worksheet_xml(template: str, df: pd.DataFrame, date_styles: _DateStyles) -> str:
+    """Rebuild a worksheet part around new sheet data, keeping its other settings"""
+    prefix_match = re.search(r'<((?:\w+:)?)sheetData\b', template)
+    prefix = prefix_match.group(1) if prefix_match else ''
+
+    n_rows, n_cols = len(df) + 1, len(df.columns)
+    last_cell = f'{column_letter(max(n_cols, 1) - 1)}{n_rows}'
+    sheet_data = _sheet_data_xml(df, prefix, date_styles)
+
+    xml = template
+    for element in RANGE_ELEMENTS:
+        xml = re.sub(rf'<{prefix}{element}\b[^>]*?/>', '', xml)
+        xml = re.sub(rf'<{prefix}{element}\b.*?</{prefix}{element}>', '', xml, flags=re.S)
+
+    xml = re.sub(rf'<{prefix}dimension\b[^>]*?/>', f'<{prefix}dimension ref="A1:{last_cell}"/>', xml, count=1)
+
+    if re.search(rf'<{prefix}sheetData\b[^>]*?/>', xml):
+        return re.sub(rf'<{prefix}sheetData\b[^>]*?/>', lambda _: sheet_data, xml, count=1)
+    return re.sub(rf'<{prefix}sheetData\b.*?</{prefix}sheetData>', lambda _: sheet_data, xml, count=1, flags=re.S)
+
+
+def _sheet_data_xml(df: pd.DataFrame, prefix: str, date_styles: _DateStyles) -> str:
+    letters = [column_letter(i) for i in range(len(df.columns))]
+
+    header = ''.join(
+        _inline_string_cell(prefix, f'{letter}1', str(name))
+        for letter, name in zip(letters, df.columns)
+    )
+    rows = [f'<{prefix}row r="1">{header}</{prefix}row>']
+
+    row_numbers = [str(i) for i in range(2, len(df) + 2)]
+    columns = [
+        _column_cells(df.iloc[:, i], letters[i], row_numbers, prefix, date_styles)
+        for i in range(len(df.columns))
+    ]
+
+    for i, row_number in enumerate(row_numbers):
+        cells = ''.join(column[i] for column in columns)
+        rows.append(f'<{prefix}row r="{row_number}">{cells}</{prefix}row>')
+
+    return f'<{prefix}sheetData>{"".join(rows)}</{prefix}sheetData>'
+
+
+def _column_cells(
+    series: pd.Series,
+    letter: str,
+    row_numbers: List[str],
+    prefix: str,
+    date_styles: _DateStyles
+) -> List[str]:
+    """Render the cells of one column, empty strings for nulls"""
+    c = f'{prefix}c'
+    v = f'{prefix}v'
+    mask = series.notna().to_numpy()
+
+    if pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype=object)
+        return [
+            f'<{c} r="{letter}{row}" t="b"><{v}>{int(bool(value))}</{v}></{c}>' if present else ''
+            for row, value, present in zip(row_numbers, values, mask)
+        ]
+
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        mask &= np.isfinite(values)
+        if pd.api.types.is_integer_dtype(series):
+            rendered = [str(int(value)) if present else '' for value, present in zip(values, mask)]
+        else:
+            rendered = [repr(value) for value in values.tolist()]
+        return [
+            f'<{c} r="{letter}{row}"><{v}>{value}</{v}></{c}>' if present else ''
+            for row, value, present in zip(row_numbers, rendered, mask)
+        ]
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        dates = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        serials = ((dates - EXCEL_EPOCH) / pd.Timedelta(days=1)).to_numpy(dtype=float, na_value=np.nan)
+        has_time = bool((dates.dropna() != dates.dropna().dt.normalize()).any())
+        style = date_styles.index_for(DATETIME_NUM_FMT if has_time else DATE_NUM_FMT)
+        if style is None:
+            return [
+                _inline_string_cell(prefix, f'{letter}{row}', str(value)) if present else ''
+                for row, value, present in zip(row_numbers, dates, mask)
+            ]
+        return [
+            f'<{c} r="{letter}{row}" s="{style}"><{v}>{value!r}</{v}></{c}>' if present else ''
+            for row, value, present in zip(row_numbers, serials.tolist(), mask)
+        ]
+
+    if pd.api.types.is_timedelta64_dtype(series):
+        days = (series / pd.Timedelta(days=1)).to_numpy(dtype=float, na_value=np.nan)
+        return [
+            f'<{c} r="{letter}{row}"><{v}>{value!r}</{v}></{c}>' if present else ''
+            for row, value, present in zip(row_numbers, days.tolist(), mask)
+        ]
+
+    return [
+        _object_cell(prefix, f'{letter}{row}', value, date_styles) if present else ''
+        for row, value, present in zip(row_numbers, series.to_numpy(dtype=object), mask)
+    ]
+
+
+def _object_cell(prefix: str, ref: str, value, date_styles: _DateStyles) -> str:
+    c = f'{prefix}c'
+    v = f'{prefix}v'
+    if isinstance(value, (bool, np.bool_)):
+        return f'<{c} r="{ref}" t="b"><{v}>{int(value)}</{v}></{c}>'
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        if not np.isfinite(value):
+            return ''
+        return f'<{c} r="{ref}"><{v}>{value!r}</{v}></{c}>' if isinstance(value, float) else f'<{c} r="{ref}"><{v}>{value}</{v}></{c}>'
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        timestamp = pd.Timestamp(value).tz_localize(None) if getattr(value, 'tzinfo', None) else pd.Timestamp(value)
+        has_time = isinstance(value, datetime.datetime) and timestamp != timestamp.normalize()
+        style = date_styles.index_for(DATETIME_NUM_FMT if has_time else DATE_NUM_FMT)
+        if style is not None:
+            serial = (timestamp - EXCEL_EPOCH) / pd.Timedelta(days=1)
+            return f'<{c} r="{ref}" s="{style}"><{v}>{serial!r}</{v}></{c}>'
+    return _inline_string_cell(prefix, ref, str(value))
+
+
+def _inline_string_cell(prefix: str, ref: str, text: str) -> str:
+    text = escape(ILLEGAL_XML_CHARS.sub('', text))
+    return f'<{prefix}c r="{ref}" t="inlineStr"><{prefix}is><{prefix}t xml:space="preserve">{text}</{prefix}t></{prefix}is></{prefix}c>'
+
+
+def _force_recalculation(workbook_xml: str) -> str:
+    """Make Excel recalculate formulas that may reference regenerated cells"""
+    if 'fullCalcOnLoad=' in workbook_xml:
+        return workbook_xml
+    return re.sub(r'<((?:\w+:)?)calcPr\b', r'<\1calcPr fullCalcOnLoad="1"', workbook_xml, count=1)
+
+
+def _remove_element_with(xml: str, element: str, needle: str) -> str:
+    """Remove the self-closing elements of a kind that reference a part"""
+    return re.sub(
+        rf'<{element}\b[^>]*?/>',
+        lambda match: '' if needle in match.group(0) else match.group(0),
+        xml
+    )
+
+
+def _remove_relationships(rels_xml: str, rel_ids: Set[str]) -> str:
+    """Remove the relationships with the given ids from a .rels part"""
+    def keep(match):
+        rel_id = re.search(r'\bId=["\']([^"\']*)["\']', match.group(0))
+        return '' if rel_id and rel_id.group(1) in rel_ids else match.group(0)
+
+    return re.sub(r'<Relationship\b[^>]*?/>', keep, rels_xml)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text_of(elem) -> str:
+    """Text of a string item, skipping phonetic runs"""
+    texts = []
+    for child in elem.iter():
+        name = _local_name(child.tag)
+        if name == 'rPh':
+            # Phonetic hints are nested, mark them so their text is skipped
+            for hint in child.iter():
+                hint.text = None
+        elif name == 't' and child.text:
+            texts.append(child.text)
+    return ''.join(texts)
+
+
+def _parse_dimension(ref: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Declared (data rows, columns) of a sheet, counting from A1 with a header row"""
+    if not ref:
+        return None
+    last = ref.split(':')[-1]
+    digits = ''.join(char for char in last if char.isdigit())
+    if not digits:
+        return None
+    return (max(int(digits) - 1, 0), column_index(last) + 1)
+
+
+def _row_cells(row) -> Dict[int, Tuple[str, str, int]]:
+    """Raw (type, value, style) of the non-empty cells of a row, by column index"""
+    cells = {}
+    position = -1
+    for cell in row:
+        if _local_name(cell.tag) != 'c':
+            continue
+        ref = cell.get('r')
+        position = column_index(ref) if ref else position + 1
+        cell_type = cell.get('t', 'n')
+
+        if cell_type == 'inlineStr':
+            inline = next((child for child in cell if _local_name(child.tag) == 'is'), None)
+            if inline is not None:
+                cells[position] = (cell_type, _text_of(inline), 0)
+            continue
+
+        value = next((child.text for child in cell if _local_name(child.tag) == 'v'), None)
+        if value is not None:
+            cells[position] = (cell_type, value, int(cell.get('s', 0)))
+    return cells
+
+
+def _convert_cell(cell_type: str, value: str, date_kind: Optional[str], shared_strings: List[str]) -> Any:
+    """Convert a raw cell to the Python value pandas' openpyxl reader would produce"""
+    if cell_type == 's':
+        return shared_strings[int(value)] if int(value) < len(shared_strings) else None
+    if cell_type in ('str', 'inlineStr'):
+        return value
+    if cell_type == 'b':
+        return value == '1'
+    if cell_type == 'e':
+        return None
+    if cell_type == 'd':
+        return pd.Timestamp(value)
+
+    number = float(value)
+    if date_kind == 'time':
+        return (datetime.datetime.min + datetime.timedelta(days=number % 1)).time()
+    if date_kind == 'datetime':
+        return (EXCEL_EPOCH + pd.Timedelta(days=number)).round('ms')
+    return int(number) if number.is_integer() else number
+
+
+def _date_format_kind(num_fmt_id: int, custom_formats: Dict[int, str]) -> Optional[str]:
+    if num_fmt_id in BUILTIN_DATE_FORMATS:
+        return 'datetime'
+    if num_fmt_id in BUILTIN_TIME_FORMATS:
+        return 'time'
+    if num_fmt_id not in custom_formats:
+        return None
+
+    # Ignore literal text, escaped characters and [color]/[$currency] sections
+    code = re.sub(r'"[^"]*"|\\.|\[(?![hms]+\])[^\]]*\]', '', custom_formats[num_fmt_id].lower())
+    if re.search(r'[dy]', code) or ('m' in code and not re.search(r'[hs]', code)):
+        return 'datetime'
+    if re.search(r'[hs]', code):
+        return 'time'
+    return None
+
+
+def _header_names(values: List[Any]) -> List[Any]:
+    """Name blank headers and de-duplicate repeated ones the way pandas does"""
+    names = []
+    seen: Dict[Any, int] = {}
+    for index, value in enumerate(values):
+        name = f'Unnamed: {index}' if value is None or value == '' else value
+        if name in seen:
+            seen[name] += 1
+            candidate = f'{name}.{seen[name]}'
+            while candidate in seen:
+                seen[name] += 1
+                candidate = f'{name}.{seen[name]}'
+            seen[candidate] = 0
+            name = candidate
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Tests import the backend packages the way the app does, from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sheet_file(tmp_path):
+    """An uploaded file with one small sheet, Data"""
+    path = str(tmp_path / 'upload.xlsx')
+    pd.DataFrame({
+        'Name': [' ann ', 'Bob', None, 'cara ', 'Bob', ' dan'],
+        'City': ['paris', 'Rome', 'oslo', None, 'Rome', 'nice'],
+        'Amount': [12.345, 5.0, None, 40.5, 5.0, 120.0],
+        'Note': ['a', None, 'b', None, None, 'c'],
+    }).to_excel(path, sheet_name='Data', index=False)
+    return path
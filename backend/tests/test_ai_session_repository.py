@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.user import User
+from repositories.ai_session_repository import AISessionRepository
+
+
+@pytest.fixture
+def repo():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id='user', email='user@example.com'))
+    db.commit()
+    yield AISessionRepository(db)
+    db.close()
+
+
+def test_sessions_with_new_messages_list_first(repo):
+    first = repo.create('user', 'first.xlsx', '/tmp/first.xlsx').id
+    second = repo.create('user', 'second.xlsx', '/tmp/second.xlsx').id
+    repo.add_message(second, 'user', 'trim the names')
+    repo.add_message(first, 'user', 'remove empty rows')
+
+    assert [session.id for session in repo.get_user_sessions('user')] == [first, second]
+    messages, _ = repo.get_messages(first)
+    assert [message.seq for message in messages] == [1]
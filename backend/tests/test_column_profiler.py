@@ -0,0 +1,24 @@
+import pandas as pd
+
+from services.excel_operations import run_plan
+from services.working_copy import WorkingCopy
+
+
+def test_profile_is_stored_with_the_upload(sheet_file):
+    profiles = WorkingCopy.open_or_create(sheet_file).sheet_profile('Data')
+    assert list(profiles) == ['Name', 'City', 'Amount', 'Note']
+    assert profiles['Amount'].type == 'float'
+
+
+def test_profile_follows_a_saved_plan_without_loading_the_sheet(sheet_file, monkeypatch):
+    run_plan(sheet_file, 'Data', [
+        {'operation': 'rename_column', 'params': {'old_name': 'City', 'new_name': 'Town'}},
+        {'operation': 'change_type', 'params': {'column': 'Amount', 'type': 'str'}},
+    ])
+
+    working_copy = WorkingCopy.open_or_create(sheet_file)
+    monkeypatch.setattr(pd, 'read_parquet', None)
+    monkeypatch.setattr(WorkingCopy, 'load_sheet', None)
+    profiles = working_copy.sheet_profile('Data')
+    assert list(profiles) == ['Name', 'Town', 'Amount', 'Note']
+    assert profiles['Town'].type == 'text'
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.filter_expression import (
+    MAX_DEPTH,
+    MAX_EXPRESSION_LENGTH,
+    MAX_PATTERN_LENGTH,
+    FilterExpression,
+    FilterExpressionError,
+)
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'Amount': [5, 15, 25, np.nan, 150],
+        'Budget': [10, 10, 30, 10, 100],
+        'City': ['Paris', 'Rome', None, 'Berlin', ''],
+        'Hotel': ['Paris Hotel', 'Grand', 'Paris', None, 'Paris Hotel'],
+        'Unit Price': [1.5, 2.5, 3.5, 4.5, 5.5],
+    })
+
+
+def kept(df, text, column=None):
+    return np.flatnonzero(FilterExpression(text, column).mask(df)).tolist()
+
+
+@pytest.mark.parametrize('text, rows', [
+    ('Amount > 10', [1, 2, 4]),
+    ('Amount = 15', [1]),
+    ('Amount != 15', [0, 2, 4]),
+    ('Amount between 10 and 30', [1, 2]),
+    ('Amount not between 10 and 30', [0, 4]),
+    ("City in ('Paris', 'Rome')", [0, 1]),
+    ("City not in ['Paris', 'Rome']", [3, 4]),
+    ("Hotel contains 'Hotel'", [0, 4]),
+    ("City matches '^[PR]'", [0, 1]),
+    ('City is null', [2]),
+    ('City is empty', [2, 4]),
+    ('City is not empty', [0, 1, 3]),
+    ('Amount > 10 and Amount < 100', [1, 2]),
+    ("Amount < 10 or City = 'Berlin'", [0, 3]),
+    ("not (City = 'Paris' or City = 'Rome')", [2, 3, 4]),
+    ('Amount > Budget', [1, 4]),
+    ('`Unit Price` >= 3.5', [2, 3, 4]),
+    ('Amount > 10 AND City IS NULL', [2]),
+])
+def test_expression(df, text, rows):
+    assert kept(df, text) == rows
+
+
+@pytest.mark.parametrize('condition, column, rows', [
+    ('> 10 and < 100', 'Amount', [1, 2]),
+    ('== Paris', 'City', [0]),
+    ("== 'Paris Hotel'", 'Hotel', [0, 4]),
+    ('in (Paris, Rome)', 'City', [0, 1]),
+])
+def test_condition(df, condition, column, rows):
+    assert kept(df, condition, column) == rows
+
+
+@pytest.mark.parametrize('condition, rows', [
+    ('== Paris Hotel', [0, 4]),
+    ('= Paris Hotel', [0, 4]),
+    ('!= Paris Hotel', [1, 2]),
+])
+def test_condition_with_unquoted_words_is_one_value(df, condition, rows):
+    assert kept(df, condition, 'Hotel') == rows
+    assert str(FilterExpression(condition, 'Hotel')).endswith("'Paris Hotel'")
+
+
+def test_from_params(df):
+    assert FilterExpression.from_params({'column': 'Hotel', 'condition': '== Paris Hotel'}).columns == {'Hotel'}
+    assert FilterExpression.from_params({'expression': 'Amount > Budget'}).columns == {'Amount', 'Budget'}
+
+
+@pytest.mark.parametrize('negated, kept_rows', [
+    # Negated tests fail on missing values, as != does
+    ("City != 'Paris'", [1, 3, 4]),
+    ("City not in ('Paris')", [1, 3, 4]),
+    ("City not contains 'Par'", [1, 3, 4]),
+    ("City not matches '^P'", [1, 3, 4]),
+    ('Amount not between 0 and 10', [1, 2, 4]),
+    # not (...) keeps them
+    ("not (City = 'Paris')", [1, 2, 3, 4]),
+    ("not (City in ('Paris'))", [1, 2, 3, 4]),
+    ('not (Amount between 0 and 10)', [1, 2, 3, 4]),
+])
+def test_missing_values(df, negated, kept_rows):
+    assert kept(df, negated) == kept_rows
+
+
+@pytest.mark.parametrize('text', [
+    'Amount > 10 and Amount < 100',
+    "City not in ('Paris', 'Rome')",
+    "City not matches '^P'",
+    'Amount not between 1 and 2',
+    "not (City = 'Paris' or `Unit Price` between 1 and 2)",
+    "Hotel contains 'it\\'s'",
+    'City is not empty',
+])
+def test_str_parses_to_the_same_filter(df, text):
+    expression = FilterExpression(text)
+    assert FilterExpression(str(expression)).tree == expression.tree
+
+
+@pytest.mark.parametrize('text, column', [
+    ('', None),
+    ('   ', None),
+    ('Amount >', None),
+    ('Amount > 10 and', None),
+    ('Amount 10', None),
+    ('(Amount > 10', None),
+    ('Amount > 10)', None),
+    ("City matches '('", None),
+    ('City contains 5', None),
+    ('Amount is 5', None),
+    ('Amount > 10 @', None),
+    ('Paris Hotel', 'Hotel'),
+    ('==', 'Hotel'),
+    ("City matches '(a+)+$'", None),
+    (r"City matches '(\\w+\\s?)*$'", None),
+    ("City matches '(a|aa)+'", None),
+    (r"City matches '(a)\\1'", None),
+    (f"City matches '{'a' * (MAX_PATTERN_LENGTH + 1)}'", None),
+])
+def test_invalid_expression(text, column):
+    with pytest.raises(FilterExpressionError):
+        FilterExpression(text, column)
+
+
+def test_unknown_column(df):
+    with pytest.raises(FilterExpressionError, match='Missing'):
+        FilterExpression('Missing > 1').mask(df)
+
+
+def test_limits():
+    with pytest.raises(FilterExpressionError, match='nested'):
+        FilterExpression('(' * (MAX_DEPTH + 1) + 'Amount > 1' + ')' * (MAX_DEPTH + 1))
+    with pytest.raises(FilterExpressionError, match='longer'):
+        FilterExpression('Amount > 1 or ' * (MAX_EXPRESSION_LENGTH // 10) + 'Amount > 1')
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.filter_expression import FilterExpression
+from services.intent_parser import IntentParser
+
+COLUMNS = ['Date', 'Amount', 'Status', 'City', 'Name', 'Hotel']
+
+
+@pytest.fixture
+def parser():
+    return IntentParser()
+
+
+@pytest.mark.parametrize('message', [
+    'keep rows where Date is before 2024-01-01',
+    'keep rows where Date is after 2024-01-01',
+    'keep rows where Amount is between 5 and 10',
+    'keep rows where Status is active or pending',
+    'keep rows where City is in Paris, Rome',
+    'keep rows where Name is like John',
+    'keep rows where City is New York',
+    'keep rows where City equals Paris or Rome',
+])
+def test_is_with_a_phrase_goes_to_the_model(parser, message):
+    assert parser.parse(message, COLUMNS) is None
+
+
+@pytest.mark.parametrize('message, column, condition', [
+    ('keep rows where City is Paris', 'City', "== 'Paris'"),
+    ("keep rows where Hotel is 'Paris Hotel'", 'Hotel', "== 'Paris Hotel'"),
+    ("keep rows where Status is 'Sales and Marketing'", 'Status', "== 'Sales and Marketing'"),
+    ('keep rows where City equals Paris', 'City', "== 'Paris'"),
+    ('keep rows where Amount is over 100', 'Amount', '> 100'),
+    ("keep rows where Name contains 'bo'", 'Name', "contains 'bo'"),
+])
+def test_simple_filters_are_parsed(parser, message, column, condition):
+    result = parser.parse(message, COLUMNS)
+    assert result['operations'] == [
+        {'operation': 'filter_rows', 'params': {'column': column, 'condition': condition}}
+    ]
+
+
+def test_removing_rows_keeps_rows_without_a_value(parser):
+    result = parser.parse('remove rows where Amount is less than 5', COLUMNS)
+    assert result['operations'] == [
+        {'operation': 'filter_rows', 'params': {'expression': 'not (Amount < 5)'}}
+    ]
+    df = pd.DataFrame({'Amount': [3, np.nan, 7]})
+    assert FilterExpression.from_params(result['operations'][0]['params']).mask(df).tolist() == [False, True, True]
+
+
+@pytest.mark.parametrize('message', [
+    'fill missing values in Amount with the average',
+    'fill missing values in Amount with the previous value',
+    'fill missing values in Amount with mean',
+    'fill missing values with median',
+    'replace N/A with nothing',
+    'fill empty cells in City with the most common city',
+])
+def test_fill_with_a_method_goes_to_the_model(parser, message):
+    assert parser.parse(message, COLUMNS) is None
+
+
+@pytest.mark.parametrize('message, value', [
+    ('fill missing values in Amount with 0', 0),
+    ('fill missing values in City with Unknown', 'Unknown'),
+    ("fill missing values in City with 'not given'", 'not given'),
+])
+def test_fill_with_a_value_is_parsed(parser, message, value):
+    assert parser.parse(message, COLUMNS)['operations'][0]['params']['value'] == value
+
+
+@pytest.mark.parametrize('pattern, date_format', [
+    ('DD/MM/YYYY', '%d/%m/%Y'),
+    ('YYYY-MM-DD HH:MM', '%Y-%m-%d %H:%M'),
+    ('DD.MM.YY HH:MM:SS', '%d.%m.%y %H:%M:%S'),
+    ('MMM DD, YYYY', '%b %d, %Y'),
+])
+def test_date_formats(pattern, date_format):
+    assert IntentParser._date_format(pattern) == date_format
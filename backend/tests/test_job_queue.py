@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from services.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(max_workers=1)
+
+
+def run(queue, fn, *args, **kwargs):
+    """Submit a job and wait for its (result, error)"""
+    outcome = {}
+    finished = queue.submit(fn, *args, on_done=lambda result, error: outcome.update(result=result, error=error), **kwargs)
+    finished.result(timeout=60)
+    return outcome['result'], outcome['error']
+
+
+def test_job_runs_on_a_worker(queue):
+    assert run(queue, abs, -3) == (3, None)
+
+
+def test_job_waits_until_ready_without_holding_a_worker(queue):
+    ready = threading.Event()
+    outcome = {}
+    waiting = queue.submit(abs, -1, on_done=lambda result, error: outcome.update(result=result), ready=ready.is_set)
+
+    # The only worker is free for jobs that are ready
+    assert run(queue, abs, -2) == (2, None)
+    time.sleep(0.2)
+    assert not waiting.done()
+    assert queue.stats()['waiting'] == 1
+
+    ready.set()
+    waiting.result(timeout=60)
+    assert outcome['result'] == 1
+    assert queue.stats()['waiting'] == 0
+
+
+def test_job_past_its_deadline_is_stopped(queue):
+    started = time.time()
+    result, error = run(queue, time.sleep, 30, deadline=time.time() + 1)
+    assert isinstance(error, TimeoutError)
+    assert time.time() - started < 20
+
+    # The pool was replaced
+    assert run(queue, abs, -4) == (4, None)
+    assert queue.stats()['failed'] == 1
@@ -0,0 +1,17 @@
+from services.llm_response_cache import LLMResponseCache
+
+COLUMNS = [{'name': 'Status', 'type': 'text'}]
+
+
+def key(message: str) -> str:
+    return LLMResponseCache.make_key(message, [], COLUMNS, 'v1')
+
+
+def test_messages_differing_in_literal_case_get_different_keys():
+    assert key("Replace 'yes' with 'YES' in Status") != key("Replace 'YES' with 'yes' in Status")
+    assert key('rename Status to status') != key('rename Status to STATUS')
+
+
+def test_whitespace_and_trailing_punctuation_are_ignored():
+    assert key('Remove duplicates.') == key('  Remove   duplicates ')
+    assert key('Remove duplicates!?') == key('Remove duplicates')
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+from services.excel_operations import PandasExecutor
+from services.plan_optimizer import PlanOptimizer
+
+
+def step(operation, **params):
+    return {'operation': operation, 'params': params}
+
+
+def run(sheet_file, steps, optimize):
+    executor = PandasExecutor(sheet_file, 'Data')
+    executor.execute_plan(steps, optimize=optimize)
+    return executor.df
+
+
+PLANS = {
+    'filter pushed below a sort': [
+        step('sort_values', columns=['Amount'], ascending=False),
+        step('filter_rows', column='Amount', condition='> 10'),
+    ],
+    'filter pushed below a transform of another column': [
+        step('upper_case', column='Name'),
+        step('filter_rows', expression="City = 'Rome' or Amount > 100"),
+    ],
+    'drop_na pushed below deduplication': [
+        step('drop_duplicates', columns=['Name', 'City']),
+        step('drop_na', columns=['City']),
+    ],
+    'filters fused': [
+        step('filter_rows', column='Amount', condition='>= 5'),
+        step('filter_rows', expression='Name is not null'),
+        step('filter_rows', column='City', condition='!= oslo'),
+    ],
+    'text transforms fused': [
+        step('trim_whitespace', columns=['Name']),
+        step('capitalize', column='Name'),
+        step('upper_case', column='City'),
+        step('lower_case', column='City'),
+    ],
+    'transforms of a removed column dropped': [
+        step('trim_whitespace', columns=['Note']),
+        step('upper_case', column='Note'),
+        step('fill_na', value='-', columns=['Note']),
+        step('sort_values', columns=['Name']),
+        step('remove_column', column='Note'),
+    ],
+    'filters fused around one on a missing column': [
+        step('filter_rows', column='Amount', condition='>= 5'),
+        step('filter_rows', expression="City != 'oslo'"),
+        step('filter_rows', column='Missing', condition='> 1'),
+        step('filter_rows', expression='Name is not null'),
+    ],
+    'remove_column before every column': [
+        step('trim_whitespace'),
+        step('round_numbers', column='Amount', decimals=1),
+        step('remove_column', column='City'),
+    ],
+}
+
+
+@pytest.mark.parametrize('name', PLANS)
+def test_optimized_plan_gives_the_same_frame(sheet_file, name):
+    steps = PLANS[name]
+    optimized, rewrites = PlanOptimizer.optimize(steps)
+    assert rewrites, 'the plan should be rewritten'
+    pd.testing.assert_frame_equal(run(sheet_file, steps, optimize=True), run(sheet_file, steps, optimize=False))
+
+
+def test_rewrites():
+    optimized, _ = PlanOptimizer.optimize(PLANS['filter pushed below a sort'])
+    assert [s['operation'] for s in optimized] == ['filter_rows', 'sort_values']
+
+    optimized, _ = PlanOptimizer.optimize(PLANS['filters fused'])
+    assert [s['operation'] for s in optimized] == ['filter_rows']
+
+    optimized, _ = PlanOptimizer.optimize(PLANS['filters fused around one on a missing column'], ['Name', 'City', 'Amount'])
+    assert [s['params'].get('column') for s in optimized] == [None, 'Missing', None]
+
+    # Only the columns known to exist at each step count
+    steps = [step('remove_column', column='City'), step('filter_rows', column='Amount', condition='> 1'),
+             step('filter_rows', column='City', condition='== Rome')]
+    optimized, _ = PlanOptimizer.optimize(steps, ['City', 'Amount'])
+    assert len(optimized) == 3
+
+    optimized, _ = PlanOptimizer.optimize(PLANS['remove_column before every column'])
+    assert optimized[0] == step('remove_column', column='City')
+
+    optimized, _ = PlanOptimizer.optimize(PLANS['text transforms fused'])
+    assert len(optimized) == 2
+
+    optimized, _ = PlanOptimizer.optimize(PLANS['transforms of a removed column dropped'])
+    assert [s['operation'] for s in optimized] == ['remove_column', 'sort_values']
+
+
+@pytest.mark.parametrize('steps', [
+    # The filter reads the column the transform writes
+    [step('upper_case', column='City'), step('filter_rows', column='City', condition='== ROME')],
+    # Deduplication on Name decides which City values are left to filter
+    [step('drop_duplicates', columns=['Name']), step('filter_rows', column='City', condition='== Rome')],
+    # Column dtypes depend on the rows present
+    [step('change_type', column='Amount', type='int'), step('drop_na', columns=['Amount'])],
+])
+def test_dependent_steps_keep_their_order(steps):
+    optimized, rewrites = PlanOptimizer.optimize(steps)
+    assert [s['operation'] for s in optimized] == [s['operation'] for s in steps]
+    assert rewrites == []
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from services.serialization import column_to_json, frame_to_records
+
+
+def test_timestamps_keep_fractional_seconds():
+    timestamps = pd.to_datetime([
+        '2024-01-02 03:04:05',
+        '2024-01-02 03:04:05.5',
+        None,
+        '2024-01-02 03:04:05.000000007',
+        '1960-01-01 00:00:00.25',
+    ], format='ISO8601')
+    expected = [None if pd.isna(value) else value.isoformat() for value in timestamps]
+
+    assert column_to_json(pd.Series(timestamps)) == expected
+    assert expected[1] == '2024-01-02T03:04:05.500000'
+
+
+def test_records_keep_nulls_and_types():
+    df = pd.DataFrame({
+        'Amount': [1.5, None],
+        'Count': pd.array([2, None], dtype='Int64'),
+        'When': pd.to_datetime(['2024-05-06 07:08:09.123', None]),
+    })
+    assert frame_to_records(df) == [
+        {'Amount': 1.5, 'Count': 2, 'When': '2024-05-06T07:08:09.123000'},
+        {'Amount': None, 'Count': None, 'When': None},
+    ]
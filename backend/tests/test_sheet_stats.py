@@ -0,0 +1,74 @@
+import pytest
+
+from services.excel_operations import PandasExecutor
+from services.sheet_stats import SheetStats
+
+
+def step(operation, **params):
+    return {'operation': operation, 'params': params}
+
+
+@pytest.mark.parametrize('steps', [
+    [step('drop_duplicates')],
+    [step('drop_duplicates', columns=['Name'])],
+    [step('drop_na')],
+    [step('drop_na', columns=['City'])],
+    [step('fill_na', value='-')],
+    [step('fill_na', value=0, columns=['Amount'])],
+    [step('remove_column', column='Note')],
+    [step('rename_column', old_name='City', new_name='Town')],
+    [step('filter_rows', column='Amount', condition='> 10')],
+    [step('filter_rows', expression="Note is null or City = 'Rome'")],
+    [step('sort_values', columns=['Amount'], ascending=False)],
+    [step('replace_value', old_value='Rome', new_value=None, column='City')],
+    [step('replace_value', old_value='Bob', new_value='Rob')],
+    [step('change_type', column='Amount', type='int')],
+    [step('change_type', column='Amount', type='str')],
+    [step('change_type', column='City', type='float')],
+    [step('trim_whitespace')],
+    [step('upper_case', column='Name'), step('capitalize', column='City')],
+    [step('transform_text', column='Name', functions=['strip', 'lower'])],
+    [step('round_numbers', column='Amount', decimals=1)],
+    [step('drop_empty_rows')],
+    [step('remove_column', column='Amount'), step('drop_empty_columns')],
+    [step('format_date', column='City', format='%Y-%m-%d')],
+    [
+        step('drop_na', columns=['Name']),
+        step('fill_na', value='none', columns=['Note']),
+        step('remove_column', column='City'),
+        step('drop_duplicates', columns=['Name']),
+    ],
+])
+def test_incremental_stats_match_a_recount(sheet_file, steps):
+    executor = PandasExecutor(sheet_file, 'Data')
+    executor.execute_plan(steps, optimize=False)
+    assert executor.stats == SheetStats.from_frame(executor.df)
+
+
+@pytest.mark.parametrize('new_type, dtype', [('str', 'object'), ('int', 'Int64'), ('datetime', 'datetime64[ns]')])
+def test_stats_follow_a_type_change(sheet_file, new_type, dtype):
+    executor = PandasExecutor(sheet_file, 'Data')
+    assert executor.stats.dtypes['Amount'] == 'float64'
+
+    # Whole numbers, which int accepts
+    executor.execute_plan([
+        step('round_numbers', column='Amount', decimals=0),
+        step('change_type', column='Amount', type=new_type),
+    ])
+    assert executor.stats.dtypes['Amount'] == dtype
+    assert executor.stats == SheetStats.from_frame(executor.df)
+
+
+def test_stats_survive_a_save(sheet_file):
+    executor = PandasExecutor(sheet_file, 'Data')
+    executor.execute_plan([step('drop_na', columns=['City']), step('remove_column', column='Note')])
+    executor.save_to_file(sheet_file)
+
+    reopened = PandasExecutor(sheet_file, 'Data')
+    assert reopened.stats == SheetStats.from_frame(reopened.df)
+    assert reopened.get_stats() == {
+        'rows': 5,
+        'columns': 3,
+        'column_names': ['Name', 'City', 'Amount'],
+        'null_counts': {'Name': 1, 'City': 0, 'Amount': 1},
+    }
@@ -0,0 +1,90 @@
+import time
+
+import pandas as pd
+import pytest
+
+from services.excel_operations import PandasExecutor
+from services.version_store import VersionStore
+from services.working_copy import WorkingCopy
+
+PLANS = [
+    [{'operation': 'trim_whitespace', 'params': {'columns': ['Name']}}],
+    [{'operation': 'fill_na', 'params': {'value': 0, 'columns': ['Amount']}}],
+    [{'operation': 'upper_case', 'params': {'column': 'City'}}],
+    [{'operation': 'filter_rows', 'params': {'column': 'Amount', 'condition': '> 1'}}],
+    [{'operation': 'round_numbers', 'params': {'column': 'Amount', 'decimals': 0}}],
+    [{'operation': 'remove_column', 'params': {'column': 'Note'}}],
+    [{'operation': 'sort_values', 'params': {'columns': ['Amount'], 'ascending': False}}],
+    [{'operation': 'rename_column', 'params': {'old_name': 'City', 'new_name': 'Town'}}],
+]
+
+
+def store(sheet_file):
+    # Small enough that checkpoints are taken and pruned within PLANS
+    return VersionStore(WorkingCopy.open_or_create(sheet_file), checkpoint_every=2, checkpoint_seconds=60, max_checkpoints=1)
+
+
+def apply(sheet_file, steps):
+    """Run a plan the way run_plan does, with the store above"""
+    executor = PandasExecutor(sheet_file, 'Data')
+    started = time.perf_counter()
+    result = executor.execute_plan(steps)
+    versions = store(sheet_file)
+    versions.prepare('Data')
+    executor.save_to_file(sheet_file, 'Data')
+    return versions.record('Data', steps, result['summary'], time.perf_counter() - started)
+
+
+def sheet(sheet_file):
+    return WorkingCopy.open_or_create(sheet_file).load_sheet('Data')
+
+
+@pytest.fixture
+def history(sheet_file):
+    """The sheet at each version, after running every plan of PLANS"""
+    frames = [sheet(sheet_file)]
+    for steps in PLANS:
+        apply(sheet_file, steps)
+        frames.append(sheet(sheet_file))
+    return frames
+
+
+def test_checkpoints_are_pruned(sheet_file, history):
+    checkpoints = store(sheet_file).log['checkpoints']['Data']
+    assert checkpoints[0] == 0
+    assert len(checkpoints) == 2
+    assert checkpoints[-1] == len(PLANS)
+
+
+def test_undo_and_redo_every_version(sheet_file, history):
+    versions = store(sheet_file)
+    for version in list(range(len(PLANS) - 1, -1, -1)) + list(range(1, len(PLANS) + 1)):
+        assert versions.checkout(version) == ['Data']
+        assert versions.current == version
+        pd.testing.assert_frame_equal(sheet(sheet_file), history[version])
+
+
+@pytest.mark.parametrize('version', [0, 1, 3, 5, 7])
+def test_restore_across_pruned_checkpoints(sheet_file, history, version):
+    # Each store reads the log back from disk
+    store(sheet_file).checkout(version)
+    pd.testing.assert_frame_equal(sheet(sheet_file), history[version])
+
+    store(sheet_file).checkout(len(PLANS))
+    pd.testing.assert_frame_equal(sheet(sheet_file), history[-1])
+
+
+def test_new_plan_after_undo_drops_the_undone_versions(sheet_file, history):
+    store(sheet_file).checkout(3)
+    steps = [{'operation': 'lower_case', 'params': {'column': 'Name'}}]
+    assert apply(sheet_file, steps) == 4
+
+    versions = store(sheet_file)
+    assert versions.latest == 4
+    assert all(version <= 4 for version in versions.log['checkpoints']['Data'])
+    assert [entry['operations'] for entry in versions.history()[1:]] == PLANS[:3] + [steps]
+    with pytest.raises(ValueError):
+        versions.checkout(5)
+
+    versions.checkout(3)
+    pd.testing.assert_frame_equal(sheet(sheet_file), history[3])
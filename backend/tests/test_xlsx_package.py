@@ -0,0 +1,40 @@
+import zipfile
+
+import openpyxl
+import pandas as pd
+from openpyxl.worksheet.table import Table
+
+from services.xlsx_package import write_patched_workbook
+
+
+def test_workbook_with_tables_survives_an_edit(tmp_path):
+    source, output = str(tmp_path / 'source.xlsx'), str(tmp_path / 'output.xlsx')
+    workbook = openpyxl.Workbook()
+    for sheet, name in ((workbook.active, 'Data'), (workbook.create_sheet(), 'Other')):
+        sheet.title = name
+        sheet.append(['Name', 'Amount'])
+        sheet.append(['ann', 1])
+        sheet.append(['bob', 2])
+        sheet.add_table(Table(displayName=f'{name}Table', ref='A1:B3'))
+    workbook['Data']['A2'].hyperlink = 'https://example.com'
+    workbook.save(source)
+
+    edited = pd.DataFrame({'Name': ['ann'], 'Total': [10]})
+    write_patched_workbook(source, output, {'Data': edited})
+
+    with zipfile.ZipFile(source) as zf:
+        tables = {name for name in zf.namelist() if name.startswith('xl/tables/')}
+    with zipfile.ZipFile(output) as zf:
+        names = set(zf.namelist())
+        data_rels = zf.read('xl/worksheets/_rels/sheet1.xml.rels').decode('utf-8')
+        content_types = zf.read('[Content_Types].xml').decode('utf-8')
+    dropped = tables - names
+    assert len(dropped) == 1
+    assert '/table' not in data_rels and 'hyperlink' not in data_rels
+    assert not any(f'/{part}"' in content_types for part in dropped)
+
+    # Reading resolves every relationship, and the other sheet keeps its table
+    reopened = openpyxl.load_workbook(output)
+    assert not reopened['Data'].tables
+    assert list(reopened['Other'].tables) == ['OtherTable']
+    pd.testing.assert_frame_equal(pd.read_excel(output, sheet_name='Data'), edited)
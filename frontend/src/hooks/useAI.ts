@@ -99,6 +99,19 @@ export function useAIChat() {
       if (data.operation) {
         queryClient.invalidateQueries({ queryKey: ['ai-preview'] })
       }
+
+      // Only the preview is ready, the job's result is the outcome
+      if (data.provisional && data.job_id && user) {
+        aiApi.waitForJob(data.job_id, user.id).then((result) => {
+          setTokensRemaining(result.tokens_remaining)
+          queryClient.invalidateQueries({ queryKey: ['ai-preview'] })
+          if (result.type === 'error') {
+            toast.error(result.message)
+          }
+        }).catch((error: Error) => {
+          toast.error(error.message || 'Failed to get job status')
+        })
+      }
     },
     onError: (error: Error) => {
       // Check if it's a token limit error by trying to parse the response
@@ -21,7 +21,7 @@ export interface SendMessageParams {
 }
 
 export interface SendMessageResponse {
-  type: 'success' | 'error'
+  type: 'success' | 'error' | 'pending'
   message: string
   operation?: string
   summary?: string
@@ -33,8 +33,24 @@ export interface SendMessageResponse {
   }
   tokens_remaining: number
   suggestion?: string
+  version?: number
+  job_id?: string
+  // Set when only the preview is ready and the job is still applying the
+  // operations to the rest of the sheet; the job's result is the outcome
+  provisional?: boolean
+  status?: 'queued' | 'running'
 }
 
+export interface JobResponse {
+  job_id: string
+  session_id: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  result: SendMessageResponse | null
+}
+
+// How often a slow chat message's job is polled
+const JOB_POLL_INTERVAL_MS = 1000
+
 export interface GetPreviewResponse {
   preview: Record<string, unknown>[]
   stats: {
@@ -45,6 +61,57 @@ export interface GetPreviewResponse {
   sheet_name: string
 }
 
+export interface VersionInfo {
+  version: number
+  sheet_name: string | null
+  operations: { operation: string; params: Record<string, unknown> }[]
+  summary: string
+  created_at: string | null
+  checkpoint: boolean
+}
+
+export interface VersionsResponse {
+  current_version: number
+  latest_version: number
+  can_undo: boolean
+  can_redo: boolean
+  versions: VersionInfo[]
+}
+
+export interface ChangeVersionResponse {
+  success: boolean
+  version: number
+  latest_version: number
+  changed_sheets: string[]
+  sheet_name?: string
+  preview?: Record<string, unknown>[]
+  stats?: {
+    rows: number
+    columns: number
+    column_names: string[]
+  }
+}
+
+const changeVersion = async (
+  path: 'undo' | 'redo' | 'restore-version',
+  body: Record<string, unknown>
+): Promise<ChangeVersionResponse> => {
+  const response = await fetch(`${API_BASE_URL}/api/ai/${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body),
+  })
+
+  if (!response.ok) {
+    const error = await response.json()
+    throw new Error(error.error || 'Failed to change version')
+  }
+
+  return response.json()
+}
+
 export interface TokensResponse {
   tokens_remaining: number
   daily_limit: number
@@ -97,6 +164,38 @@ export const aiApi = {
       throw new Error(error.error || 'Failed to send message')
     }
 
+    // Slow operations keep running as a job, wait for its result
+    if (response.status === 202) {
+      const pending = await response.json()
+      return aiApi.waitForJob(pending.job_id, params.userId)
+    }
+
+    return response.json()
+  },
+
+  waitForJob: async (jobId: string, userId: string): Promise<SendMessageResponse> => {
+    for (;;) {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+      const job = await aiApi.getJob(jobId, userId)
+      if (job.result) {
+        return job.result
+      }
+    }
+  },
+
+  getJob: async (jobId: string, userId: string): Promise<JobResponse> => {
+    const response = await fetch(
+      `${API_BASE_URL}/api/ai/jobs/${jobId}?user_id=${userId}`,
+      {
+        method: 'GET',
+      }
+    )
+
+    if (!response.ok) {
+      const error = await response.json()
+      throw new Error(error.error || 'Failed to get job status')
+    }
+
     return response.json()
   },
 
@@ -116,6 +215,31 @@ export const aiApi = {
     return response.json()
   },
 
+  getVersions: async (sessionId: string, userId: string): Promise<VersionsResponse> => {
+    const response = await fetch(
+      `${API_BASE_URL}/api/ai/versions/${sessionId}?user_id=${userId}`,
+      {
+        method: 'GET',
+      }
+    )
+
+    if (!response.ok) {
+      const error = await response.json()
+      throw new Error(error.error || 'Failed to get versions')
+    }
+
+    return response.json()
+  },
+
+  undo: (sessionId: string, userId: string): Promise<ChangeVersionResponse> =>
+    changeVersion('undo', { session_id: sessionId, user_id: userId }),
+
+  redo: (sessionId: string, userId: string): Promise<ChangeVersionResponse> =>
+    changeVersion('redo', { session_id: sessionId, user_id: userId }),
+
+  restoreVersion: (sessionId: string, version: number, userId: string): Promise<ChangeVersionResponse> =>
+    changeVersion('restore-version', { session_id: sessionId, user_id: userId, version }),
+
   downloadFile: async (sessionId: string, userId: string): Promise<Blob> => {
     const response = await fetch(
       `${API_BASE_URL}/api/ai/download/${sessionId}?user_id=${userId}`,